@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import hashlib
+import json
+from datetime import date, timedelta
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from typing import Optional
 
-from .models import EstadoUpdate, CitaCreate
-from .sheets import get_ws_dia
+from . import metrics
+from .events import event_bus, formato_sse
+from .idempotencia import ClaveReutilizada, registro_idempotencia
+from .quota import quota_scheduler, status_de
+from .settings import FLEXIBLES_DIAS, SSE_HEARTBEAT_S
+from .models import EstadoUpdate, CitaCreate, RetrasoUpdate, BatchRequest
+from .sheets_async import get_ws_dia, get_ws_lectura, lock_fecha, run_sheets
 from .services import (
     leer_agenda,
     cambiar_estado,
@@ -11,121 +22,501 @@ from .services import (
     cambiar_avisada,
     mover_cita,
     sugerir_clientas_para_hueco,
+    aplicar_operaciones,
+    aplicar_retraso_manual,
+    avisos_de_agenda,
+    huecos_de_agenda,
+    ventanas_libres,
+    vista_dia,
+    leer_rango,
+    agenda_cache,
+    cambios_de_agenda,
+    indice_flexibles,
+    fechas_siguientes,
+    indexar_dias,
+    candidatas_otros_dias,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=metrics.RutaCronometrada)
+
+# Máximo de días por petición a /agenda/rango
+RANGO_MAX_DIAS = 62
+
+
+def _error_http(e: Exception) -> HTTPException:
+    """
+    Traduce un error a respuesta HTTP:
+    - Cuota de Google agotada (tras reintentos) → 429 con Retry-After
+    - Google caído / error temporal → 503
+    - Resto (validación, filas inválidas...) → 400
+    """
+    status = status_de(e)
+    if status == 429:
+        return HTTPException(
+            status_code=429,
+            detail="Google Sheets: cuota agotada, reintenta en unos segundos",
+            headers={"Retry-After": "30"},
+        )
+    if status is not None and status >= 500:
+        return HTTPException(
+            status_code=503,
+            detail="Google Sheets no disponible, reintenta en unos segundos",
+            headers={"Retry-After": "10"},
+        )
+    return HTTPException(status_code=400, detail=str(e))
+
+
+async def _escritura(request: Request, fn):
+    """
+    Ejecuta una escritura respetando la cabecera Idempotency-Key:
+    la misma clave (en el mismo endpoint) recibe la respuesta guardada
+    en vez de volver a escribir; la misma clave con otra petición
+    (query o cuerpo distintos) es un 422. Traduce los errores con
+    _error_http.
+    """
+    clave = request.headers.get("idempotency-key")
+    huella = None
+    if clave:
+        clave = f"{request.url.path} {clave}"
+        cuerpo = await request.body()
+        huella = hashlib.sha256(request.url.query.encode() + b"\n" + cuerpo).hexdigest()
+    try:
+        return await registro_idempotencia.ejecutar(clave, fn, huella)
+    except ClaveReutilizada as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise _error_http(e)
+
+
+# ---------------------------------------------------------------------
+# Peticiones condicionales (ETag / If-None-Match / ?since=)
+# ---------------------------------------------------------------------
+#
+# El ETag de un día es su versión (events.event_bus), que suben las
+# escrituras y los cambios detectados al recargar la hoja. La versión se
+# toma antes de leer la agenda: si entra una escritura en medio, la
+# respuesta trae datos más nuevos que su ETag y la siguiente petición
+# simplemente no da 304.
+
+def _etag(*partes) -> str:
+    return '"' + "-".join(str(p) for p in partes) + '"'
+
+
+def _etag_coincide(request: Request, etag: str) -> bool:
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in cabecera.split(","))
+
+
+def _no_modificado(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _con_etag(contenido, etag: str) -> JSONResponse:
+    # no-cache: el navegador guarda la respuesta pero revalida siempre
+    return JSONResponse(contenido, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 
 @router.get("/agenda")
-def obtener_agenda(fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD")):
+async def obtener_agenda(
+    request: Request,
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+    since: Optional[int] = Query(None, description="Versión que ya tiene el cliente: devuelve solo las filas cambiadas"),
+):
     """
     Devuelve la agenda completa de un día.
-    Si la hoja no existe, se crea automáticamente desde PLANTILLA_DIA.
+    Si la hoja no existe, se devuelve la de PLANTILLA_DIA sin crearla
+    (se crea en la primera escritura).
+    - Con If-None-Match igual a la versión actual → 304 sin cuerpo
+    - Con ?since=<versión> → {fecha, version, completa, filas}: solo las
+      filas cambiadas desde esa versión (o todas si no se puede saber)
     """
     try:
-        ws, _ = get_ws_dia(fecha)
-        agenda = leer_agenda(ws)
-        return agenda
+        ws, fecha_iso = await get_ws_lectura(fecha)
+        version = event_bus.version(fecha_iso)
+        etag = _etag("agenda", fecha_iso, version)
+        if since is None and agenda_cache.contiene(fecha_iso) and _etag_coincide(request, etag):
+            return _no_modificado(etag)
+
+        agenda = await run_sheets(leer_agenda, ws)
+
+        if since is not None:
+            cambiadas = event_bus.cambios_desde(fecha_iso, since)
+            return {
+                "fecha": fecha_iso,
+                "version": version,
+                "completa": cambiadas is None,
+                "filas": agenda if cambiadas is None else cambios_de_agenda(agenda, cambiadas),
+            }
+
+        if event_bus.version(fecha_iso) == version and _etag_coincide(request, etag):
+            return _no_modificado(etag)
+        return _con_etag(agenda, etag)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _error_http(e)
+
+
+@router.get("/agenda/cache")
+async def estadisticas_cache():
+    """
+    Contadores de la caché de agenda (hits, misses, invalidaciones).
+    """
+    return agenda_cache.stats()
+
+
+@router.get("/agenda/eventos/stats")
+async def estadisticas_eventos():
+    """
+    Clientes conectados a /agenda/eventos y eventos publicados.
+    """
+    return event_bus.stats()
+
+
+@router.get("/agenda/flexibles/stats")
+async def estadisticas_flexibles():
+    """
+    Días y citas en el índice de clientas flexibles entre días.
+    """
+    return indice_flexibles.stats()
+
+
+@router.get("/agenda/cuota")
+async def estadisticas_cuota():
+    """
+    Estado del planificador de peticiones a Google: cola, tokens, reintentos.
+    """
+    return quota_scheduler.stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    """
+    Métricas en formato de texto de Prometheus: latencia por endpoint,
+    llamadas a Sheets por método y función, caché y cuota.
+    """
+    return PlainTextResponse(
+        metrics.exportar(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
 @router.post("/agenda/estado")
-def actualizar_estado(
+async def actualizar_estado(
+    request: Request,
     payload: EstadoUpdate,
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
 ):
     """
-    Cambia el estado de una cita (confirmada / cancelada / hueco)
+    Cambia el estado de una cita (confirmada / cancelada / hueco).
+    Devuelve la fila resultante.
     """
-    try:
-        ws, _ = get_ws_dia(fecha)
-        cambiar_estado(
-            ws=ws,
-            row_sheet=payload.row_sheet,
-            estado=payload.estado,
-        )
-        return {"ok": True}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(fecha)
+        async with lock_fecha(fecha_iso):
+            fila = await run_sheets(
+                cambiar_estado,
+                ws=ws,
+                row_sheet=payload.row_sheet,
+                estado=payload.estado,
+            )
+        return {"ok": True, "fila": fila}
+
+    return await _escritura(request, escribir)
 
 
 @router.post("/agenda/cita")
-def crear_cita_endpoint(payload: CitaCreate):
+async def crear_cita_endpoint(
+    request: Request,
+    payload: CitaCreate,
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD (si no viene en el cuerpo)"),
+):
     """
     Crea o completa una cita en una fila (normalmente un hueco).
+    Devuelve la fila resultante.
     """
-    try:
-        ws, _ = get_ws_dia(payload.fecha)
-        crear_cita(
-            ws=ws,
-            row_sheet=payload.row_sheet,
-            cliente=payload.cliente,
-            telefono=payload.telefono,
-            servicio=payload.servicio,
-            duracion=payload.duracion,
-            flexibilidad=payload.flexibilidad,
-        )
-        return {"ok": True}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(payload.fecha or fecha)
+        async with lock_fecha(fecha_iso):
+            fila = await run_sheets(
+                crear_cita,
+                ws=ws,
+                row_sheet=payload.row_sheet,
+                cliente=payload.cliente,
+                telefono=payload.telefono,
+                servicio=payload.servicio,
+                duracion=payload.duracion,
+                flexibilidad=payload.flexibilidad,
+            )
+        return {"ok": True, "fila": fila}
+
+    return await _escritura(request, escribir)
 
 
 @router.get("/agenda/huecos")
-def obtener_huecos(fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD")):
+async def obtener_huecos(fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD")):
     """
     Detecta huecos y devuelve sugerencias de relleno.
     """
     try:
-        ws, _ = get_ws_dia(fecha)
-        huecos = detectar_huecos(ws)
+        ws, _ = await get_ws_lectura(fecha)
+        huecos = await run_sheets(detectar_huecos, ws)
         return huecos
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _error_http(e)
+
+
+@router.get("/agenda/libres")
+async def obtener_ventanas_libres(
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+    minimo: int = Query(0, ge=0, description="Minutos libres mínimos"),
+):
+    """
+    Ventanas libres reales del día (descontando lo que ocupa cada cita
+    confirmada) de al menos `minimo` minutos.
+    """
+    try:
+        ws, _ = await get_ws_lectura(fecha)
+        agenda = await run_sheets(leer_agenda, ws)
+        return ventanas_libres(agenda, minimo)
+    except Exception as e:
+        raise _error_http(e)
 
 
 @router.post("/agenda/avisada")
-def actualizar_avisada(
+async def actualizar_avisada(
+    request: Request,
     row_sheet: int,
     avisada: str,
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
 ):
     """
-    Marca una cita como avisada (Si / No)
+    Marca una cita como avisada (Si / No).
+    Devuelve la fila resultante.
     """
-    try:
-        ws, _ = get_ws_dia(fecha)
-        cambiar_avisada(
-            ws=ws,
-            row_sheet=row_sheet,
-            avisada=avisada,
-        )
-        return {"ok": True}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(fecha)
+        async with lock_fecha(fecha_iso):
+            fila = await run_sheets(
+                cambiar_avisada,
+                ws=ws,
+                row_sheet=row_sheet,
+                avisada=avisada,
+            )
+        return {"ok": True, "fila": fila}
+
+    return await _escritura(request, escribir)
 
 
 @router.post("/agenda/mover")
-def mover_cita_endpoint(
+async def mover_cita_endpoint(
+    request: Request,
     row_origen: int,
     row_destino: int,
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
 ):
     """
-    Mueve una cita de una hora a otra (fila origen → fila destino)
+    Mueve una cita de una hora a otra (fila origen → fila destino).
+    Devuelve las dos filas resultantes [origen, destino].
+    """
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(fecha)
+        async with lock_fecha(fecha_iso):
+            filas = await run_sheets(
+                mover_cita,
+                ws=ws,
+                row_origen=row_origen,
+                row_destino=row_destino,
+            )
+        return {"ok": True, "filas": filas}
+
+    return await _escritura(request, escribir)
+
+
+@router.get("/agenda/vista")
+async def obtener_vista(
+    request: Request,
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+    margen_adelanto: int = Query(5, ge=0, description="Minutos libres mínimos para avisar de adelanto"),
+    since: Optional[int] = Query(None, description="Versión que ya tiene el cliente: devuelve solo las filas cambiadas"),
+):
+    """
+    Pantalla completa de un día con una sola lectura de la hoja:
+    agenda, huecos reales (con clientas sugeridas) y avisos.
+    - Con If-None-Match igual a la versión actual → 304 sin cuerpo
+    - Con ?since=<versión> → mismo formato que los eventos de
+      /agenda/eventos (filas cambiadas + huecos y avisos), o la vista
+      completa con completa=true si no se puede saber qué cambió
     """
     try:
-        ws, _ = get_ws_dia(fecha)
-        mover_cita(
-            ws=ws,
-            row_origen=row_origen,
-            row_destino=row_destino,
-        )
-        return {"ok": True}
+        ws, fecha_iso = await get_ws_lectura(fecha)
+        # Versión antes de leer: si entra una escritura en medio, el
+        # cliente recibe su evento igualmente y lo aplica de nuevo
+        version = event_bus.version(fecha_iso)
+        etag = _etag("vista", fecha_iso, version, margen_adelanto)
+        if since is None and agenda_cache.contiene(fecha_iso) and _etag_coincide(request, etag):
+            return _no_modificado(etag)
+
+        agenda = await run_sheets(leer_agenda, ws)
+        cambiadas = event_bus.cambios_desde(fecha_iso, since) if since is not None else None
+        vista = vista_dia(agenda, margen_adelanto)
+
+        if cambiadas is not None:
+            return {
+                "fecha": fecha_iso,
+                "version": version,
+                "completa": False,
+                "filas": cambios_de_agenda(agenda, cambiadas),
+                "huecos": vista["huecos"],
+                "avisos": vista["avisos"],
+            }
+        if since is not None:
+            return {**vista, "fecha": fecha_iso, "version": version, "completa": True}
+
+        if event_bus.version(fecha_iso) == version and _etag_coincide(request, etag):
+            return _no_modificado(etag)
+        return _con_etag({**vista, "fecha": fecha_iso, "version": version}, etag)
     except Exception as e:
+        raise _error_http(e)
+
+
+@router.get("/agenda/eventos")
+async def eventos_agenda(fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD")):
+    """
+    Cambios de la agenda de un día en tiempo real (Server-Sent Events).
+    Cada evento "filas" lleva la versión del día, las filas que han
+    cambiado y los huecos y avisos recalculados; con filas=null el
+    cliente debe recargar la vista entera.
+    """
+    fecha_iso = fecha or date.today().isoformat()
+    suscripcion = event_bus.suscribir(fecha_iso)
+
+    async def stream():
+        try:
+            # Reconexión del navegador a los 3 s si se corta
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.siguiente(), SSE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Comentario para que proxies y móviles no corten la conexión
+                    yield ": ping\n\n"
+                    continue
+                yield formato_sse(evento)
+        finally:
+            event_bus.cancelar(suscripcion)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/agenda/rango")
+async def obtener_rango(
+    desde: str = Query(..., description="Fecha inicial YYYY-MM-DD"),
+    hasta: str = Query(..., description="Fecha final YYYY-MM-DD (incluida)"),
+):
+    """
+    Agenda de varios días (p. ej. la semana) con una sola lectura de la hoja.
+    Los días sin hoja se devuelven como agenda virtual, sin crearlos.
+    Respuesta en NDJSON: una línea por día.
+    """
+    try:
+        inicio = date.fromisoformat(desde)
+        fin = date.fromisoformat(hasta)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    num_dias = (fin - inicio).days + 1
+    if num_dias < 1:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser igual o posterior a 'desde'")
+    if num_dias > RANGO_MAX_DIAS:
+        raise HTTPException(status_code=400, detail=f"Máximo {RANGO_MAX_DIAS} días por petición")
+
+    fechas = [(inicio + timedelta(days=i)).isoformat() for i in range(num_dias)]
+
+    try:
+        dias = await run_sheets(leer_rango, fechas)
+    except Exception as e:
+        raise _error_http(e)
+
+    def ndjson():
+        for dia in dias:
+            yield json.dumps(dia, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/agenda/avisos")
+async def obtener_avisos(
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+    margen_adelanto: int = Query(5, ge=0, description="Minutos libres mínimos para avisar de adelanto"),
+):
+    """
+    Avisos de retraso / adelanto del día.
+    Se calculan sobre la agenda ya leída (caché), sin otra lectura de la hoja.
+    """
+    try:
+        ws, _ = await get_ws_lectura(fecha)
+        agenda = await run_sheets(leer_agenda, ws)
+        return avisos_de_agenda(agenda, margen_adelanto)
+    except Exception as e:
+        raise _error_http(e)
+
+
+@router.post("/agenda/retraso")
+async def aplicar_retraso(
+    request: Request,
+    payload: RetrasoUpdate,
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+):
+    """
+    Suma minutos a la hora de una cita (retraso manual).
+    Devuelve la fila resultante.
+    """
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(fecha)
+        async with lock_fecha(fecha_iso):
+            fila = await run_sheets(
+                aplicar_retraso_manual,
+                ws=ws,
+                row_sheet=payload.row_sheet,
+                minutos=payload.minutos,
+            )
+        return {"ok": True, "fila": fila}
+
+    return await _escritura(request, escribir)
+
+
+@router.post("/agenda/batch")
+async def aplicar_batch(request: Request, payload: BatchRequest):
+    """
+    Aplica varias operaciones (estado, cita, avisada, mover, retraso)
+    sobre un día con una sola escritura en la hoja.
+    Devuelve el resultado de cada operación.
+    """
+    async def escribir():
+        ws, fecha_iso = await get_ws_dia(payload.fecha)
+        async with lock_fecha(fecha_iso):
+            resultados = await run_sheets(
+                aplicar_operaciones,
+                ws=ws,
+                operaciones=[op.model_dump() for op in payload.operaciones],
+            )
+        return {
+            "ok": all(r["ok"] for r in resultados),
+            "resultados": resultados,
+        }
+
+    return await _escritura(request, escribir)
+
+
 @router.get("/agenda/hueco/sugeridas")
-def obtener_sugeridas_para_hueco(
+async def obtener_sugeridas_para_hueco(
     row_sheet: int,
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
 ):
@@ -133,11 +524,11 @@ def obtener_sugeridas_para_hueco(
     Devuelve las clientas flexibles que encajan en un hueco concreto.
     """
     try:
-        ws, _ = get_ws_dia(fecha)
-        agenda = leer_agenda(ws)
+        ws, _ = await get_ws_lectura(fecha)
+        agenda = await run_sheets(leer_agenda, ws)
 
-        # Detectar huecos reales
-        huecos = detectar_huecos(ws)
+        # Detectar huecos reales (sobre la misma lectura)
+        huecos = huecos_de_agenda(agenda)
         hueco = next((h for h in huecos if h["row_sheet"] == row_sheet), None)
 
         if not hueco:
@@ -149,4 +540,33 @@ def obtener_sugeridas_para_hueco(
         )
 
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise _error_http(e)
+
+
+@router.get("/agenda/hueco/candidatas")
+async def obtener_candidatas_otros_dias(
+    row_sheet: int,
+    fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD"),
+    dias: int = Query(FLEXIBLES_DIAS, ge=1, le=RANGO_MAX_DIAS, description="Días siguientes en los que buscar"),
+    limite: int = Query(20, ge=1, description="Máximo de clientas devueltas"),
+):
+    """
+    Clientas flexibles con cita en los próximos días que caben en un hueco
+    concreto (para adelantarlas). Sale del índice de flexibles: solo se
+    lee la hoja de los días que no estén ya indexados, y de una vez.
+    """
+    try:
+        ws, fecha_iso = await get_ws_lectura(fecha)
+        agenda = await run_sheets(leer_agenda, ws)
+
+        hueco = next((h for h in huecos_de_agenda(agenda) if h["row_sheet"] == row_sheet), None)
+        if not hueco:
+            return []
+
+        fechas = fechas_siguientes(fecha_iso, dias)
+        if indice_flexibles.faltan(fechas):
+            await run_sheets(indexar_dias, fechas)
+        return candidatas_otros_dias(fechas, hueco["Duracion"], limite)
+
+    except Exception as e:
+        raise _error_http(e)
@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se sirve gzip
+    brotli = None
+
+# ---------------------------------------------------------------------
+# Recursos estáticos de la interfaz (app/static)
+# ---------------------------------------------------------------------
+#
+# Al arrancar se leen los ficheros de app/static y, para cada uno:
+# - se calcula un nombre con la huella del contenido (app.3f2a9c1b.js),
+#   que se sirve con caché inmutable de un año: si cambia el fichero,
+#   cambia el nombre
+# - se comprime una sola vez en gzip y brotli
+#
+# Los ficheros pueden referenciar a otros como {{app.css}} / {{app.js}},
+# que se sustituyen por su URL con huella ({{version}}: huella del
+# conjunto). Se resuelven primero los que no referencian a nadie.
+#
+# index.html (la única página, en /) y sw.js (el service worker, que
+# necesita una URL fija en la raíz para controlar toda la app) no llevan
+# huella: se sirven con no-cache + ETag, así cada visita solo revalida
+# el HTML y el navegador detecta cuándo hay un service worker nuevo.
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+SHELL = "index.html"
+SERVICE_WORKER = "sw.js"
+FIJOS = (SHELL, SERVICE_WORKER)
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_SHELL = "no-cache"
+
+# Por debajo de esto comprimir no compensa
+MIN_COMPRIMIR = 512
+
+
+class Recurso:
+    """
+    Un fichero servido: contenido en claro y precomprimido, tipo y ETag.
+    """
+
+    def __init__(self, contenido: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.huella = hashlib.sha256(contenido).hexdigest()[:10]
+        self.etag = f'"{self.huella}"'
+        self.variantes: Dict[str, bytes] = {"identity": contenido}
+
+        if len(contenido) >= MIN_COMPRIMIR:
+            self.variantes["gzip"] = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variantes["br"] = brotli.compress(contenido, quality=11)
+
+    def respuesta(self, accept_encoding: str, if_none_match: Optional[str] = None) -> Response:
+        cabeceras = {
+            "Cache-Control": self.cache_control,
+            "ETag": self.etag,
+            "Vary": "Accept-Encoding",
+        }
+        if if_none_match and self.etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=cabeceras)
+
+        codificacion = _elegir_codificacion(accept_encoding, self.variantes)
+        if codificacion != "identity":
+            cabeceras["Content-Encoding"] = codificacion
+        return Response(
+            content=self.variantes[codificacion],
+            media_type=self.media_type,
+            headers=cabeceras,
+        )
+
+
+def _elegir_codificacion(accept_encoding: str, variantes: Dict[str, bytes]) -> str:
+    """
+    Mejor variante disponible que acepta el cliente: br > gzip > identity.
+    """
+    aceptadas = set()
+    for parte in (accept_encoding or "").split(","):
+        nombre, _, params = parte.partition(";")
+        clave, _, valor = params.partition("=")
+        if clave.strip() == "q":
+            try:
+                if float(valor) == 0:
+                    continue
+            except ValueError:
+                pass
+        aceptadas.add(nombre.strip().lower())
+
+    for codificacion in ("br", "gzip"):
+        if codificacion in variantes and (codificacion in aceptadas or "*" in aceptadas):
+            return codificacion
+    return "identity"
+
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def _media_type(nombre: str) -> str:
+    tipo = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+    if tipo.startswith("text/") or tipo in (
+        "application/javascript", "application/json", "application/manifest+json",
+    ):
+        tipo += "; charset=utf-8"
+    return tipo
+
+
+class Assets:
+    """
+    Recursos de app/static, con huella y precomprimidos en memoria.
+    """
+
+    def __init__(self, directorio: Path = STATIC_DIR):
+        self.recursos: Dict[str, Recurso] = {}
+        # nombre original → URL con huella
+        self.urls: Dict[str, str] = {}
+        # recursos sin huella (index.html, sw.js)
+        self.fijos: Dict[str, Recurso] = {}
+
+        ficheros = [r for r in sorted(directorio.iterdir()) if r.is_file()]
+        contenidos = {r.name: r.read_bytes() for r in ficheros}
+        con_huella = [r for r in ficheros if r.name not in FIJOS]
+        # Primero los que no referencian a otros (CSS, JS, iconos), luego
+        # los que sí (p. ej. el manifest, que apunta a los iconos)
+        con_huella.sort(key=lambda r: b"{{" in contenidos[r.name])
+
+        for ruta in con_huella:
+            contenido = self._sustituir(contenidos[ruta.name])
+            recurso = Recurso(contenido, _media_type(ruta.name), CACHE_INMUTABLE)
+            nombre = f"{ruta.stem}.{recurso.huella}{ruta.suffix}"
+            self.recursos[nombre] = recurso
+            self.urls[ruta.name] = f"/static/{nombre}"
+
+        self.version = hashlib.sha256(
+            "\n".join(sorted(self.urls.values())).encode("utf-8")
+        ).hexdigest()[:10]
+
+        for nombre in FIJOS:
+            if nombre in contenidos:
+                self.fijos[nombre] = Recurso(
+                    self._sustituir(contenidos[nombre], version=self.version),
+                    _media_type(nombre),
+                    CACHE_SHELL,
+                )
+        self.shell = self.fijos[SHELL]
+
+    def _sustituir(self, contenido: bytes, **extra: str) -> bytes:
+        if b"{{" not in contenido:
+            return contenido
+        texto = contenido.decode("utf-8")
+        for original, url in {**self.urls, **extra}.items():
+            texto = texto.replace("{{" + original + "}}", url)
+        return texto.encode("utf-8")
+
+    def get(self, nombre: str) -> Optional[Recurso]:
+        return self.recursos.get(nombre)
+
+    def fijo(self, nombre: str) -> Optional[Recurso]:
+        return self.fijos.get(nombre)
+
+
+@lru_cache(maxsize=1)
+def get_assets() -> Assets:
+    return Assets()
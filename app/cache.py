@@ -0,0 +1,241 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ---------------------------------------------------------------------
+# Caché de agenda por día
+# ---------------------------------------------------------------------
+#
+# Guarda, por fecha (título de la hoja), los valores crudos de la hoja y
+# la agenda ya parseada. Las escrituras de services.py actualizan la
+# entrada (write-through) para que las lecturas sigan siendo coherentes
+# sin volver a pedir la hoja a Google.
+#
+# La caché es por proceso: el TTL acota cuánto tarda en verse un cambio
+# hecho desde otro proceso o directamente en la hoja.
+#
+# Cada día tiene una generación que sube con cada escritura o
+# invalidación, esté o no en caché. Una lectura en frío la anota antes
+# de pedir la hoja y set() descarta el resultado si ha cambiado: una
+# escritura confirmada mientras la lectura estaba en vuelo no queda
+# tapada por la foto de antes.
+
+# Días con generación recordada antes de olvidarlas todas (época nueva)
+MAX_GENERACIONES = 1000
+
+Generacion = Tuple[int, int]  # (época, cambios del día)
+
+
+class _Entrada:
+    __slots__ = ("values", "filas", "expira")
+
+    def __init__(self, values: List[List[Any]], filas: List[Dict[str, Any]], expira: float):
+        self.values = values
+        self.filas = filas
+        self.expira = expira
+
+
+class AgendaCache:
+    """
+    Caché en memoria de la agenda de cada día, con TTL y contadores.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        parse_fila: Callable[[str, int, List[Any]], Dict[str, Any]],
+    ):
+        self.ttl = ttl
+        self._parse_fila = parse_fila
+        self._lock = threading.Lock()
+        self._entradas: Dict[str, _Entrada] = {}
+        self._cargas: Dict[str, threading.Lock] = {}
+        self._generaciones: Dict[str, int] = {}
+        # Sube al olvidar todas las generaciones (invalidar() de todos los
+        # días, o demasiados días distintos)
+        self._epoca = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.actualizaciones = 0
+        self.invalidaciones = 0
+        self.descartadas = 0
+
+    def _cambio(self, fecha: str) -> None:
+        if len(self._generaciones) >= MAX_GENERACIONES and fecha not in self._generaciones:
+            # Se olvidan todas: la época nueva descarta las lecturas en vuelo
+            self._generaciones.clear()
+            self._epoca += 1
+        self._generaciones[fecha] = self._generaciones.get(fecha, 0) + 1
+
+    def _generacion(self, fecha: str) -> Generacion:
+        return self._epoca, self._generaciones.get(fecha, 0)
+
+    def generacion(self, fecha: str) -> Generacion:
+        """
+        Generación actual del día: anotarla antes de leer la hoja y
+        pasársela a set().
+        """
+        with self._lock:
+            return self._generacion(fecha)
+
+    def _vigente(self, fecha: str) -> Optional[_Entrada]:
+        entrada = self._entradas.get(fecha)
+        if entrada is None:
+            return None
+        if entrada.expira <= time.monotonic():
+            del self._entradas[fecha]
+            return None
+        return entrada
+
+    def get(self, fecha: str, contar: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """
+        Devuelve una copia de la agenda parseada del día, o None si no
+        está en caché (o ha caducado).
+        """
+        with self._lock:
+            entrada = self._vigente(fecha)
+            if entrada is None:
+                if contar:
+                    self.misses += 1
+                return None
+            if contar:
+                self.hits += 1
+            return [dict(f) for f in entrada.filas]
+
+    def contiene(self, fecha: str) -> bool:
+        """
+        True si el día está en caché y vigente (sin contar hit ni miss).
+        """
+        with self._lock:
+            return self._vigente(fecha) is not None
+
+    def valores(self, fecha: str) -> Optional[List[List[Any]]]:
+        """
+        Valores crudos en caché del día (la lista que mantienen las
+        escrituras, sin copiar: solo lectura), o None.
+        """
+        with self._lock:
+            entrada = self._vigente(fecha)
+            return entrada.values if entrada is not None else None
+
+    def lock_carga(self, fecha: str) -> threading.Lock:
+        """
+        Lock por día para que varias lecturas simultáneas de un día que
+        no está en caché hagan una sola llamada a Google.
+        """
+        with self._lock:
+            return self._cargas.setdefault(fecha, threading.Lock())
+
+    def set(
+        self,
+        fecha: str,
+        values: List[List[Any]],
+        filas: List[Dict[str, Any]],
+        generacion: Optional[Generacion] = None,
+    ) -> bool:
+        """
+        Guarda los valores crudos de la hoja y su agenda parseada.
+        Con `generacion` (la de antes de leer), no guarda nada si el día
+        ha cambiado desde entonces. Devuelve False si no se guardó porque
+        la lectura ya no es actual.
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion(fecha):
+                self.descartadas += 1
+                return False
+            if self.ttl <= 0:
+                return True
+            self._entradas[fecha] = _Entrada(
+                values=[list(r) for r in values],
+                filas=[dict(f) for f in filas],
+                expira=time.monotonic() + self.ttl,
+            )
+            return True
+
+    def filas_crudas(self, fecha: str, rows: List[int]) -> Optional[Dict[int, List[Any]]]:
+        """
+        Devuelve copias de las filas crudas pedidas (1-based), o None si
+        el día no está en caché o alguna fila queda fuera.
+        """
+        with self._lock:
+            entrada = self._vigente(fecha)
+            if entrada is None or any(r < 2 or r > len(entrada.values) for r in rows):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {r: list(entrada.values[r - 1]) for r in rows}
+
+    def filas_parseadas(self, fecha: str, rows: List[int]) -> Optional[Dict[int, Dict[str, Any]]]:
+        """
+        Copias de las filas parseadas pedidas (1-based), o None si el día
+        no está en caché o alguna fila queda fuera. No cuenta hit ni miss.
+        """
+        with self._lock:
+            entrada = self._vigente(fecha)
+            if entrada is None or any(r < 2 or r > len(entrada.filas) + 1 for r in rows):
+                return None
+            return {r: dict(entrada.filas[r - 2]) for r in rows}
+
+    def actualizar_celda(self, fecha: str, row: int, col: int, valor: Any) -> None:
+        """
+        Aplica una escritura (1-based row/col) sobre la entrada en caché.
+        """
+        self.actualizar_celdas(fecha, [(row, col, valor)])
+
+    def actualizar_celdas(self, fecha: str, celdas: List[Tuple[int, int, Any]]) -> None:
+        """
+        Aplica varias escrituras (row, col, valor) sobre la entrada en caché.
+        Si alguna fila no está cargada, invalida el día entero.
+        """
+        with self._lock:
+            self._cambio(fecha)
+            entrada = self._vigente(fecha)
+            if entrada is None:
+                return
+
+            if any(row < 2 or row > len(entrada.values) for row, _, _ in celdas):
+                del self._entradas[fecha]
+                self.invalidaciones += 1
+                return
+
+            tocadas = set()
+            for row, col, valor in celdas:
+                fila = entrada.values[row - 1]
+                if len(fila) < col:
+                    fila.extend([""] * (col - len(fila)))
+                fila[col - 1] = "" if valor is None else str(valor)
+                tocadas.add(row)
+
+            for row in tocadas:
+                entrada.filas[row - 2] = self._parse_fila(fecha, row, entrada.values[row - 1])
+            self.actualizaciones += len(celdas)
+
+    def invalidar(self, fecha: Optional[str] = None) -> None:
+        """
+        Descarta la entrada de un día (o todas si fecha es None).
+        """
+        with self._lock:
+            if fecha is None:
+                self.invalidaciones += len(self._entradas)
+                self._entradas.clear()
+                self._generaciones.clear()
+                self._epoca += 1
+                return
+            self._cambio(fecha)
+            if self._entradas.pop(fecha, None) is not None:
+                self.invalidaciones += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "dias": len(self._entradas),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "actualizaciones": self.actualizaciones,
+                "invalidaciones": self.invalidaciones,
+                "descartadas": self.descartadas,
+            }
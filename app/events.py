@@ -0,0 +1,262 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# ---------------------------------------------------------------------
+# Eventos de cambios por día (Server-Sent Events)
+# ---------------------------------------------------------------------
+#
+# Cada escritura confirmada (UnitOfWork.commit) publica un evento con las
+# filas que han cambiado en la fecha. Los clientes suscritos a esa fecha
+# (GET /agenda/eventos) lo reciben y aplican el cambio en su pantalla sin
+# volver a pedir la agenda.
+#
+# - Cada fecha tiene un número de versión que sube con cada evento; el
+#   cliente lo usa para detectar eventos perdidos y recargar. Es también
+#   el ETag de GET /agenda y /agenda/vista, y la base de ?since=.
+# - Las versiones empiezan en el instante de arranque del proceso (ms),
+#   así una versión de antes de un reinicio nunca se confunde con una
+#   de después.
+# - Solo se recuerdan las MAX_DIAS fechas usadas más recientemente (las
+#   que tienen suscriptores no se olvidan). Una fecha olvidada vuelve a
+#   empezar por encima de cualquier versión ya dada, así que un ETag o
+#   un ?since= antiguo nunca coincide: el cliente recibe el día entero.
+# - Los cambios hechos a mano en la hoja no pasan por aquí: se detectan
+#   al recargar el día (contenido distinto del último conocido) y cuentan
+#   como un cambio de todas las filas. No se calcula ninguna firma: se
+#   guarda la referencia al contenido (el de la caché, que las escrituras
+#   mantienen al día) y solo se compara al volver a leer el día.
+# - Las escrituras pueden venir de hilos de trabajo: la entrega a cada
+#   suscriptor se hace en su event loop con call_soon_threadsafe.
+# - El bus es por proceso: con varios workers, cada uno solo avisa de
+#   sus propias escrituras.
+
+# Eventos pendientes por suscriptor antes de darlo por desbordado
+MAX_PENDIENTES = 100
+
+# Versiones recordadas por fecha para responder a ?since=
+MAX_HISTORIAL = 200
+
+# Fechas con versión e historial en memoria
+MAX_DIAS = 1000
+
+
+class Suscripcion:
+    """
+    Cola de eventos de un cliente conectado a una fecha.
+    """
+
+    def __init__(self, fecha: str, loop: asyncio.AbstractEventLoop):
+        self.fecha = fecha
+        self.loop = loop
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDIENTES)
+
+    def _entregar(self, evento: Dict[str, Any]) -> None:
+        # Se ejecuta en el event loop del suscriptor
+        if self.cola.full():
+            # Cliente que no lee: se descarta lo pendiente y se le pide
+            # que recargue la agenda entera
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            evento = {"fecha": self.fecha, "version": evento["version"], "filas": None}
+        self.cola.put_nowait(evento)
+
+    async def siguiente(self) -> Dict[str, Any]:
+        return await self.cola.get()
+
+
+class _Dia:
+    """
+    Versión de una fecha y las filas cambiadas en cada versión reciente
+    (None = cambio de día completo).
+    """
+    __slots__ = ("version", "historial", "contenido")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.historial: Deque[Tuple[int, Optional[frozenset]]] = deque(maxlen=MAX_HISTORIAL)
+        # Último contenido conocido del día (valores con cabecera), o None
+        self.contenido: Optional[List[List[Any]]] = None
+
+    def desde(self) -> int:
+        """
+        Versión más antigua a partir de la cual el historial está completo
+        (las versiones son consecutivas).
+        """
+        return self.version - len(self.historial)
+
+    def subir(self, filas: Optional[frozenset]) -> int:
+        self.version += 1
+        self.historial.append((self.version, filas))
+        return self.version
+
+
+class EventBus:
+    """
+    Suscriptores, versión e historial de cambios de cada fecha.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores: Dict[str, Set[Suscripcion]] = {}
+        # Orden de uso: la primera es la que lleva más tiempo sin cambios
+        self._dias: "OrderedDict[str, _Dia]" = OrderedDict()
+        # Versión de las fechas que no están en _dias
+        self._base = time.time_ns() // 1_000_000
+        self.publicados = 0
+        self.olvidados = 0
+
+    def _dia(self, fecha: str) -> _Dia:
+        # Con self._lock tomado
+        dia = self._dias.get(fecha)
+        if dia is None:
+            dia = self._dias[fecha] = _Dia(self._base)
+            self._olvidar()
+        else:
+            self._dias.move_to_end(fecha)
+        return dia
+
+    def _olvidar(self) -> None:
+        """
+        Descarta las fechas menos usadas por encima de MAX_DIAS, salvo las
+        que tienen suscriptores. La base sube por encima de sus versiones.
+        """
+        sobran = len(self._dias) - MAX_DIAS
+        if sobran <= 0:
+            return
+        # La última es la que se acaba de crear
+        for fecha in list(self._dias)[:-1]:
+            if fecha in self._suscriptores:
+                continue
+            dia = self._dias.pop(fecha)
+            self._base = max(self._base, dia.version + 1)
+            self.olvidados += 1
+            sobran -= 1
+            if not sobran:
+                break
+
+    def version(self, fecha: str) -> int:
+        with self._lock:
+            dia = self._dias.get(fecha)
+            return dia.version if dia is not None else self._base
+
+    def cambios_desde(self, fecha: str, version: int) -> Optional[Set[int]]:
+        """
+        Filas cambiadas en la fecha después de `version`, o None si no
+        se puede saber (versión desconocida, demasiado antigua, o algún
+        cambio de día completo en medio).
+        """
+        with self._lock:
+            dia = self._dias.get(fecha)
+            actual = dia.version if dia is not None else self._base
+            if version == actual:
+                return set()
+            if dia is None or version > actual or version < dia.desde():
+                return None
+            filas: Set[int] = set()
+            for v, cambiadas in dia.historial:
+                if v <= version:
+                    continue
+                if cambiadas is None:
+                    return None
+                filas |= cambiadas
+            return filas
+
+    def suscribir(self, fecha: str) -> Suscripcion:
+        """
+        Nueva suscripción a los cambios de una fecha.
+        Debe llamarse desde el event loop que va a leer los eventos.
+        """
+        suscripcion = Suscripcion(fecha, asyncio.get_running_loop())
+        with self._lock:
+            self._suscriptores.setdefault(fecha, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            suscriptores = self._suscriptores.get(suscripcion.fecha)
+            if suscriptores is None:
+                return
+            suscriptores.discard(suscripcion)
+            if not suscriptores:
+                del self._suscriptores[suscripcion.fecha]
+
+    def hay_suscriptores(self, fecha: str) -> bool:
+        with self._lock:
+            return bool(self._suscriptores.get(fecha))
+
+    def publicar(
+        self,
+        fecha: str,
+        filas: Iterable[int],
+        contenido: Callable[[], Dict[str, Any]],
+        valores: Optional[List[List[Any]]] = None,
+    ) -> int:
+        """
+        Registra una escritura de `filas` en la fecha (nueva versión) y,
+        si hay alguien escuchando, le envía el evento. `contenido` solo
+        se calcula si hay suscriptores. `valores` es el contenido del día
+        tras la escritura, si se conoce.
+        Se puede llamar desde cualquier hilo. Devuelve la nueva versión.
+        """
+        with self._lock:
+            dia = self._dia(fecha)
+            version = dia.subir(frozenset(filas))
+            dia.contenido = valores
+            suscriptores = list(self._suscriptores.get(fecha, ()))
+
+        if suscriptores:
+            self._enviar(suscriptores, {"fecha": fecha, "version": version, **contenido()})
+        return version
+
+    def observar(self, fecha: str, valores: List[List[Any]]) -> int:
+        """
+        Contenido de la fecha recién leído del backend. Si ha cambiado
+        respecto al último conocido (edición fuera de la app), sube la
+        versión como cambio de día completo y pide a los clientes
+        conectados que recarguen. Devuelve la versión actual.
+        """
+        with self._lock:
+            dia = self._dia(fecha)
+            anterior, dia.contenido = dia.contenido, valores
+            if anterior is None or anterior is valores or anterior == valores:
+                return dia.version
+            version = dia.subir(None)
+            suscriptores = list(self._suscriptores.get(fecha, ()))
+
+        if suscriptores:
+            self._enviar(suscriptores, {"fecha": fecha, "version": version, "filas": None})
+        return version
+
+    def _enviar(self, suscriptores, evento: Dict[str, Any]) -> None:
+        self.publicados += 1
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # Event loop ya cerrado (cliente de una app parada)
+                self.cancelar(suscripcion)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "fechas": len(self._suscriptores),
+                "suscriptores": sum(len(s) for s in self._suscriptores.values()),
+                "publicados": self.publicados,
+                "versiones": len(self._dias),
+                "olvidados": self.olvidados,
+            }
+
+
+event_bus = EventBus()
+
+
+def formato_sse(evento: Dict[str, Any], tipo: str = "filas") -> str:
+    """
+    Mensaje en formato text/event-stream (id = versión de la fecha).
+    """
+    datos = json.dumps(evento, ensure_ascii=False)
+    return f"id: {evento['version']}\nevent: {tipo}\ndata: {datos}\n\n"
@@ -0,0 +1,356 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from gspread.cell import Cell
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+from .metrics import llamada_sheets
+from .quota import ESCRITURA, LECTURA, quota_scheduler
+from .schema import EXPECTED_HEADERS
+from .settings import (
+    FAKE_SHEETS_ERROR_RATE,
+    FAKE_SHEETS_ERROR_STATUS,
+    FAKE_SHEETS_LATENCY_MS,
+)
+from .sheets import PLANTILLA_DIA
+
+# ---------------------------------------------------------------------
+# Google Sheets en memoria
+# ---------------------------------------------------------------------
+#
+# Sustituto de gspread.Spreadsheet / gspread.Worksheet con la superficie
+# que usa la app, para arrancarla sin credenciales (SHEETS_FAKE=1) y
+# para pruebas de carga y benchmarks:
+# - cuenta las llamadas a la "API" por método
+# - latencia configurable por llamada (FAKE_SHEETS_LATENCY_MS)
+# - errores inyectables: aleatorios (FAKE_SHEETS_ERROR_RATE) o
+#   programados con fallar() / fallar_segun(); son APIError de gspread
+#   con su status HTTP
+#
+# Cada llamada pasa por quota_scheduler y por las métricas como una
+# petición real, así que cuota, prioridades, reintentos y /metrics se
+# comportan igual que contra Google.
+
+
+def plantilla_sintetica(
+    inicio: str = "09:00",
+    fin: str = "20:00",
+    paso: int = 30,
+) -> List[List[str]]:
+    """
+    PLANTILLA_DIA de ejemplo: cabecera + un hueco cada `paso` minutos.
+    """
+    h, m = map(int, inicio.split(":"))
+    desde = h * 60 + m
+    h, m = map(int, fin.split(":"))
+    hasta = h * 60 + m
+
+    filas = [list(EXPECTED_HEADERS)]
+    for minuto in range(desde, hasta, paso):
+        filas.append([
+            f"{minuto // 60:02d}:{minuto % 60:02d}",
+            "Hueco", "", "", "Servicio", str(paso), "No", "", "No",
+        ])
+    return filas
+
+
+def api_error(status: int, mensaje: str = "Error simulado") -> APIError:
+    """
+    APIError de gspread con una respuesta HTTP con ese status.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({
+        "error": {"code": status, "message": mensaje, "status": "SIMULATED"},
+    }).encode()
+    return APIError(response)
+
+
+class CalendarioFallos:
+    """
+    Respuestas programadas de una petición: cada llamada consume el
+    siguiente elemento del calendario, un status HTTP (falla con ese
+    status) o None (responde bien). Agotado, responde siempre bien.
+
+    También sirve de stub de petición para QuotaScheduler.run():
+        scheduler.run(CalendarioFallos([429, 429, None]))
+    """
+
+    def __init__(self, calendario: Iterable[Optional[int]], resultado: Any = None):
+        self.resultado = resultado
+        self.llamadas = 0
+        self._pendientes = deque(calendario)
+        self._lock = threading.Lock()
+
+    @property
+    def agotado(self) -> bool:
+        with self._lock:
+            return not self._pendientes
+
+    def siguiente(self) -> Optional[int]:
+        with self._lock:
+            self.llamadas += 1
+            return self._pendientes.popleft() if self._pendientes else None
+
+    def __call__(self) -> Any:
+        status = self.siguiente()
+        if status is not None:
+            raise api_error(status)
+        return self.resultado
+
+
+def _texto(valor: Any) -> str:
+    # USER_ENTERED: la hoja devuelve todo como texto formateado
+    return "" if valor is None else str(valor)
+
+
+class FakeWorksheet:
+    """
+    Pestaña en memoria (lista de filas de texto).
+    """
+
+    def __init__(self, spreadsheet: "FakeSpreadsheet", sheet_id: int, title: str, values: List[List[Any]]):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self._values = [[_texto(v) for v in row] for row in values]
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+
+    def _rango(self, rango: str) -> List[List[str]]:
+        grid = a1_range_to_grid_range(rango)
+        filas = self._values[grid.get("startRowIndex", 0):grid.get("endRowIndex")]
+        c_ini = grid.get("startColumnIndex", 0)
+        c_fin = grid.get("endColumnIndex")
+        return [list(f[c_ini:c_fin]) for f in filas]
+
+    def _todas(self) -> List[List[str]]:
+        ancho = max((len(f) for f in self._values), default=0)
+        return [list(f) + [""] * (ancho - len(f)) for f in self._values]
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        return self.spreadsheet._llamada("get_all_values", LECTURA, self._todas)
+
+    def get_all_records(self, expected_headers: Optional[List[str]] = None, **kwargs) -> List[Dict[str, str]]:
+        def leer():
+            values = self._todas()
+            if not values:
+                return []
+            cabecera = values[0]
+            return [dict(zip(cabecera, fila)) for fila in values[1:]]
+        return self.spreadsheet._llamada("get_all_records", LECTURA, leer)
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        def leer():
+            return list(self._values[row - 1]) if row <= len(self._values) else []
+        return self.spreadsheet._llamada("row_values", LECTURA, leer)
+
+    def cell(self, row: int, col: int, **kwargs) -> Cell:
+        def leer():
+            fila = self._values[row - 1] if row <= len(self._values) else []
+            return Cell(row, col, fila[col - 1] if col <= len(fila) else "")
+        return self.spreadsheet._llamada("cell", LECTURA, leer)
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        def leer():
+            return [self._rango(r) for r in ranges]
+        return self.spreadsheet._llamada("batch_get", LECTURA, leer)
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+
+    def _escribir(self, row: int, col: int, valor: Any) -> None:
+        while len(self._values) < row:
+            self._values.append([])
+        fila = self._values[row - 1]
+        if len(fila) < col:
+            fila.extend([""] * (col - len(fila)))
+        fila[col - 1] = _texto(valor)
+
+    def update_cell(self, row: int, col: int, value: Any) -> None:
+        def escribir():
+            with self.spreadsheet._lock:
+                self._escribir(row, col, value)
+        self.spreadsheet._llamada("update_cell", ESCRITURA, escribir)
+
+    def batch_update(self, data: List[Dict[str, Any]], raw: bool = True, **kwargs) -> None:
+        def escribir():
+            with self.spreadsheet._lock:
+                for bloque in data:
+                    grid = a1_range_to_grid_range(bloque["range"])
+                    row0 = grid.get("startRowIndex", 0) + 1
+                    col0 = grid.get("startColumnIndex", 0) + 1
+                    for dr, valores in enumerate(bloque["values"]):
+                        for dc, valor in enumerate(valores):
+                            self._escribir(row0 + dr, col0 + dc, valor)
+        self.spreadsheet._llamada("batch_update", ESCRITURA, escribir)
+
+
+class FakeSpreadsheet:
+    """
+    Spreadsheet en memoria con contadores de llamadas, latencia y errores.
+    """
+
+    def __init__(
+        self,
+        latencia_ms: float = 0.0,
+        tasa_error: float = 0.0,
+        status_error: int = 429,
+        title: str = "Agenda (fake)",
+        sleep: Callable[[float], None] = time.sleep,
+        aleatorio: Callable[[], float] = random.random,
+    ):
+        self.id = "fake"
+        self.title = title
+        self.latencia_ms = latencia_ms
+        self.tasa_error = tasa_error
+        self.status_error = status_error
+        self._sleep = sleep
+        self._aleatorio = aleatorio
+
+        self._lock = threading.RLock()
+        self._hojas: Dict[str, FakeWorksheet] = {}
+        self._siguiente_id = 0
+        self._fallos: List[Dict[str, Any]] = []
+        self.llamadas: Counter = Counter()
+
+    # -------------------------
+    # Llamadas a la "API"
+    # -------------------------
+
+    def fallar(self, veces: int = 1, status: int = 429, metodo: Optional[str] = None) -> None:
+        """
+        Las próximas `veces` llamadas (a `metodo`, o a cualquiera) fallan con `status`.
+        """
+        self.fallar_segun([status] * veces, metodo)
+
+    def fallar_segun(
+        self,
+        calendario: Iterable[Optional[int]],
+        metodo: Optional[str] = None,
+    ) -> CalendarioFallos:
+        """
+        Las próximas llamadas (a `metodo`, o a cualquiera) responden según
+        el calendario: [429, None, 429] → falla, bien, falla.
+        """
+        fallos = CalendarioFallos(calendario)
+        with self._lock:
+            self._fallos.append({"calendario": fallos, "metodo": metodo})
+        return fallos
+
+    def _fallo_programado(self, metodo: str) -> Optional[int]:
+        with self._lock:
+            for fallo in self._fallos:
+                if fallo["metodo"] in (None, metodo):
+                    status = fallo["calendario"].siguiente()
+                    if fallo["calendario"].agotado:
+                        self._fallos.remove(fallo)
+                    return status
+        return None
+
+    def _llamada(self, metodo: str, tipo: str, fn: Callable[[], Any]) -> Any:
+        """
+        Una petición a la API: cuota → contador → latencia → error o resultado.
+        """
+        def peticion():
+            with self._lock:
+                self.llamadas[metodo] += 1
+            if self.latencia_ms > 0:
+                self._sleep(self.latencia_ms / 1000)
+
+            status = self._fallo_programado(metodo)
+            if status is None and self.tasa_error > 0 and self._aleatorio() < self.tasa_error:
+                status = self.status_error
+            if status is not None:
+                raise api_error(status)
+
+            with self._lock:
+                return fn()
+
+        with llamada_sheets(metodo, tipo):
+            return quota_scheduler.run(peticion, tipo)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hojas": len(self._hojas),
+                "llamadas": dict(self.llamadas),
+                "total": sum(self.llamadas.values()),
+            }
+
+    def reset_llamadas(self) -> None:
+        with self._lock:
+            self.llamadas.clear()
+
+    # -------------------------
+    # Hojas
+    # -------------------------
+
+    def add(self, title: str, values: List[List[Any]]) -> FakeWorksheet:
+        """
+        Crea una pestaña con esos valores (sin contar como llamada).
+        """
+        with self._lock:
+            ws = FakeWorksheet(self, self._siguiente_id, title, values)
+            self._siguiente_id += 1
+            self._hojas[title] = ws
+            return ws
+
+    def worksheets(self, **kwargs) -> List[FakeWorksheet]:
+        return self._llamada("worksheets", LECTURA, lambda: list(self._hojas.values()))
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        def buscar():
+            if title not in self._hojas:
+                raise WorksheetNotFound(title)
+            return self._hojas[title]
+        return self._llamada("worksheet", LECTURA, buscar)
+
+    def duplicate_sheet(self, source_sheet_id: int, new_sheet_name: Optional[str] = None, **kwargs) -> FakeWorksheet:
+        def duplicar():
+            origen = next((ws for ws in self._hojas.values() if ws.id == source_sheet_id), None)
+            if origen is None:
+                raise api_error(404, f"No existe la hoja {source_sheet_id}")
+            titulo = new_sheet_name or f"Copia de {origen.title}"
+            if titulo in self._hojas:
+                raise api_error(400, f"Ya existe una hoja llamada {titulo}")
+            return self.add(titulo, origen._values)
+        return self._llamada("duplicate_sheet", ESCRITURA, duplicar)
+
+    def values_batch_get(self, ranges: List[str], **kwargs) -> Dict[str, Any]:
+        def leer():
+            value_ranges = []
+            for rango in ranges:
+                titulo, _, celdas = rango.partition("!")
+                titulo = titulo.strip("'").replace("''", "'")
+                ws = self._hojas.get(titulo)
+                if ws is None:
+                    raise api_error(400, f"Unable to parse range: {rango}")
+                values = ws._rango(celdas) if celdas else ws._todas()
+                value_ranges.append({"range": rango, "values": values})
+            return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+        return self._llamada("values_batch_get", LECTURA, leer)
+
+
+@lru_cache(maxsize=1)
+def fake_spreadsheet() -> FakeSpreadsheet:
+    """
+    Spreadsheet en memoria del proceso (SHEETS_FAKE=1), con PLANTILLA_DIA.
+    """
+    spreadsheet = FakeSpreadsheet(
+        latencia_ms=FAKE_SHEETS_LATENCY_MS,
+        tasa_error=FAKE_SHEETS_ERROR_RATE,
+        status_error=FAKE_SHEETS_ERROR_STATUS,
+    )
+    spreadsheet.add(PLANTILLA_DIA, plantilla_sintetica())
+    return spreadsheet
@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ---------------------------------------------------------------------
+# Índice de clientas flexibles entre días
+# ---------------------------------------------------------------------
+#
+# Para llenar un hueco que se acaba de abrir, las mejores candidatas
+# suelen ser clientas flexibles con cita otro día de la semana. Leer N
+# hojas por cada hueco es demasiado: este índice guarda, de los días ya
+# leídos, las citas que podrían adelantarse (confirmadas, flexibles, sin
+# avisar), ordenadas por (duración, fecha, hora).
+#
+# - Se rellena bajo demanda, antes de consultar (services.indexar_dias,
+#   desde la caché si el día está en ella), y se mantiene con cada
+#   escritura confirmada (ver services.tras_escritura): no hace falta
+#   volver a leer las hojas para consultar. Leer un día no lo indexa.
+# - "Citas de duración <= D entre dos fechas" son búsquedas binarias por
+#   cada duración distinta (pocas: 30, 45, 60...) más lo que se devuelve.
+# - Cada día indexado caduca a los `ttl` segundos (los cambios hechos a
+#   mano en la hoja solo se ven al releerla); un día caducado o nunca
+#   leído se considera que falta y hay que indexarlo antes de consultar.
+# - Es por proceso y en memoria, como la caché de agenda.
+
+Clave = Tuple[int, str, int, int]  # (duración, fecha, hora_min, row_sheet)
+
+
+class IndiceFlexibles:
+    """
+    Citas candidatas a moverse de varios días, ordenadas por duración.
+    """
+
+    def __init__(self, es_candidata: Callable[[Dict[str, Any]], bool], ttl: float):
+        self.ttl = ttl
+        self._es_candidata = es_candidata
+        self._lock = threading.Lock()
+        # Claves ordenadas de todas las candidatas indexadas
+        self._claves: List[Clave] = []
+        # fecha → {row_sheet: (clave, datos)}
+        self._dias: Dict[str, Dict[int, Tuple[Clave, Dict[str, Any]]]] = {}
+        self._expira: Dict[str, float] = {}
+
+        self.consultas = 0
+
+    @staticmethod
+    def _entrada(fecha: str, fila: Dict[str, Any]) -> Tuple[Clave, Dict[str, Any]]:
+        clave = (fila["Duración"], fecha, fila["Hora_min"], fila["row_sheet"])
+        datos = {
+            "fecha": fecha,
+            "Hora": fila["Hora"],
+            "Cliente": fila["Cliente"],
+            "Telefono": fila["Telefono"],
+            "Servicio": fila["Servicio"],
+            "Duración": fila["Duración"],
+            "row_sheet": fila["row_sheet"],
+        }
+        return clave, datos
+
+    def _quitar(self, clave: Clave) -> None:
+        i = bisect_left(self._claves, clave)
+        if i < len(self._claves) and self._claves[i] == clave:
+            del self._claves[i]
+
+    def _quitar_dia(self, fecha: str) -> None:
+        for clave, _ in self._dias.pop(fecha, {}).values():
+            self._quitar(clave)
+        self._expira.pop(fecha, None)
+
+    def _vigente(self, fecha: str, ahora: float) -> bool:
+        return self._expira.get(fecha, 0) > ahora
+
+    def _poner(self, fecha: str, fila: Dict[str, Any]) -> None:
+        dia = self._dias[fecha]
+        anterior = dia.pop(fila["row_sheet"], None)
+        if anterior is not None:
+            self._quitar(anterior[0])
+        if self._es_candidata(fila):
+            clave, datos = self._entrada(fecha, fila)
+            dia[fila["row_sheet"]] = (clave, datos)
+            insort(self._claves, clave)
+
+    def indexar_dia(self, fecha: str, agenda: Iterable[Dict[str, Any]]) -> None:
+        """
+        (Re)indexa un día completo a partir de su agenda parseada.
+        """
+        if self.ttl <= 0:
+            return
+        ahora = time.monotonic()
+        dia: Dict[int, Tuple[Clave, Dict[str, Any]]] = {}
+        for fila in agenda:
+            if self._es_candidata(fila):
+                dia[fila["row_sheet"]] = self._entrada(fecha, fila)
+        nuevas = sorted(clave for clave, _ in dia.values())
+
+        with self._lock:
+            # De paso, se sueltan los días caducados
+            fuera = {f for f, t in self._expira.items() if t <= ahora}
+            fuera.add(fecha)
+            for f in fuera:
+                self._dias.pop(f, None)
+                self._expira.pop(f, None)
+            # Día entero: se rehace la lista de una vez (dos tramos ya
+            # ordenados, sorted los mezcla en tiempo lineal)
+            self._claves = sorted([c for c in self._claves if c[1] not in fuera] + nuevas)
+            self._dias[fecha] = dia
+            self._expira[fecha] = ahora + self.ttl
+
+    def actualizar_filas(self, fecha: str, filas: Iterable[Dict[str, Any]]) -> None:
+        """
+        Aplica filas ya escritas de un día indexado (si no lo está, no
+        hace nada: se indexará entero al leerlo).
+        """
+        with self._lock:
+            if not self._vigente(fecha, time.monotonic()):
+                return
+            for fila in filas:
+                self._poner(fecha, fila)
+
+    def olvidar(self, fecha: Optional[str] = None) -> None:
+        """
+        Descarta un día (o todos si fecha es None): la próxima consulta
+        que lo necesite lo releerá.
+        """
+        with self._lock:
+            if fecha is None:
+                self._claves.clear()
+                self._dias.clear()
+                self._expira.clear()
+            else:
+                self._quitar_dia(fecha)
+
+    def faltan(self, fechas: Iterable[str]) -> List[str]:
+        """
+        Fechas de la lista que no están indexadas (o han caducado).
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            return [f for f in fechas if not self._vigente(f, ahora)]
+
+    def candidatas(
+        self,
+        duracion_max: int,
+        desde: str,
+        hasta: str,
+        limite: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Citas de duración <= `duracion_max` entre `desde` y `hasta`
+        (incluidas, YYYY-MM-DD). Primero las más largas (las que mejor
+        llenan el hueco) y, a igual duración, las de fecha más temprana.
+        """
+        ahora = time.monotonic()
+        resultado: List[Dict[str, Any]] = []
+        with self._lock:
+            self.consultas += 1
+            fin = bisect_left(self._claves, (duracion_max + 1,))
+            # Grupos de igual duración, de la más larga a la más corta; en
+            # cada grupo las claves van por fecha: se salta directo a `desde`
+            while fin > 0 and (limite is None or len(resultado) < limite):
+                duracion = self._claves[fin - 1][0]
+                inicio = bisect_left(self._claves, (duracion,), 0, fin)
+                i = bisect_left(self._claves, (duracion, desde), inicio, fin)
+                for k in range(i, fin):
+                    _, fecha, _, row = self._claves[k]
+                    if fecha > hasta:
+                        break
+                    if self._vigente(fecha, ahora):
+                        resultado.append(dict(self._dias[fecha][row][1]))
+                fin = inicio
+        return resultado[:limite] if limite is not None else resultado
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "dias": len(self._dias),
+                "candidatas": len(self._claves),
+                "consultas": self.consultas,
+            }
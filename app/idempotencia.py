@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .settings import IDEMPOTENCY_TTL_S
+
+# ---------------------------------------------------------------------
+# Escrituras idempotentes (cabecera Idempotency-Key)
+# ---------------------------------------------------------------------
+#
+# El cliente manda una clave única por acción. Si la misma petición llega
+# dos veces (reintento tras un corte, cola offline que se reenvía), la
+# segunda no vuelve a escribir: recibe la respuesta de la primera.
+#
+# - Solo se guardan las respuestas correctas: si la escritura falla, un
+#   reintento con la misma clave la vuelve a intentar.
+# - Dos peticiones simultáneas con la misma clave se esperan entre sí.
+# - Con cada respuesta se guarda la huella de la petición: la misma clave
+#   con otro contenido es un error del cliente (ClaveReutilizada), no una
+#   repetición.
+# - Es por proceso y en memoria, con TTL y un máximo de claves.
+
+# Claves recordadas como mucho (se olvidan las más antiguas)
+MAX_CLAVES = 10_000
+
+
+class ClaveReutilizada(Exception):
+    """
+    Idempotency-Key ya usada con otra petición.
+    """
+
+    status_code = 422
+
+
+class RegistroIdempotencia:
+    """
+    Respuestas ya dadas por clave, con TTL.
+    """
+
+    def __init__(self, ttl: float, max_claves: int = MAX_CLAVES):
+        self.ttl = ttl
+        self.max_claves = max_claves
+        # clave → (expira, huella de la petición, respuesta)
+        self._respuestas: "OrderedDict[str, Tuple[float, Optional[str], Any]]" = OrderedDict()
+        # clave → [lock, peticiones esperando o ejecutando]
+        self._en_curso: Dict[str, List[Any]] = {}
+        self.repetidas = 0
+
+    def _vigente(self, clave: str) -> Optional[Tuple[float, Optional[str], Any]]:
+        guardada = self._respuestas.get(clave)
+        if guardada is None:
+            return None
+        if guardada[0] <= time.monotonic():
+            del self._respuestas[clave]
+            return None
+        return guardada
+
+    def _guardar(self, clave: str, huella: Optional[str], respuesta: Any) -> None:
+        self._respuestas[clave] = (time.monotonic() + self.ttl, huella, respuesta)
+        self._respuestas.move_to_end(clave)
+        while len(self._respuestas) > self.max_claves:
+            self._respuestas.popitem(last=False)
+
+    async def ejecutar(
+        self,
+        clave: Optional[str],
+        fn: Callable[[], Awaitable[Any]],
+        huella: Optional[str] = None,
+    ) -> Any:
+        """
+        Ejecuta `fn` una sola vez por clave; sin clave, siempre.
+        `huella` identifica el contenido de la petición: si la clave ya
+        se usó con otra, lanza ClaveReutilizada.
+        """
+        if not clave or self.ttl <= 0:
+            return await fn()
+
+        en_curso = self._en_curso.setdefault(clave, [asyncio.Lock(), 0])
+        en_curso[1] += 1
+        try:
+            async with en_curso[0]:
+                guardada = self._vigente(clave)
+                if guardada is not None:
+                    _, huella_guardada, respuesta = guardada
+                    if huella_guardada != huella:
+                        raise ClaveReutilizada(
+                            "Idempotency-Key ya usada con otra petición"
+                        )
+                    self.repetidas += 1
+                    return respuesta
+                respuesta = await fn()
+                self._guardar(clave, huella, respuesta)
+                return respuesta
+        finally:
+            en_curso[1] -= 1
+            if en_curso[1] == 0:
+                del self._en_curso[clave]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "claves": len(self._respuestas),
+            "repetidas": self.repetidas,
+        }
+
+
+registro_idempotencia = RegistroIdempotencia(IDEMPOTENCY_TTL_S)
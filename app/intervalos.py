@@ -0,0 +1,89 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+# ---------------------------------------------------------------------
+# Intervalos libres de un día
+# ---------------------------------------------------------------------
+#
+# Cada cita confirmada ocupa [inicio, inicio + duración) en minutos. Se
+# ordenan y se fusionan los intervalos que se solapan o se tocan; lo que
+# queda entre ellos (desde la primera hora del día) son las ventanas
+# libres de verdad. Una cita de 90 minutos tapa las filas de hueco que
+# caen dentro, aunque en la hoja sigan marcadas como hueco.
+#
+# - ventana_en(minuto): la ventana libre que contiene ese minuto, o None
+#   si está ocupado → búsqueda binaria por inicio.
+# - ventanas(minimo): las ventanas con capacidad >= minimo → búsqueda
+#   binaria en la lista ordenada por capacidad, más lo devuelto.
+# - La hoja no dice a qué hora se cierra: la última ventana no tiene fin
+#   (fin None, capacidad infinita).
+
+Intervalo = Tuple[int, int]
+Ventana = Tuple[int, Optional[int]]  # (inicio, fin o None)
+
+SIN_FIN = float("inf")
+
+
+def fusionar_intervalos(intervalos: Iterable[Intervalo]) -> List[Intervalo]:
+    """
+    Ordena y fusiona intervalos [inicio, fin) solapados o contiguos.
+    Los vacíos (fin <= inicio) se descartan.
+    """
+    fusionados: List[Intervalo] = []
+    for inicio, fin in sorted(i for i in intervalos if i[1] > i[0]):
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1] = (fusionados[-1][0], fin)
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+def capacidad(ventana: Ventana) -> float:
+    inicio, fin = ventana
+    return SIN_FIN if fin is None else fin - inicio
+
+
+class MapaLibre:
+    """
+    Ocupación de un día (intervalos fusionados) y sus ventanas libres.
+    """
+
+    def __init__(self, ocupados: Iterable[Intervalo], inicio_dia: int):
+        self.ocupados = fusionar_intervalos(ocupados)
+
+        libres: List[Ventana] = []
+        cursor = inicio_dia
+        for inicio, fin in self.ocupados:
+            if inicio > cursor:
+                libres.append((cursor, inicio))
+            cursor = max(cursor, fin)
+        libres.append((cursor, None))
+        self.libres = libres
+
+        # Para localizar por minuto (ordenadas por inicio)
+        self._inicios = [v[0] for v in libres]
+        # Para filtrar por capacidad
+        por_capacidad = sorted(range(len(libres)), key=lambda i: capacidad(libres[i]))
+        self._capacidades = [capacidad(libres[i]) for i in por_capacidad]
+        self._por_capacidad = por_capacidad
+
+    def ventana_en(self, minuto: int) -> Optional[Ventana]:
+        """
+        Ventana libre que contiene `minuto`, o None si está ocupado
+        (o es anterior al inicio del día).
+        """
+        i = bisect_right(self._inicios, minuto) - 1
+        if i < 0:
+            return None
+        inicio, fin = self.libres[i]
+        if fin is not None and minuto >= fin:
+            return None
+        return self.libres[i]
+
+    def ventanas(self, minimo: int = 0) -> List[Ventana]:
+        """
+        Ventanas libres con capacidad >= `minimo` minutos, por hora.
+        """
+        desde = bisect_left(self._capacidades, minimo)
+        return [self.libres[i] for i in sorted(self._por_capacidad[desde:])]
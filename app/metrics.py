@@ -0,0 +1,464 @@
+import contextvars
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+from .quota import LECTURA, quota_scheduler, status_de
+from .settings import SERVER_TIMING
+
+# ---------------------------------------------------------------------
+# Métricas (formato de texto de Prometheus)
+# ---------------------------------------------------------------------
+#
+# Contadores e histogramas en memoria, sin dependencias, pensados para
+# dejarlos siempre activos: registrar un valor es un lock y una suma.
+#
+# - Cada llamada a la API de Sheets (real o fake_sheets) se cuenta y se
+#   cronometra por método y por la función de servicio que la origina
+#   (@origen, guardada en un contextvar que viaja a los hilos de anyio).
+# - MetricsMiddleware mide cada petición HTTP por endpoint y cuenta las
+#   llamadas a Sheets que ha necesitado. En los streams (SSE) la latencia
+#   es hasta enviar las cabeceras, no lo que dura la conexión.
+# - Caché y cuota se leen de sus propios contadores al exportar.
+# - Cada respuesta lleva una cabecera Server-Timing con el tiempo de
+#   cada fase de la petición (ver FASES).
+
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLAMADAS_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas) + "}"
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Counter:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.claves = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def inc(self, cantidad: float = 1, **etiquetas: Any) -> None:
+        clave = tuple((k, str(etiquetas[k])) for k in self.claves)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histogram:
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCIA_BUCKETS,
+    ):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.claves = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # etiquetas → [cuentas por bucket (+Inf al final), suma]
+        self._series: Dict[Etiquetas, List[Any]] = {}
+
+    def observe(self, valor: float, **etiquetas: Any) -> None:
+        clave = tuple((k, str(etiquetas[k])) for k in self.claves)
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for clave, (cuentas, suma) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, cuenta in zip(self.buckets + (float("inf"),), cuentas):
+                    acumulado += cuenta
+                    etiquetas = clave + (("le", _numero(limite)),)
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(etiquetas)} {acumulado}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(clave)} {_numero(suma)}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(clave)} {acumulado}")
+        return lineas
+
+
+def _gauge(nombre: str, ayuda: str, valores: Dict[Etiquetas, float]) -> List[str]:
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+    for clave, valor in valores.items():
+        lineas.append(f"{nombre}{_etiquetas(clave)} {_numero(valor)}")
+    return lineas
+
+
+def _contador(nombre: str, ayuda: str, valor: float) -> List[str]:
+    return [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter", f"{nombre} {_numero(valor)}"]
+
+
+# -------------------------
+# Métricas de la app
+# -------------------------
+
+http_peticiones = Counter(
+    "agenda_http_requests_total",
+    "Peticiones HTTP por endpoint y status.",
+    ("method", "endpoint", "status"),
+)
+http_latencia = Histogram(
+    "agenda_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por endpoint.",
+    ("method", "endpoint"),
+)
+http_llamadas_sheets = Histogram(
+    "agenda_http_request_sheets_calls",
+    "Llamadas a la API de Sheets por petición HTTP.",
+    ("method", "endpoint"),
+    buckets=LLAMADAS_BUCKETS,
+)
+sheets_llamadas = Counter(
+    "agenda_sheets_calls_total",
+    "Llamadas a la API de Sheets por método y función de servicio.",
+    ("metodo", "funcion"),
+)
+sheets_segundos = Counter(
+    "agenda_sheets_call_seconds_total",
+    "Tiempo total en llamadas a la API de Sheets por método y función de servicio.",
+    ("metodo", "funcion"),
+)
+sheets_latencia = Histogram(
+    "agenda_sheets_call_duration_seconds",
+    "Latencia de cada llamada a la API de Sheets (cola de cuota y reintentos incluidos).",
+    ("metodo",),
+)
+sheets_errores = Counter(
+    "agenda_sheets_errors_total",
+    "Llamadas a la API de Sheets que han terminado en error, por status HTTP.",
+    ("metodo", "status"),
+)
+
+
+# -------------------------
+# Contexto de petición / función de servicio
+# -------------------------
+
+# Fases de una petición (nombre en Server-Timing → descripción, en ASCII
+# porque va en una cabecera HTTP)
+FASES = {
+    "lookup": "get_ws_dia",
+    "read": "Sheets read",
+    "parse": "leer_agenda",
+    "compute": "huecos/avisos/sugeridas",
+    "write": "Sheets write",
+    "serialize": "JSON",
+}
+
+# Fases cuyas llamadas a Sheets cuentan dentro de ellas y no como read/write
+_FASES_CON_SHEETS = {"lookup"}
+
+
+class ContextoPeticion:
+    """
+    Datos de la petición HTTP en curso (compartidos con los hilos que lanza).
+    Las fases son exclusivas: mientras dura una fase anidada, la exterior
+    no acumula tiempo.
+    """
+    __slots__ = ("llamadas_sheets", "segundos_sheets", "fases", "_pila", "fin_endpoint")
+
+    def __init__(self):
+        self.llamadas_sheets = 0
+        self.segundos_sheets = 0.0
+        self.fases: Dict[str, float] = {}
+        self._pila: List[List[Any]] = []
+        self.fin_endpoint: Optional[float] = None
+
+    def entrar(self, fase: str) -> None:
+        ahora = time.perf_counter()
+        if self._pila:
+            actual = self._pila[-1]
+            self.fases[actual[0]] = self.fases.get(actual[0], 0.0) + ahora - actual[1]
+        self._pila.append([fase, ahora])
+
+    def salir(self) -> None:
+        ahora = time.perf_counter()
+        fase, inicio = self._pila.pop()
+        self.fases[fase] = self.fases.get(fase, 0.0) + ahora - inicio
+        if self._pila:
+            self._pila[-1][1] = ahora
+
+    def fin_serializacion(self) -> None:
+        """
+        Empieza la respuesta: lo que va desde el fin del endpoint es serialización.
+        """
+        if self.fin_endpoint is not None and "serialize" not in self.fases:
+            self.fases["serialize"] = time.perf_counter() - self.fin_endpoint
+
+    def fase_actual(self) -> Optional[str]:
+        return self._pila[-1][0] if self._pila else None
+
+    def server_timing(self, total: float) -> str:
+        """
+        Valor de la cabecera Server-Timing (milisegundos).
+        """
+        partes = [
+            f'{fase};desc="{FASES.get(fase, fase)}";dur={segundos * 1000:.2f}'
+            for fase, segundos in self.fases.items()
+        ]
+        partes.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(partes)
+
+
+_peticion: contextvars.ContextVar[Optional[ContextoPeticion]] = contextvars.ContextVar(
+    "agenda_peticion", default=None
+)
+_funcion: contextvars.ContextVar[str] = contextvars.ContextVar("agenda_funcion", default="otro")
+
+
+def peticion_actual() -> Optional[ContextoPeticion]:
+    return _peticion.get()
+
+
+def origen(fn: Callable) -> Callable:
+    """
+    Decorador: las llamadas a Sheets hechas dentro de `fn` se atribuyen a ella.
+    """
+    nombre = fn.__name__
+
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        token = _funcion.set(nombre)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _funcion.reset(token)
+
+    return envoltura
+
+
+@contextmanager
+def fase(nombre: str) -> Iterator[None]:
+    """
+    Cuenta el tiempo del bloque en la fase `nombre` de la petición en curso.
+    """
+    contexto = _peticion.get()
+    if contexto is None:
+        yield
+        return
+    contexto.entrar(nombre)
+    try:
+        yield
+    finally:
+        contexto.salir()
+
+
+def en_fase(nombre: str) -> Callable[[Callable], Callable]:
+    """
+    Decorador: el tiempo de la función cuenta en la fase `nombre`.
+    """
+    def decorador(fn: Callable) -> Callable:
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            with fase(nombre):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+@contextmanager
+def llamada_sheets(metodo: str, tipo: str = LECTURA) -> Iterator[None]:
+    """
+    Cronometra y cuenta una llamada a la API de Sheets (fase read / write
+    de la petición, salvo que ya esté en una fase como lookup).
+    """
+    contexto = _peticion.get()
+    en_fase_propia = contexto is not None and contexto.fase_actual() not in _FASES_CON_SHEETS
+    if en_fase_propia:
+        contexto.entrar("read" if tipo == LECTURA else "write")
+
+    inicio = time.perf_counter()
+    status = None
+    try:
+        yield
+    except Exception as e:
+        status = status_de(e) or "error"
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        funcion = _funcion.get()
+        sheets_llamadas.inc(metodo=metodo, funcion=funcion)
+        sheets_segundos.inc(segundos, metodo=metodo, funcion=funcion)
+        sheets_latencia.observe(segundos, metodo=metodo)
+        if status is not None:
+            sheets_errores.inc(metodo=metodo, status=status)
+
+        if contexto is not None:
+            contexto.llamadas_sheets += 1
+            contexto.segundos_sheets += segundos
+        if en_fase_propia:
+            contexto.salir()
+
+
+def operacion_sheets(method: str, endpoint: str) -> str:
+    """
+    Nombre corto de una petición HTTP a la API de Sheets / Drive.
+    """
+    ruta = endpoint.split("?", 1)[0]
+    if ":" in ruta.rsplit("/", 1)[-1]:
+        accion = ruta.rsplit(":", 1)[-1]
+        return f"values.{accion}" if "/values" in ruta else accion
+    if "/values/" in ruta:
+        return f"values.{method.lower()}"
+    if "drive" in ruta:
+        return f"drive.{method.lower()}"
+    return f"spreadsheet.{method.lower()}"
+
+
+# -------------------------
+# Middleware HTTP
+# -------------------------
+
+class RutaCronometrada(APIRoute):
+    """
+    Ruta que anota cuándo termina la función del endpoint, para medir
+    la serialización (de ahí hasta que empieza la respuesta).
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @wraps(original)
+            async def endpoint(*args, **kw):
+                try:
+                    return await original(*args, **kw)
+                finally:
+                    contexto = _peticion.get()
+                    if contexto is not None:
+                        contexto.fin_endpoint = time.perf_counter()
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: latencia, status y llamadas a Sheets por endpoint,
+    y cabecera Server-Timing en cada respuesta.
+    El endpoint es la ruta declarada (/agenda/vista), no la URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        contexto = ContextoPeticion()
+        token = _peticion.set(contexto)
+        inicio = time.perf_counter()
+        status = 500
+        # Momento de las cabeceras de un stream (fin de la latencia medida)
+        fin_stream: Optional[float] = None
+
+        async def send_con_status(mensaje):
+            nonlocal status, fin_stream
+            if mensaje["type"] == "http.response.start":
+                status = mensaje["status"]
+                tipo = dict(mensaje.get("headers", [])).get(b"content-type", b"")
+                if tipo.startswith(b"text/event-stream"):
+                    fin_stream = time.perf_counter()
+                if SERVER_TIMING:
+                    contexto.fin_serializacion()
+                    cabecera = contexto.server_timing(time.perf_counter() - inicio)
+                    mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                        (b"server-timing", cabecera.encode("latin-1")),
+                    ]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_status)
+        finally:
+            _peticion.reset(token)
+            ruta = scope.get("route")
+            endpoint = getattr(ruta, "path", None) or "sin_ruta"
+            method = scope.get("method", "")
+            http_peticiones.inc(method=method, endpoint=endpoint, status=status)
+            fin = fin_stream if fin_stream is not None else time.perf_counter()
+            http_latencia.observe(fin - inicio, method=method, endpoint=endpoint)
+            http_llamadas_sheets.observe(contexto.llamadas_sheets, method=method, endpoint=endpoint)
+
+
+# -------------------------
+# Exportación
+# -------------------------
+
+def exportar() -> str:
+    """
+    Todas las métricas en formato de texto de Prometheus.
+    """
+    from .services import agenda_cache
+
+    lineas: List[str] = []
+    for metrica in (
+        http_peticiones,
+        http_latencia,
+        http_llamadas_sheets,
+        sheets_llamadas,
+        sheets_segundos,
+        sheets_latencia,
+        sheets_errores,
+    ):
+        lineas += metrica.exportar()
+
+    cache = agenda_cache.stats()
+    lineas += _contador("agenda_cache_hits_total", "Lecturas servidas desde la caché de agenda.", cache["hits"])
+    lineas += _contador("agenda_cache_misses_total", "Lecturas que no estaban en la caché de agenda.", cache["misses"])
+    lineas += _contador("agenda_cache_invalidations_total", "Días descartados de la caché de agenda.", cache["invalidaciones"])
+    lineas += _contador("agenda_cache_stale_reads_total", "Lecturas no guardadas en caché porque el día cambió mientras se leía.", cache["descartadas"])
+    lineas += _gauge("agenda_cache_hit_ratio", "Proporción de aciertos de la caché de agenda.", {(): cache["hit_ratio"]})
+    lineas += _gauge("agenda_cache_days", "Días en la caché de agenda.", {(): cache["dias"]})
+
+    cuota = quota_scheduler.stats()
+    lineas += _contador("agenda_quota_retries_total", "Reintentos de llamadas a Sheets (429 / 5xx).", cuota["reintentos"])
+    lineas += _contador("agenda_quota_exhausted_total", "Respuestas 429 (cuota agotada) de Google.", cuota["errores_cuota"])
+    lineas += _contador("agenda_quota_wait_seconds_total", "Tiempo esperando token de cuota.", cuota["espera_total_s"])
+    lineas += _gauge("agenda_quota_queue", "Peticiones a Sheets esperando en la cola de cuota.", {
+        (("tipo", "lectura"),): cuota["cola_lectura"],
+        (("tipo", "escritura"),): cuota["cola_escritura"],
+    })
+    lineas += _gauge("agenda_quota_tokens", "Tokens disponibles en cada token bucket.", {
+        (("tipo", "lectura"),): cuota["tokens_lectura"],
+        (("tipo", "escritura"),): cuota["tokens_escritura"],
+    })
+
+    return "\n".join(lineas) + "\n"
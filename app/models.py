@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, List, Literal, Optional, Union
 
 
 class EstadoUpdate(BaseModel):
@@ -48,3 +48,84 @@ class CitaCreate(BaseModel):
         default=None,
         description="Flexibilidad del cliente: Si | No"
     )
+
+
+class RetrasoUpdate(BaseModel):
+    """
+    Payload para aplicar un retraso manual a una cita.
+    """
+    row_sheet: int = Field(
+        ...,
+        description="Número de fila en Google Sheet (row_sheet)"
+    )
+    minutos: int = Field(
+        ...,
+        description="Minutos a sumar a la hora de la cita"
+    )
+
+
+# -------------------------
+# Operaciones en lote
+# -------------------------
+
+class OperacionEstado(BaseModel):
+    tipo: Literal["estado"]
+    row_sheet: int = Field(..., description="Fila a modificar")
+    estado: str = Field(..., description="confirmada | cancelada | hueco")
+
+
+class OperacionCita(BaseModel):
+    tipo: Literal["cita"]
+    row_sheet: int = Field(..., description="Fila a modificar")
+    cliente: str = ""
+    telefono: str = ""
+    servicio: str = ""
+    duracion: Optional[int] = None
+    flexibilidad: Optional[str] = None
+
+
+class OperacionAvisada(BaseModel):
+    tipo: Literal["avisada"]
+    row_sheet: int = Field(..., description="Fila a modificar")
+    avisada: str = Field(..., description="Si | No")
+
+
+class OperacionMover(BaseModel):
+    tipo: Literal["mover"]
+    row_origen: int = Field(..., description="Fila de la cita")
+    row_destino: int = Field(..., description="Fila destino (debe ser hueco)")
+
+
+class OperacionRetraso(BaseModel):
+    tipo: Literal["retraso"]
+    row_sheet: int = Field(..., description="Fila a modificar")
+    minutos: int = Field(..., description="Minutos a sumar a la hora")
+
+
+Operacion = Annotated[
+    Union[
+        OperacionEstado,
+        OperacionCita,
+        OperacionAvisada,
+        OperacionMover,
+        OperacionRetraso,
+    ],
+    Field(discriminator="tipo"),
+]
+
+
+class BatchRequest(BaseModel):
+    """
+    Payload para aplicar varias operaciones sobre un mismo día
+    con una sola escritura en la hoja.
+    """
+    fecha: Optional[str] = Field(
+        default=None,
+        description="Fecha en formato YYYY-MM-DD. Si es None, se usa hoy."
+    )
+    operaciones: List[Operacion] = Field(
+        ...,
+        min_length=1,
+        description="Operaciones en orden de aplicación"
+    )
+
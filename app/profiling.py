@@ -0,0 +1,233 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from .metrics import peticion_actual
+from .settings import PROFILE_SAMPLE_INTERVAL_MS, REQUEST_PROFILING
+
+# ---------------------------------------------------------------------
+# Perfil de una petición (?profile=1)
+# ---------------------------------------------------------------------
+#
+# Con ?profile=1, un hilo muestrea cada PROFILE_SAMPLE_INTERVAL_MS las
+# pilas de llamadas de todos los hilos del proceso mientras dura la
+# petición, y la respuesta se devuelve envuelta en JSON:
+#     {"respuesta": ..., "server_timing": {...}, "profile": {...}}
+#
+# Los hilos parados (event loop esperando en select, workers de anyio
+# esperando trabajo) no cuentan. Solo se perfila una petición a la vez.
+#
+# Hay respuestas que no se pueden envolver: streams sin fin (SSE), 304 y
+# cuerpos comprimidos. En cuanto se ve su cabecera se deja de perfilar,
+# se suelta el turno y la respuesta sale tal cual.
+#
+# Desactivado salvo REQUEST_PROFILING=1 (expone nombres internos).
+
+# Pilas y funciones que se devuelven (las más frecuentes)
+MAX_PILAS = 100
+MAX_FUNCIONES = 40
+
+_perfilando = threading.Lock()
+
+
+def _marco(frame) -> str:
+    codigo = frame.f_code
+    modulo = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+    return f"{modulo}:{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+
+def _parado(frame) -> bool:
+    """
+    True si el hilo está esperando trabajo, no haciendo algo de la petición.
+    """
+    codigo = frame.f_code
+    if codigo.co_name in ("select", "poll") and codigo.co_filename.endswith("selectors.py"):
+        return True
+    if codigo.co_name == "wait" and codigo.co_filename.endswith("threading.py"):
+        llamador = frame.f_back
+        return llamador is not None and llamador.f_code.co_filename.endswith(("queue.py", "threading.py"))
+    return False
+
+
+class MuestreadorPilas:
+    """
+    Muestreo periódico de sys._current_frames() en un hilo aparte.
+    Acumula pilas colapsadas ("raíz;...;hoja" → muestras).
+    """
+
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self.pilas: Counter = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="profile-sampler", daemon=True)
+        self._inicio = 0.0
+        self.duracion = 0.0
+
+    def start(self) -> None:
+        self._inicio = time.perf_counter()
+        self._hilo.start()
+
+    def stop(self) -> None:
+        self._parar.set()
+        self._hilo.join()
+        self.duracion = time.perf_counter() - self._inicio
+
+    def _bucle(self) -> None:
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            self.muestras += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == propio or _parado(frame):
+                    continue
+                pila = []
+                while frame is not None:
+                    pila.append(_marco(frame))
+                    frame = frame.f_back
+                self.pilas[";".join(reversed(pila))] += 1
+
+    def resumen(self) -> Dict[str, Any]:
+        propias: Counter = Counter()
+        totales: Counter = Counter()
+        for pila, n in self.pilas.items():
+            marcos = pila.split(";")
+            propias[marcos[-1]] += n
+            for marco in set(marcos):
+                totales[marco] += n
+
+        return {
+            "intervalo_ms": self.intervalo * 1000,
+            "duracion_ms": round(self.duracion * 1000, 2),
+            "muestras": self.muestras,
+            # Las que más muestras tienen en la cima de la pila (tiempo propio)
+            "funciones": [
+                {"funcion": f, "propias": n, "totales": totales[f]}
+                for f, n in propias.most_common(MAX_FUNCIONES)
+            ],
+            "pilas": [
+                {"pila": pila, "muestras": n}
+                for pila, n in self.pilas.most_common(MAX_PILAS)
+            ],
+        }
+
+
+def _quiere_perfil(scope) -> bool:
+    if scope["type"] != "http" or not REQUEST_PROFILING:
+        return False
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", ["0"])[-1] in ("1", "true")
+
+
+def _envolvible(inicio: Dict[str, Any]) -> bool:
+    """
+    False para las respuestas que se reenvían sin envolver (ver arriba).
+    """
+    if inicio["status"] == 304:
+        return False
+    headers = dict(inicio.get("headers", []))
+    if b"content-encoding" in headers:
+        return False
+    return not headers.get(b"content-type", b"").startswith(b"text/event-stream")
+
+
+def _cuerpo(headers: List[Tuple[bytes, bytes]], cuerpo: bytes) -> Any:
+    tipo = dict(headers).get(b"content-type", b"").decode("latin-1")
+    texto = cuerpo.decode("utf-8", errors="replace")
+    if tipo.startswith("application/json"):
+        try:
+            return json.loads(texto)
+        except ValueError:
+            pass
+    if tipo.startswith("application/x-ndjson"):
+        return [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    return texto
+
+
+class ProfileMiddleware:
+    """
+    Middleware ASGI del modo ?profile=1 (va dentro de MetricsMiddleware).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _quiere_perfil(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _perfilando.acquire(blocking=False):
+            await self._responder(send, 409, {"detail": "Ya hay otra petición perfilándose"})
+            return
+
+        inicio: Optional[Dict[str, Any]] = None
+        partes: List[bytes] = []
+        # Respuesta que no se envuelve: se reenvía tal cual
+        directa = False
+        muestreador = MuestreadorPilas(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        parado = False
+
+        def parar() -> None:
+            nonlocal parado
+            if not parado:
+                parado = True
+                muestreador.stop()
+                _perfilando.release()
+
+        async def capturar(mensaje):
+            nonlocal inicio, directa
+            if directa:
+                await send(mensaje)
+                return
+            if mensaje["type"] == "http.response.start":
+                if not _envolvible(mensaje):
+                    directa = True
+                    parar()
+                    await send(mensaje)
+                    return
+                inicio = mensaje
+                contexto = peticion_actual()
+                if contexto is not None:
+                    contexto.fin_serializacion()
+            elif mensaje["type"] == "http.response.body":
+                partes.append(mensaje.get("body", b""))
+
+        muestreador.start()
+        try:
+            await self.app(scope, receive, capturar)
+        finally:
+            parar()
+
+        if directa:
+            return
+
+        contexto = peticion_actual()
+        headers = list(inicio["headers"]) if inicio else []
+        await self._responder(send, inicio["status"] if inicio else 500, {
+            "respuesta": _cuerpo(headers, b"".join(partes)),
+            "server_timing": {
+                fase: round(segundos * 1000, 2)
+                for fase, segundos in (contexto.fases.items() if contexto else ())
+            },
+            "llamadas_sheets": contexto.llamadas_sheets if contexto else None,
+            "profile": muestreador.resumen(),
+        })
+
+    @staticmethod
+    async def _responder(send, status: int, contenido: Dict[str, Any]) -> None:
+        cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
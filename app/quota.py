@@ -0,0 +1,249 @@
+import contextvars
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .settings import (
+    SHEETS_BACKOFF_BASE,
+    SHEETS_BACKOFF_MAX,
+    SHEETS_MAX_RETRIES,
+    SHEETS_READS_PER_MIN,
+    SHEETS_WRITES_PER_MIN,
+)
+
+# ---------------------------------------------------------------------
+# Planificador de peticiones a Google Sheets
+# ---------------------------------------------------------------------
+#
+# Google limita lecturas y escrituras por minuto y usuario. Todas las
+# peticiones HTTP de gspread pasan por aquí (sheets.QuotaHTTPClient):
+# - Un token bucket para lecturas y otro para escrituras
+# - Cola con prioridad: escrituras > lecturas > lecturas en segundo plano
+# - Reintento con backoff exponencial con jitter ante 429 / 5xx
+#
+# Reloj, sleep y aleatoriedad son inyectables para poder probarlo contra
+# un stub local que devuelva 429 según un calendario.
+
+LECTURA = "lectura"
+ESCRITURA = "escritura"
+
+# Prioridades (menor = antes)
+PRIORIDAD_ESCRITURA = 0
+PRIORIDAD_LECTURA = 1
+PRIORIDAD_FONDO = 2
+
+STATUS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+_fondo: contextvars.ContextVar[bool] = contextvars.ContextVar("sheets_fondo", default=False)
+
+
+@contextmanager
+def en_segundo_plano() -> Iterator[None]:
+    """
+    Las lecturas hechas dentro de este bloque ceden el paso a las
+    peticiones de usuarios (tareas de fondo, precargas, espejos).
+    """
+    token = _fondo.set(True)
+    try:
+        yield
+    finally:
+        _fondo.reset(token)
+
+
+def status_de(exc: BaseException) -> Optional[int]:
+    """
+    Código HTTP de un error de gspread (o de cualquier excepción que
+    lleve `.response.status_code` o `.status_code`).
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+class TokenBucket:
+    """
+    `capacidad` tokens como máximo, que se reponen a `por_minuto` / 60 por segundo.
+    """
+
+    def __init__(self, por_minuto: float, clock: Callable[[], float] = time.monotonic):
+        self.capacidad = max(1.0, float(por_minuto))
+        self.ritmo = max(por_minuto, 1e-9) / 60.0
+        self._clock = clock
+        self.tokens = self.capacidad
+        self._ultimo = clock()
+
+    def _reponer(self) -> None:
+        ahora = self._clock()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.ritmo)
+        self._ultimo = ahora
+
+    def tomar(self) -> bool:
+        self._reponer()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def espera(self) -> float:
+        """
+        Segundos hasta que haya un token disponible.
+        """
+        self._reponer()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.ritmo
+
+
+class QuotaScheduler:
+    """
+    Pasa cada llamada por su token bucket y la reintenta si Google
+    responde con cuota agotada o error temporal.
+    """
+
+    def __init__(
+        self,
+        lecturas_por_minuto: float,
+        escrituras_por_minuto: float,
+        max_reintentos: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 32.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        aleatorio: Callable[[], float] = random.random,
+    ):
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._sleep = sleep
+        self._aleatorio = aleatorio
+
+        self._buckets = {
+            LECTURA: TokenBucket(lecturas_por_minuto, clock),
+            ESCRITURA: TokenBucket(escrituras_por_minuto, clock),
+        }
+        self._cond = threading.Condition()
+        self._cola: List[Tuple[int, int, str]] = []
+        self._seq = itertools.count()
+
+        self.llamadas = {LECTURA: 0, ESCRITURA: 0}
+        self.reintentos = 0
+        self.errores_cuota = 0
+        self.espera_total = 0.0
+
+    # -------------------------
+    # Cola
+    # -------------------------
+
+    def _puede_pasar(self, entrada: Tuple[int, int, str]) -> bool:
+        """
+        Pasa si nadie de su mismo tipo va antes en la cola, y (si es de
+        segundo plano) no hay ninguna petición de usuario esperando.
+        """
+        prioridad, _, tipo = entrada
+        for otra in self._cola:
+            if otra >= entrada:
+                continue
+            if otra[2] == tipo or prioridad == PRIORIDAD_FONDO:
+                return False
+        return True
+
+    def _adquirir(self, tipo: str, prioridad: int) -> None:
+        bucket = self._buckets[tipo]
+        inicio = self._clock()
+        with self._cond:
+            entrada = (prioridad, next(self._seq), tipo)
+            self._cola.append(entrada)
+            try:
+                while True:
+                    if self._puede_pasar(entrada):
+                        if bucket.tomar():
+                            return
+                        self._cond.wait(timeout=min(bucket.espera(), 1.0))
+                    else:
+                        self._cond.wait(timeout=1.0)
+            finally:
+                self._cola.remove(entrada)
+                self.espera_total += self._clock() - inicio
+                self._cond.notify_all()
+
+    # -------------------------
+    # Ejecución
+    # -------------------------
+
+    def backoff(self, intento: int) -> float:
+        """
+        Full jitter: aleatorio entre 0 y base·2^intento (con tope).
+        """
+        return self._aleatorio() * min(self.backoff_max, self.backoff_base * (2 ** intento))
+
+    def run(self, fn: Callable[[], Any], tipo: str = LECTURA) -> Any:
+        """
+        Ejecuta `fn` (una petición a Google) respetando la cuota.
+        """
+        if tipo == ESCRITURA:
+            prioridad = PRIORIDAD_ESCRITURA
+        elif _fondo.get():
+            prioridad = PRIORIDAD_FONDO
+        else:
+            prioridad = PRIORIDAD_LECTURA
+
+        intento = 0
+        while True:
+            self._adquirir(tipo, prioridad)
+            with self._cond:
+                self.llamadas[tipo] += 1
+            try:
+                return fn()
+            except Exception as e:
+                status = status_de(e)
+                reintentar = status in STATUS_REINTENTABLES and intento < self.max_reintentos
+                with self._cond:
+                    if status == 429:
+                        self.errores_cuota += 1
+                    if reintentar:
+                        self.reintentos += 1
+                if not reintentar:
+                    raise
+                self._sleep(self.backoff(intento))
+                intento += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "cola": len(self._cola),
+                "cola_lectura": sum(1 for e in self._cola if e[2] == LECTURA),
+                "cola_escritura": sum(1 for e in self._cola if e[2] == ESCRITURA),
+                "tokens_lectura": round(self._buckets[LECTURA].tokens, 2),
+                "tokens_escritura": round(self._buckets[ESCRITURA].tokens, 2),
+                "llamadas_lectura": self.llamadas[LECTURA],
+                "llamadas_escritura": self.llamadas[ESCRITURA],
+                "reintentos": self.reintentos,
+                "errores_cuota": self.errores_cuota,
+                "espera_total_s": round(self.espera_total, 3),
+            }
+
+
+def tipo_peticion(method: str, endpoint: str) -> str:
+    """
+    Clasifica una petición HTTP a la API de Sheets como lectura o escritura.
+    """
+    if method.upper() == "GET":
+        return LECTURA
+    if endpoint.endswith((":batchGet", ":batchGetByDataFilter", ":getByDataFilter")):
+        return LECTURA
+    return ESCRITURA
+
+
+quota_scheduler = QuotaScheduler(
+    lecturas_por_minuto=SHEETS_READS_PER_MIN,
+    escrituras_por_minuto=SHEETS_WRITES_PER_MIN,
+    max_reintentos=SHEETS_MAX_RETRIES,
+    backoff_base=SHEETS_BACKOFF_BASE,
+    backoff_max=SHEETS_BACKOFF_MAX,
+)
@@ -0,0 +1,139 @@
+import threading
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from gspread.utils import rowcol_to_a1
+
+# ---------------------------------------------------------------------
+# Esquema de columnas de las hojas de día
+# ---------------------------------------------------------------------
+#
+# La posición de cada columna se saca de la cabecera (fila 1) de cada
+# hoja, no de posiciones fijas: si alguien reordena columnas en la hoja,
+# lecturas y escrituras siguen funcionando.
+#
+# La cabecera se aprovecha de lecturas que ya la traen (get_all_values,
+# batchGet). Solo se pide con row_values(1) si una hoja se escribe antes
+# de haberse leído, y se recompila únicamente si cambia.
+
+EXPECTED_HEADERS = [
+    "Hora",
+    "Estado",
+    "Cliente",
+    "Teléfono",
+    "Servicio",
+    "Duración",
+    "Flexibilidad",
+    "Notas",
+    "Avisada",
+]
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class SheetSchema:
+    """
+    Cabecera compilada de una hoja: nombre de columna → índice,
+    lector de filas y direcciones A1.
+    """
+
+    def __init__(self, headers: Sequence[str]):
+        self.headers: Tuple[str, ...] = tuple(str(h).strip() for h in headers)
+
+        col: Dict[str, int] = {}
+        for idx, nombre in enumerate(self.headers, start=1):
+            if nombre and nombre not in col:
+                col[nombre] = idx
+
+        faltan = [h for h in EXPECTED_HEADERS if h not in col]
+        if faltan:
+            raise SchemaError(f"❌ Faltan columnas en la cabecera: {', '.join(faltan)}")
+
+        self.col = col
+        self._pos = tuple(col[h] - 1 for h in EXPECTED_HEADERS)
+        # Columnas que hay que leer para tener todos los campos
+        self.ancho = max(self._pos) + 1
+        self._getter = itemgetter(*self._pos)
+
+    def valores(self, row: Sequence[Any]) -> Tuple[Any, ...]:
+        """
+        Valores de una fila cruda en el orden de EXPECTED_HEADERS
+        ("" para celdas que la hoja no devuelve).
+        """
+        if len(row) >= self.ancho:
+            return self._getter(row)
+        n = len(row)
+        return tuple(row[i] if i < n else "" for i in self._pos)
+
+    def a1(self, row: int, campo: str) -> str:
+        return rowcol_to_a1(row, self.col[campo])
+
+    def matches(self, headers: Sequence[str]) -> bool:
+        return tuple(str(h).strip() for h in headers) == self.headers
+
+
+@lru_cache(maxsize=32)
+def _compilar(headers: Tuple[str, ...]) -> SheetSchema:
+    return SheetSchema(headers)
+
+
+def compile_schema(headers: Sequence[str]) -> SheetSchema:
+    """
+    Esquema para una cabecera (compilado una vez por cabecera distinta).
+    """
+    return _compilar(tuple(str(h).strip() for h in headers))
+
+
+DEFAULT_SCHEMA = compile_schema(EXPECTED_HEADERS)
+
+
+class SchemaRegistry:
+    """
+    Esquema de cada hoja, por título.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._esquemas: Dict[str, SheetSchema] = {}
+
+    def peek(self, title: str) -> Optional[SheetSchema]:
+        with self._lock:
+            return self._esquemas.get(title)
+
+    def observe(self, title: str, headers: Optional[Sequence[str]]) -> SheetSchema:
+        """
+        Registra la cabecera leída de una hoja. Si coincide con la conocida
+        no hace nada; si no, recompila (y valida) el esquema.
+        """
+        actual = self.peek(title)
+        if not headers:
+            return actual or DEFAULT_SCHEMA
+        if actual is not None and actual.matches(headers):
+            return actual
+
+        schema = compile_schema(headers)
+        with self._lock:
+            self._esquemas[title] = schema
+        return schema
+
+    def get(self, ws) -> SheetSchema:
+        """
+        Esquema de una worksheet; lee la fila 1 solo si no se conoce.
+        """
+        schema = self.peek(ws.title)
+        if schema is not None:
+            return schema
+        return self.observe(ws.title, ws.row_values(1))
+
+    def invalidate(self, title: Optional[str] = None) -> None:
+        with self._lock:
+            if title is None:
+                self._esquemas.clear()
+            else:
+                self._esquemas.pop(title, None)
+
+
+schema_registry = SchemaRegistry()
@@ -1,23 +1,26 @@
-from typing import List, Dict, Any
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
 import re
-import pandas as pd
 
+from .cache import AgendaCache
+from .events import event_bus
+from .flexibles import IndiceFlexibles
+from .intervalos import MapaLibre
+from .metrics import en_fase, origen
+from .schema import DEFAULT_SCHEMA, SheetSchema, compile_schema, schema_registry
+from .storage import get_backend
+from .uow import UnitOfWork
 from .settings import (
+    AGENDA_CACHE_TTL,
     DEFAULT_DURACION_MIN,
     DEFAULT_FLEXIBILIDAD,
     DEFAULT_SERVICIO,
+    FLEXIBLES_INDICE_TTL,
 )
 
-# Columnas fijas (por claridad):
-# A Hora
-# B Estado
-# C Cliente
-# D Teléfono
-# E Servicio
-# F Duración
-# G Flexibilidad
-# H Notas
-# I Avisada
+# Columnas (ver schema.EXPECTED_HEADERS): Hora, Estado, Cliente, Teléfono,
+# Servicio, Duración, Flexibilidad, Notas, Avisada.
+# Se acceden por nombre; la posición real sale de la cabecera de cada hoja.
 
 
 # -------------------------
@@ -71,59 +74,246 @@ def hora_a_minutos(hora: str) -> int:
 # Lectura de agenda
 # -------------------------
 
+def _parse_fila(idx: int, row: List[Any], schema: SheetSchema = DEFAULT_SCHEMA) -> Dict[str, Any]:
+    """
+    Convierte una fila cruda de la hoja (1-based idx) en un dict normalizado.
+    """
+    (
+        hora,
+        estado_raw,
+        cliente,
+        telefono,
+        servicio,
+        duracion_raw,
+        flex,
+        _notas,
+        avisada,
+    ) = schema.valores(row)
+
+    estado = normaliza_estado(estado_raw)
+    duracion = duracion_a_minutos(duracion_raw)
+    servicio = servicio if servicio else DEFAULT_SERVICIO
+    flex = flex if flex in ("Si", "No") else DEFAULT_FLEXIBILIDAD
+
+    return {
+        "row_sheet": idx,
+        "Hora": hora,
+        "Hora_min": hora_a_minutos(hora),
+        "Estado": estado,
+        "Cliente": cliente,
+        "Telefono": telefono,      # OJO: en frontend usamos row.Telefono
+        "Servicio": servicio,
+        "Duración": duracion,      # clave "Duración" como venías usando
+        "Flexibilidad": flex,
+        "Avisada": avisada,
+    }
+
+
+def parsear_agenda(values: List[List[Any]], titulo: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Convierte los valores crudos de una hoja de día (con cabecera)
+    en la lista de filas normalizadas. La cabecera leída actualiza
+    el esquema de la hoja `titulo`.
+    """
+    cabecera = values[0] if values else None
+    if titulo is not None:
+        schema = schema_registry.observe(titulo, cabecera)
+    elif cabecera:
+        schema = compile_schema(cabecera)
+    else:
+        schema = DEFAULT_SCHEMA
+
+    return [
+        _parse_fila(idx, row, schema)
+        for idx, row in enumerate(values[1:], start=2)
+    ]
+
+
+def _parse_fila_dia(fecha: str, idx: int, row: List[Any]) -> Dict[str, Any]:
+    """
+    Parser de filas para la caché: usa el esquema de la hoja de ese día.
+    """
+    return _parse_fila(idx, row, schema_registry.peek(fecha) or DEFAULT_SCHEMA)
+
+
+_plantilla_parseada: Tuple[Any, List[Dict[str, Any]]] = (None, [])
+
+
+def _agenda_plantilla(values: List[List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Agenda de PLANTILLA_DIA, parseada una sola vez por versión de la plantilla.
+    """
+    global _plantilla_parseada
+    origen, filas = _plantilla_parseada
+    if origen is not values:
+        filas = parsear_agenda(values)
+        _plantilla_parseada = (values, filas)
+    return filas
+
+
+# Caché por fecha (título de la hoja) de la agenda ya parseada
+agenda_cache = AgendaCache(AGENDA_CACHE_TTL, parse_fila=_parse_fila_dia)
+
+
+def es_clienta_flexible(row: Dict[str, Any]) -> bool:
+    """
+    Cita que se puede ofrecer para llenar un hueco:
+    confirmada, flexible y sin avisar todavía
+    (el mismo criterio que sugerir_clientas_para_hueco).
+    """
+    return (
+        row["Estado"] == "confirmada"
+        and row["Flexibilidad"] == "Si"
+        and row["Avisada"] != "Si"
+    )
+
+
+# Citas flexibles de los días ya leídos, para buscar entre días
+indice_flexibles = IndiceFlexibles(es_clienta_flexible, FLEXIBLES_INDICE_TTL)
+
+
+@origen
+@en_fase("parse")
 def leer_agenda(ws) -> List[Dict[str, Any]]:
     """
     Lee todas las filas de la hoja (excepto cabecera)
     y devuelve una lista de dicts normalizados.
+    Usa la caché del día si está vigente; lecturas simultáneas
+    del mismo día comparten una sola llamada a Google.
     """
-    values = ws.get_all_values()
-    if not values or len(values) < 2:
-        return []
+    filas = agenda_cache.get(ws.title)
+    if filas is not None:
+        return filas
+
+    if getattr(ws, "virtual", False):
+        # Día sin hoja: la plantilla ya está en memoria
+        filas = _agenda_plantilla(ws.values)
+        schema_registry.observe(ws.title, ws.values[0] if ws.values else None)
+        agenda_cache.set(ws.title, ws.values, filas)
+        event_bus.observar(ws.title, ws.values)
+        return [dict(f) for f in filas]
+
+    with agenda_cache.lock_carga(ws.title):
+        # Otra petición puede haberla cargado mientras esperábamos
+        filas = agenda_cache.get(ws.title, contar=False)
+        if filas is not None:
+            return filas
+
+        # Si se escribe en el día mientras la hoja está en vuelo, lo
+        # leído ya no es actual: se devuelve, pero no se guarda
+        generacion = agenda_cache.generacion(ws.title)
+        values = ws.get_all_values()
+        filas = parsear_agenda(values, ws.title)
+        if agenda_cache.set(ws.title, values, filas, generacion):
+            event_bus.observar(ws.title, values)
+        return filas
+
+
+def unidad_de_trabajo(ws) -> UnitOfWork:
+    """
+    Unidad de trabajo sobre la hoja del día, enlazada con la caché:
+    lee de la caché si puede y la actualiza al hacer commit.
+    Cada commit se publica como evento de cambios del día.
+    """
+    return UnitOfWork(ws, cache=agenda_cache, al_confirmar=tras_escritura)
 
-    filas: List[Dict[str, Any]] = []
-    for idx, row in enumerate(values[1:], start=2):
-        hora = row[0] if len(row) > 0 else ""
-        estado_raw = row[1] if len(row) > 1 else ""
-        cliente = row[2] if len(row) > 2 else ""
-        telefono = row[3] if len(row) > 3 else ""
-        servicio = row[4] if len(row) > 4 else ""
-        duracion_raw = row[5] if len(row) > 5 else ""
-        flex = row[6] if len(row) > 6 else ""
-        avisada = row[8] if len(row) > 8 else ""
-
-        estado = normaliza_estado(estado_raw)
-        duracion = duracion_a_minutos(duracion_raw)
-        servicio = servicio if servicio else DEFAULT_SERVICIO
-        flex = flex if flex in ("Si", "No") else DEFAULT_FLEXIBILIDAD
-
-        filas.append({
-            "row_sheet": idx,
-            "Hora": hora,
-            "Hora_min": hora_a_minutos(hora),
-            "Estado": estado,
-            "Cliente": cliente,
-            "Telefono": telefono,      # OJO: en frontend usamos row.Telefono
-            "Servicio": servicio,
-            "Duración": duracion,      # clave "Duración" como venías usando
-            "Flexibilidad": flex,
-            "Avisada": avisada,
-        })
 
-    return filas
+def tras_escritura(fecha: str, rows: List[int]) -> int:
+    """
+    Después de cada commit: lleva las filas escritas al índice de
+    flexibles y publica el evento de cambios. Si el día no está en caché,
+    el índice lo descarta (se releerá cuando haga falta).
+    """
+    filas = agenda_cache.filas_parseadas(fecha, rows)
+    if filas is None:
+        indice_flexibles.olvidar(fecha)
+    else:
+        indice_flexibles.actualizar_filas(fecha, filas.values())
+    return publicar_cambios(fecha, rows)
+
+
+def publicar_cambios(fecha: str, rows: List[int]) -> int:
+    """
+    Registra las filas cambiadas de un día (nueva versión) y las publica
+    a los clientes conectados (ver events.py), con los huecos y avisos
+    ya recalculados.
+    Sale de la caché, que el commit acaba de actualizar: si el día no
+    está en caché, el evento lleva filas=None y el cliente recarga.
+    """
+    def contenido() -> Dict[str, Any]:
+        agenda = agenda_cache.get(fecha, contar=False)
+        if agenda is None:
+            return {"filas": None}
+        cambiadas = set(rows)
+        vista = vista_dia(agenda)
+        return {
+            "filas": cambios_de_agenda(agenda, cambiadas),
+            "huecos": vista["huecos"],
+            "avisos": vista["avisos"],
+        }
+
+    return event_bus.publicar(fecha, rows, contenido, valores=agenda_cache.valores(fecha))
+
+
+def cambios_de_agenda(
+    agenda: List[Dict[str, Any]],
+    cambiadas: set,
+) -> List[Dict[str, Any]]:
+    """
+    Filas de la agenda cuyo row_sheet está en `cambiadas`.
+    """
+    return [f for f in agenda if f["row_sheet"] in cambiadas]
+
+
+def fila_resultado(uow: UnitOfWork, row: int) -> Optional[Dict[str, Any]]:
+    """
+    Fila ya escrita, normalizada como en leer_agenda, para que el cliente
+    la aplique sin recargar. Sale de la caché (actualizada por el commit)
+    o de las filas que leyó la unidad de trabajo; sin ninguna de las dos
+    devuelve None en vez de hacer otra lectura.
+    """
+    fecha = uow.ws.title
+    filas = agenda_cache.filas_parseadas(fecha, [row])
+    if filas is not None:
+        return filas[row]
+    try:
+        return _parse_fila_dia(fecha, row, uow.fila(row))
+    except KeyError:
+        return None
 
 
 # -------------------------
 # Acciones de negocio
 # -------------------------
 
-def cambiar_estado(ws, row_sheet: int, estado: str) -> None:
+@origen
+def cambiar_estado(ws, row_sheet: int, estado: str) -> Optional[Dict[str, Any]]:
     """
     Cambia el estado de una fila concreta.
+    Devuelve la fila resultante (ver fila_resultado).
+    """
+    with unidad_de_trabajo(ws) as uow:
+        _cambiar_estado(uow, row_sheet, estado)
+    return fila_resultado(uow, row_sheet)
+
+
+def actualizar_fila(ws, row_sheet: int, data: Dict[str, Any]) -> None:
+    """
+    Escribe varias columnas de una fila (por nombre; las que la hoja
+    no tiene se ignoran), como cualquier otra acción.
     """
+    with unidad_de_trabajo(ws) as uow:
+        for campo, valor in data.items():
+            if campo in uow.schema.col:
+                uow.set(row_sheet, campo, valor)
+
+
+def _cambiar_estado(uow: UnitOfWork, row_sheet: int, estado: str) -> None:
     estado_norm = normaliza_estado(estado)
-    ws.update_cell(row_sheet, 2, estado_para_sheet(estado_norm))
+    uow.set(row_sheet, "Estado", estado_para_sheet(estado_norm))
 
 
+@origen
 def crear_cita(
     ws,
     row_sheet: int,
@@ -132,73 +322,119 @@ def crear_cita(
     servicio: str = "",
     duracion: int | None = None,
     flexibilidad: str | None = None,
-) -> None:
+) -> Optional[Dict[str, Any]]:
     """
     Crea o edita una cita en una fila.
     - Si la fila estaba en hueco → pasa a confirmada
     - Si ya estaba confirmada o cancelada → mantiene el estado
+    Devuelve la fila resultante.
     """
+    with unidad_de_trabajo(ws) as uow:
+        _crear_cita(
+            uow,
+            row_sheet=row_sheet,
+            cliente=cliente,
+            telefono=telefono,
+            servicio=servicio,
+            duracion=duracion,
+            flexibilidad=flexibilidad,
+        )
+    return fila_resultado(uow, row_sheet)
+
+
+def _crear_cita(
+    uow: UnitOfWork,
+    row_sheet: int,
+    cliente: str = "",
+    telefono: str = "",
+    servicio: str = "",
+    duracion: int | None = None,
+    flexibilidad: str | None = None,
+) -> None:
     servicio = servicio if servicio else DEFAULT_SERVICIO
     duracion = int(duracion) if duracion not in (None, "") else DEFAULT_DURACION_MIN
     flexibilidad = flexibilidad if flexibilidad in ("Si", "No") else DEFAULT_FLEXIBILIDAD
 
+    uow.load(row_sheet)
+
     # Leer estado actual (col B)
-    estado_actual = ws.cell(row_sheet, 2).value
-    estado_actual = normaliza_estado(estado_actual)
+    estado_actual = normaliza_estado(uow.get(row_sheet, "Estado"))
 
     # Solo forzar confirmada si era hueco
     if estado_actual == "hueco":
-        ws.update_cell(row_sheet, 2, "Confirmada")
+        uow.set(row_sheet, "Estado", "Confirmada")
 
     # Actualizar datos (C..G)
-    ws.update_cell(row_sheet, 3, cliente)
-    ws.update_cell(row_sheet, 4, telefono)
-    ws.update_cell(row_sheet, 5, servicio)
-    ws.update_cell(row_sheet, 6, duracion)
-    ws.update_cell(row_sheet, 7, flexibilidad)
+    uow.set(row_sheet, "Cliente", cliente)
+    uow.set(row_sheet, "Teléfono", telefono)
+    uow.set(row_sheet, "Servicio", servicio)
+    uow.set(row_sheet, "Duración", duracion)
+    uow.set(row_sheet, "Flexibilidad", flexibilidad)
 
 
 # -------------------------
 # Detección de huecos
 # -------------------------
 
+@origen
 def detectar_huecos(ws) -> List[Dict[str, Any]]:
     """
     Detecta huecos reales teniendo en cuenta:
     - Hora de inicio
-    - Siguiente cita
+    - Citas confirmadas y lo que duran (una cita larga tapa los huecos
+      que caen dentro)
     - Duración real disponible
     - Si el hueco permite servicios largos
     """
-    agenda = leer_agenda(ws)
+    return huecos_de_agenda(leer_agenda(ws))
+
+
+# Capacidad que se da a un hueco sin ninguna cita después
+# (la hoja no dice a qué hora se cierra)
+DURACION_SIN_FIN = 180
+
+
+def mapa_libre(agenda: List[Dict[str, Any]]) -> MapaLibre:
+    """
+    Ocupación del día: cada cita confirmada ocupa de Hora_min a
+    Hora_min + Duración. El día empieza en la primera hora de la hoja.
+    Las filas sin hora válida no cuentan.
+    """
+    horas = [f["Hora_min"] for f in agenda if f["Hora_min"] >= 0]
+    ocupados = [
+        (f["Hora_min"], f["Hora_min"] + f["Duración"])
+        for f in agenda
+        if f["Estado"] == "confirmada" and f["Hora_min"] >= 0
+    ]
+    return MapaLibre(ocupados, inicio_dia=min(horas) if horas else 0)
+
+
+@en_fase("compute")
+def huecos_de_agenda(agenda: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Igual que detectar_huecos, sobre una agenda ya leída.
+    Cada fila de hueco vale lo que queda de la ventana libre en la que
+    cae (ver intervalos.py): hasta el inicio de la siguiente cita
+    confirmada. Las filas de hueco tapadas por una cita más larga que
+    empieza antes no son huecos. O(n log n) en total.
+    """
     if not agenda:
         return []
 
-    df = pd.DataFrame(agenda)
-    df = df.sort_values("Hora_min")
-
+    mapa = mapa_libre(agenda)
     huecos: List[Dict[str, Any]] = []
 
-    for idx, row in df.iterrows():
-        if row["Estado"] != "hueco":
+    for row in sorted(agenda, key=lambda f: f["Hora_min"]):
+        if row["Estado"] != "hueco" or row["Hora_min"] < 0:
             continue
 
-        inicio = int(row["Hora_min"])
-        row_sheet = int(row["row_sheet"])
-
-        # Buscar siguiente cita confirmada (ignorar otros huecos)
-        siguientes = df[
-            (df["Hora_min"] > inicio) &
-            (df["Estado"] != "hueco")
-        ]
+        inicio = row["Hora_min"]
+        ventana = mapa.ventana_en(inicio)
+        if ventana is None:
+            continue  # ocupado por una cita que empieza antes
 
-        if not siguientes.empty:
-            siguiente = siguientes.iloc[0]
-            fin = int(siguiente["Hora_min"])
-            duracion_real = max(0, fin - inicio)
-        else:
-            # Si no hay siguiente cita, dejamos un máximo razonable (ej. 180 min)
-            duracion_real = 180
+        fin = ventana[1]
+        duracion_real = fin - inicio if fin is not None else DURACION_SIN_FIN
 
         # Determinar si admite servicios largos
         admite_largo = duracion_real >= 60
@@ -207,62 +443,109 @@ def detectar_huecos(ws) -> List[Dict[str, Any]]:
             "Hora": row["Hora"],
             "Hora_min": inicio,
             "Duracion": duracion_real,
-            "row_sheet": row_sheet,
+            "row_sheet": row["row_sheet"],
             "Admite_largo": admite_largo,
         })
 
     return huecos
 
-def cambiar_avisada(ws, row_sheet: int, avisada: str) -> None:
+
+def _hora_texto(minutos: int) -> str:
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+@en_fase("compute")
+def ventanas_libres(agenda: List[Dict[str, Any]], minimo: int = 0) -> List[Dict[str, Any]]:
+    """
+    Ventanas libres del día de al menos `minimo` minutos, por hora.
+    La última no tiene fin (Fin y Duracion None).
+    """
+    if not agenda:
+        return []
+    ventanas = []
+    for inicio, fin in mapa_libre(agenda).ventanas(minimo):
+        ventanas.append({
+            "Hora": _hora_texto(inicio),
+            "Hora_min": inicio,
+            "Fin": _hora_texto(fin) if fin is not None else None,
+            "Fin_min": fin,
+            "Duracion": fin - inicio if fin is not None else None,
+        })
+    return ventanas
+
+@origen
+def cambiar_avisada(ws, row_sheet: int, avisada: str) -> Optional[Dict[str, Any]]:
     """
     Marca una cita como avisada o no avisada.
     Columna I (Avisada): valores esperados 'Si' o 'No'
+    Devuelve la fila resultante (ver fila_resultado).
     """
+    with unidad_de_trabajo(ws) as uow:
+        _cambiar_avisada(uow, row_sheet, avisada)
+    return fila_resultado(uow, row_sheet)
+
+
+def _cambiar_avisada(uow: UnitOfWork, row_sheet: int, avisada: str) -> None:
     valor = avisada if avisada in ("Si", "No") else "No"
-    ws.update_cell(row_sheet, 9, valor)
+    uow.set(row_sheet, "Avisada", valor)
+
 
-def mover_cita(ws, row_origen: int, row_destino: int) -> None:
+@origen
+def mover_cita(ws, row_origen: int, row_destino: int) -> List[Optional[Dict[str, Any]]]:
     """
     Mueve una cita de una fila a otra.
     - La fila destino debe estar en estado HUECO
     - Copia todos los datos de la cita
     - Limpia la fila origen y la deja como HUECO
+    Devuelve las filas resultantes [origen, destino].
     """
 
+    with unidad_de_trabajo(ws) as uow:
+        _mover_cita(uow, row_origen, row_destino)
+    return [fila_resultado(uow, row_origen), fila_resultado(uow, row_destino)]
+
+
+def _mover_cita(uow: UnitOfWork, row_origen: int, row_destino: int) -> None:
+    # Origen y destino en una sola lectura
+    uow.load(row_origen, row_destino)
+
     # Leer estado destino
-    estado_destino = normaliza_estado(ws.cell(row_destino, 2).value)
+    estado_destino = normaliza_estado(uow.get(row_destino, "Estado"))
     if estado_destino != "hueco":
         raise ValueError("La fila destino no está libre")
 
     # Leer datos de origen
-    estado_origen = normaliza_estado(ws.cell(row_origen, 2).value)
+    estado_origen = normaliza_estado(uow.get(row_origen, "Estado"))
     if estado_origen == "hueco":
         raise ValueError("No se puede mover un hueco")
 
-    cliente = ws.cell(row_origen, 3).value or ""
-    telefono = ws.cell(row_origen, 4).value or ""
-    servicio = ws.cell(row_origen, 5).value or DEFAULT_SERVICIO
-    duracion = ws.cell(row_origen, 6).value or DEFAULT_DURACION_MIN
-    flexibilidad = ws.cell(row_origen, 7).value or DEFAULT_FLEXIBILIDAD
-    avisada = ws.cell(row_origen, 9).value or "No"
+    cliente = uow.get(row_origen, "Cliente") or ""
+    telefono = uow.get(row_origen, "Teléfono") or ""
+    servicio = uow.get(row_origen, "Servicio") or DEFAULT_SERVICIO
+    duracion = uow.get(row_origen, "Duración") or DEFAULT_DURACION_MIN
+    flexibilidad = uow.get(row_origen, "Flexibilidad") or DEFAULT_FLEXIBILIDAD
+    avisada = uow.get(row_origen, "Avisada") or "No"
 
     # Escribir en destino
-    ws.update_cell(row_destino, 2, "Confirmada")
-    ws.update_cell(row_destino, 3, cliente)
-    ws.update_cell(row_destino, 4, telefono)
-    ws.update_cell(row_destino, 5, servicio)
-    ws.update_cell(row_destino, 6, duracion)
-    ws.update_cell(row_destino, 7, flexibilidad)
-    ws.update_cell(row_destino, 9, avisada)
+    uow.set(row_destino, "Estado", "Confirmada")
+    uow.set(row_destino, "Cliente", cliente)
+    uow.set(row_destino, "Teléfono", telefono)
+    uow.set(row_destino, "Servicio", servicio)
+    uow.set(row_destino, "Duración", duracion)
+    uow.set(row_destino, "Flexibilidad", flexibilidad)
+    uow.set(row_destino, "Avisada", avisada)
 
     # Limpiar origen (dejar como hueco)
-    ws.update_cell(row_origen, 2, "Hueco")
-    ws.update_cell(row_origen, 3, "")
-    ws.update_cell(row_origen, 4, "")
-    ws.update_cell(row_origen, 5, DEFAULT_SERVICIO)
-    ws.update_cell(row_origen, 6, DEFAULT_DURACION_MIN)
-    ws.update_cell(row_origen, 7, DEFAULT_FLEXIBILIDAD)
-    ws.update_cell(row_origen, 9, "No")
+    uow.set(row_origen, "Estado", "Hueco")
+    uow.set(row_origen, "Cliente", "")
+    uow.set(row_origen, "Teléfono", "")
+    uow.set(row_origen, "Servicio", DEFAULT_SERVICIO)
+    uow.set(row_origen, "Duración", DEFAULT_DURACION_MIN)
+    uow.set(row_origen, "Flexibilidad", DEFAULT_FLEXIBILIDAD)
+    uow.set(row_origen, "Avisada", "No")
+
+
+@en_fase("compute")
 def sugerir_clientas_para_hueco(
     agenda: List[Dict[str, Any]],
     duracion_hueco: int
@@ -300,6 +583,7 @@ def sugerir_clientas_para_hueco(
 # Detección de retrasos y adelantos (FASE 1)
 # -------------------------
 
+@origen
 def detectar_retrasos_y_adelantos(
     ws,
     margen_adelanto: int = 5
@@ -310,19 +594,26 @@ def detectar_retrasos_y_adelantos(
     - Adelantos: hay hueco suficiente antes de la siguiente cita
     Devuelve una lista de avisos (no ejecuta acciones).
     """
-    agenda = leer_agenda(ws)
+    return avisos_de_agenda(leer_agenda(ws), margen_adelanto)
+
+
+@en_fase("compute")
+def avisos_de_agenda(
+    agenda: List[Dict[str, Any]],
+    margen_adelanto: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Igual que detectar_retrasos_y_adelantos, sobre una agenda ya leída.
+    Compara cada fila con la siguiente en orden de hora (un solo recorrido).
+    """
     if not agenda:
         return []
 
-    df = pd.DataFrame(agenda)
-    df = df.sort_values("Hora_min")
+    ordenada = sorted(agenda, key=lambda f: f["Hora_min"])
 
     avisos: List[Dict[str, Any]] = []
 
-    for i in range(len(df) - 1):
-        actual = df.iloc[i]
-        siguiente = df.iloc[i + 1]
-
+    for actual, siguiente in zip(ordenada, ordenada[1:]):
         # Solo analizamos citas confirmadas
         if actual["Estado"] != "confirmada":
             continue
@@ -370,28 +661,148 @@ def detectar_retrasos_y_adelantos(
     return avisos
 
 
+# -------------------------
+# Lectura de varios días
+# -------------------------
+
+@origen
+@en_fase("parse")
+def leer_rango(fechas: List[str]) -> List[Dict[str, Any]]:
+    """
+    Agenda de varios días con una sola lectura al backend
+    (en Google Sheets, un values:batchGet).
+    - Solo se leen las hojas que existen (no se crea ninguna)
+    - Los días sin hoja se devuelven como agenda virtual vacía,
+      a partir de PLANTILLA_DIA (en memoria o en la misma lectura)
+    - Los días leídos quedan en la caché
+    Devuelve un dict por día, en orden.
+    """
+    generaciones = {fecha: agenda_cache.generacion(fecha) for fecha in fechas}
+    valores, valores_plantilla = get_backend().leer_dias(fechas)
+
+    plantilla = None
+    if valores_plantilla is not None:
+        plantilla = _agenda_plantilla(valores_plantilla)
+
+    dias = []
+    for fecha in fechas:
+        if fecha in valores:
+            filas = parsear_agenda(valores[fecha], fecha)
+            if agenda_cache.set(fecha, valores[fecha], filas, generaciones[fecha]):
+                event_bus.observar(fecha, valores[fecha])
+            dias.append({"fecha": fecha, "virtual": False, "agenda": filas})
+        else:
+            dias.append({"fecha": fecha, "virtual": True, "agenda": plantilla or []})
+
+    return dias
+
+
+# -------------------------
+# Clientas flexibles de otros días
+# -------------------------
+
+def fechas_siguientes(fecha: str, dias: int) -> List[str]:
+    """
+    Las `dias` fechas posteriores a `fecha` (YYYY-MM-DD), sin incluirla.
+    """
+    inicio = date.fromisoformat(fecha)
+    return [(inicio + timedelta(days=i)).isoformat() for i in range(1, dias + 1)]
+
+
+@origen
+def indexar_dias(fechas: List[str]) -> None:
+    """
+    Indexa las fechas que falten en indice_flexibles: las que están en
+    caché, desde la caché; el resto, con una sola lectura (leer_rango).
+    Es lo único que llena el índice: leer un día no lo indexa.
+    """
+    faltan = []
+    for fecha in indice_flexibles.faltan(fechas):
+        agenda = agenda_cache.get(fecha, contar=False)
+        if agenda is None:
+            faltan.append(fecha)
+        else:
+            indice_flexibles.indexar_dia(fecha, agenda)
+    if faltan:
+        for leido in leer_rango(faltan):
+            indice_flexibles.indexar_dia(leido["fecha"], leido["agenda"])
+
+
+@en_fase("compute")
+def candidatas_otros_dias(
+    fechas: List[str],
+    duracion_hueco: int,
+    limite: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Clientas flexibles con cita en `fechas` (ya indexadas, ver
+    indexar_dias) que caben en un hueco de `duracion_hueco` minutos.
+    Primero las que mejor lo llenan; cada una lleva su fecha y hora.
+    """
+    if not fechas:
+        return []
+    return indice_flexibles.candidatas(duracion_hueco, min(fechas), max(fechas), limite)
+
+
+# -------------------------
+# Vista del día
+# -------------------------
+
+@en_fase("compute")
+def vista_dia(
+    agenda: List[Dict[str, Any]],
+    margen_adelanto: int = 5
+) -> Dict[str, Any]:
+    """
+    Todo lo que necesita la pantalla de un día, calculado en memoria
+    a partir de una sola lectura de la agenda:
+    - agenda: filas normalizadas
+    - huecos: huecos reales con su duración y las clientas sugeridas
+    - avisos: retrasos / adelantos
+    """
+    huecos = huecos_de_agenda(agenda)
+    # Las candidatas son las mismas para todos los huecos: se filtran una vez
+    flexibles = [row for row in agenda if es_clienta_flexible(row)]
+    for hueco in huecos:
+        hueco["sugeridas"] = sugerir_clientas_para_hueco(
+            agenda=flexibles,
+            duracion_hueco=hueco["Duracion"],
+        )
+
+    return {
+        "agenda": agenda,
+        "huecos": huecos,
+        "avisos": avisos_de_agenda(agenda, margen_adelanto),
+    }
+
+
+@origen
 def aplicar_retraso_manual(
     ws,
     row_sheet: int,
     minutos: int
-) -> None:
+) -> Optional[Dict[str, Any]]:
     """
     Aplica un retraso manual sumando minutos a la hora de una cita.
     No reordena filas, solo ajusta la hora.
+    Devuelve la fila resultante.
     """
-    hora_actual = ws.cell(row_sheet, 1).value
+    with unidad_de_trabajo(ws) as uow:
+        _aplicar_retraso(uow, row_sheet, minutos)
+    return fila_resultado(uow, row_sheet)
+
+
+def _aplicar_retraso(uow: UnitOfWork, row_sheet: int, minutos: int) -> None:
+    uow.load(row_sheet)
+    hora_actual = uow.get(row_sheet, "Hora")
     hora_min = hora_a_minutos(hora_actual)
 
     if hora_min < 0:
         raise ValueError("Hora inválida")
 
     nueva_hora = hora_min + minutos
-    horas = nueva_hora // 60
-    mins = nueva_hora % 60
-    hora_txt = f"{horas:02d}:{mins:02d}"
+    uow.set(row_sheet, "Hora", _hora_texto(nueva_hora))
 
-    ws.update_cell(row_sheet, 1, hora_txt)
-    
 
 # -------------------------
 # Mensajes WhatsApp (FASE 1)
@@ -414,10 +825,69 @@ def mensaje_hueco(
         f"¿Te vendría bien?"
     )
 
+@origen
 def marcar_clientas_avisadas(ws, rows_sheet: list[int]) -> None:
     """
     Marca como 'Avisada = Si' varias filas de la agenda.
     Se usa después de intentar avisar por WhatsApp.
     """
-    for row in rows_sheet:
-        ws.update_cell(row, 9, "Si")
\ No newline at end of file
+    with unidad_de_trabajo(ws) as uow:
+        for row in rows_sheet:
+            _cambiar_avisada(uow, row, "Si")
+
+
+# -------------------------
+# Operaciones en lote
+# -------------------------
+
+# tipo → (acción sobre la unidad de trabajo, campos de fila que hay que leer)
+_OPERACIONES = {
+    "estado": (_cambiar_estado, ()),
+    "cita": (_crear_cita, ("row_sheet",)),
+    "avisada": (_cambiar_avisada, ()),
+    "mover": (_mover_cita, ("row_origen", "row_destino")),
+    "retraso": (_aplicar_retraso, ("row_sheet",)),
+}
+
+
+@origen
+def aplicar_operaciones(ws, operaciones: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Aplica varias operaciones sobre la agenda de un día:
+    - Una sola lectura con todas las filas que hay que consultar
+    - Cada operación ve el resultado de las anteriores
+    - Si una falla, se descartan solo sus cambios
+    - Todo lo válido se escribe en un solo batch_update
+    Devuelve un resultado por operación, en el mismo orden.
+    """
+    for op in operaciones:
+        if op.get("tipo") not in _OPERACIONES:
+            raise ValueError(f"Operación desconocida: {op.get('tipo')}")
+
+    uow = unidad_de_trabajo(ws)
+    uow.load(*[
+        op[campo]
+        for op in operaciones
+        for campo in _OPERACIONES[op["tipo"]][1]
+    ])
+
+    resultados: List[Dict[str, Any]] = []
+    for indice, op in enumerate(operaciones):
+        accion = _OPERACIONES[op["tipo"]][0]
+        params = {k: v for k, v in op.items() if k != "tipo"}
+
+        punto = uow.savepoint()
+        try:
+            accion(uow, **params)
+            resultados.append({"indice": indice, "tipo": op["tipo"], "ok": True})
+        except (ValueError, KeyError) as e:
+            uow.rollback_to(punto)
+            resultados.append({
+                "indice": indice,
+                "tipo": op["tipo"],
+                "ok": False,
+                "error": str(e),
+            })
+
+    uow.commit()
+    return resultados
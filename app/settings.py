@@ -16,3 +16,53 @@ SHEET_ID = os.getenv("SHEET_ID")
 DEFAULT_DURACION_MIN = 30
 DEFAULT_FLEXIBILIDAD = "No"
 DEFAULT_SERVICIO = "Servicio"
+
+# Agenda cache (seconds a day's agenda is served from memory; 0 disables it)
+AGENDA_CACHE_TTL = int(os.getenv("AGENDA_CACHE_TTL", "60"))
+
+# Worksheet registry (seconds before the list of day tabs is reloaded)
+WORKSHEET_REGISTRY_TTL = int(os.getenv("WORKSHEET_REGISTRY_TTL", "300"))
+
+# Max concurrent outbound requests to Google Sheets
+SHEETS_MAX_CONCURRENCY = int(os.getenv("SHEETS_MAX_CONCURRENCY", "8"))
+
+# Google Sheets quota (requests per minute) and retry policy for 429 / 5xx
+SHEETS_READS_PER_MIN = int(os.getenv("SHEETS_READS_PER_MIN", "60"))
+SHEETS_WRITES_PER_MIN = int(os.getenv("SHEETS_WRITES_PER_MIN", "60"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1.0"))
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "32.0"))
+
+# Storage backend: "sheets" (Google Sheets) or "sqlite" (local database)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+
+# SQLite backend: database file and seconds between syncs to the
+# spreadsheet (0 disables the mirror)
+SQLITE_PATH = BASE_DIR / os.getenv("SQLITE_PATH", "agenda.db")
+SQLITE_MIRROR_INTERVAL = float(os.getenv("SQLITE_MIRROR_INTERVAL", "0"))
+
+# In-memory Google Sheets stand-in (no credentials needed), with
+# per-call latency and random error injection for load tests
+SHEETS_FAKE = os.getenv("SHEETS_FAKE", "0").strip().lower() in ("1", "true", "yes")
+FAKE_SHEETS_LATENCY_MS = float(os.getenv("FAKE_SHEETS_LATENCY_MS", "0"))
+FAKE_SHEETS_ERROR_RATE = float(os.getenv("FAKE_SHEETS_ERROR_RATE", "0"))
+FAKE_SHEETS_ERROR_STATUS = int(os.getenv("FAKE_SHEETS_ERROR_STATUS", "429"))
+
+# Server-Timing header on every response, and the ?profile=1 sampled
+# call-stack profile (sampling interval in milliseconds). Profiling exposes
+# internal frame names to any client: off unless enabled explicitly
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").strip().lower() in ("1", "true", "yes")
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "0").strip().lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+
+# Seconds between keep-alive comments on the /agenda/eventos stream
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+
+# Idempotency-Key on write endpoints: seconds a stored response is replayed.
+# Long enough to cover the browser's offline write queue being replayed
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "86400"))
+
+# Cross-day index of flexible bookings: seconds an indexed day is trusted
+# without re-reading it, and how many days ahead a gap is matched against
+FLEXIBLES_INDICE_TTL = int(os.getenv("FLEXIBLES_INDICE_TTL", "600"))
+FLEXIBLES_DIAS = int(os.getenv("FLEXIBLES_DIAS", "7"))
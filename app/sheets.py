@@ -1,14 +1,21 @@
 import os
 import json
+import threading
+import time
 from pathlib import Path
 from typing import Optional, Tuple, List, Dict
 from functools import lru_cache
 from datetime import date
 
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 
-from .settings import SHEET_ID
+from .metrics import llamada_sheets, operacion_sheets, origen
+from .quota import quota_scheduler, tipo_peticion
+from .schema import EXPECTED_HEADERS, schema_registry
+from .settings import SHEET_ID, SHEETS_FAKE, SHEETS_MAX_CONCURRENCY, WORKSHEET_REGISTRY_TTL
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -43,13 +50,44 @@ def _load_credentials() -> Credentials:
 # Client & Spreadsheet (cached)
 # ---------------------------------------------------------------------
 
+class QuotaHTTPClient(gspread.http_client.HTTPClient):
+    """
+    Cliente HTTP de gspread que pasa cada petición por el planificador
+    de cuota (token buckets + reintentos ante 429 / 5xx) y la registra
+    en las métricas.
+    """
+
+    def request(self, method: str, endpoint: str, *args, **kwargs):
+        parent = super().request
+        tipo = tipo_peticion(method, endpoint)
+        with llamada_sheets(operacion_sheets(method, endpoint), tipo):
+            return quota_scheduler.run(
+                lambda: parent(method, endpoint, *args, **kwargs),
+                tipo,
+            )
+
 @lru_cache(maxsize=1)
 def get_client() -> gspread.Client:
     creds = _load_credentials()
-    return gspread.authorize(creds)
+
+    # Una sola sesión HTTP compartida, con tantas conexiones keep-alive
+    # como peticiones concurrentes permitimos hacia Google
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=SHEETS_MAX_CONCURRENCY,
+    )
+    session.mount("https://", adapter)
+
+    return gspread.authorize(creds, http_client=QuotaHTTPClient, session=session)
 
 @lru_cache(maxsize=1)
 def get_spreadsheet() -> gspread.Spreadsheet:
+    if SHEETS_FAKE:
+        # Spreadsheet en memoria, sin credenciales (ver fake_sheets.py)
+        from .fake_sheets import fake_spreadsheet
+        return fake_spreadsheet()
+
     if not SHEET_ID:
         raise ValueError("❌ SHEET_ID no definido")
     return get_client().open_by_key(SHEET_ID)
@@ -58,18 +96,129 @@ def get_spreadsheet() -> gspread.Spreadsheet:
 # Worksheets (one per day)
 # ---------------------------------------------------------------------
 
-EXPECTED_HEADERS = [
-    "Hora",
-    "Estado",
-    "Cliente",
-    "Teléfono",
-    "Servicio",
-    "Duración",
-    "Flexibilidad",
-    "Notas",
-    "Avisada",
-]
+PLANTILLA_DIA = "PLANTILLA_DIA"
+
+
+class WorksheetRegistry:
+    """
+    Mapa título → worksheet del spreadsheet.
+    Se carga de los metadatos una vez y solo se refresca ante un fallo
+    (título desconocido) o cuando vence el TTL. Las hojas nuevas se
+    registran directamente, sin volver a listar.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._hojas: Dict[str, gspread.Worksheet] = {}
+        self._cargado_en: Optional[float] = None
+        self._generacion = 0
+        self._creaciones: Dict[str, threading.Lock] = {}
+
+    def _caducado(self) -> bool:
+        return (
+            self._cargado_en is None
+            or time.monotonic() - self._cargado_en > self.ttl
+        )
+
+    def is_fresh(self) -> bool:
+        with self._lock:
+            return not self._caducado()
 
+    def refresh(self, generacion: Optional[int] = None) -> None:
+        """
+        Recarga todos los títulos con una sola lectura de metadatos.
+        Si otra petición ya refrescó desde `generacion`, no repite.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                if generacion is not None and self._generacion != generacion:
+                    return
+            hojas = {ws.title: ws for ws in get_spreadsheet().worksheets()}
+            with self._lock:
+                self._hojas = hojas
+                self._cargado_en = time.monotonic()
+                self._generacion += 1
+
+    def get(self, title: str, refrescar: bool = True) -> Optional[gspread.Worksheet]:
+        """
+        Devuelve la worksheet con ese título, o None si no existe.
+        Con refrescar=False solo mira lo ya conocido, sin llamar a Google.
+        """
+        with self._lock:
+            if not refrescar:
+                return self._hojas.get(title)
+            generacion = self._generacion
+            ws = None if self._caducado() else self._hojas.get(title)
+        if ws is not None:
+            return ws
+
+        self.refresh(generacion)
+        with self._lock:
+            return self._hojas.get(title)
+
+    def lookup(self, title: str) -> Optional[gspread.Worksheet]:
+        """
+        Como get(), pero un título desconocido no provoca refresco:
+        solo se recarga si el registro ha caducado. Para lecturas, donde
+        un día sin hoja es lo normal (días futuros).
+        """
+        with self._lock:
+            generacion = self._generacion
+            caducado = self._caducado()
+        if caducado:
+            self.refresh(generacion)
+        with self._lock:
+            return self._hojas.get(title)
+
+    def peek(self, title: str) -> Optional[gspread.Worksheet]:
+        """
+        Devuelve la worksheet solo si ya está registrada y vigente.
+        Nunca llama a Google.
+        """
+        with self._lock:
+            if self._caducado():
+                return None
+            return self._hojas.get(title)
+
+    def titles(self) -> List[str]:
+        """
+        Títulos de todas las hojas (refresca una vez si el registro caducó).
+        """
+        with self._lock:
+            generacion = self._generacion
+            caducado = self._caducado()
+        if caducado:
+            self.refresh(generacion)
+        with self._lock:
+            return list(self._hojas)
+
+    def register(self, ws: gspread.Worksheet) -> None:
+        with self._lock:
+            self._hojas[ws.title] = ws
+
+    def lock_creacion(self, title: str) -> threading.Lock:
+        """
+        Lock compartido por todas las peticiones que quieren crear
+        la misma hoja, para que solo una llame a duplicate_sheet.
+        """
+        with self._lock:
+            return self._creaciones.setdefault(title, threading.Lock())
+
+    def fin_creacion(self, title: str) -> None:
+        with self._lock:
+            self._creaciones.pop(title, None)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cargado_en = None
+
+
+worksheet_registry = WorksheetRegistry(WORKSHEET_REGISTRY_TTL)
+
+
+@origen
 def get_ws_dia(fecha_iso: Optional[str] = None) -> Tuple[gspread.Worksheet, str]:
     """
     Devuelve la worksheet del día (YYYY-MM-DD).
@@ -78,25 +227,111 @@ def get_ws_dia(fecha_iso: Optional[str] = None) -> Tuple[gspread.Worksheet, str]
     if not fecha_iso:
         fecha_iso = date.today().isoformat()
 
-    sh = get_spreadsheet()
-    hojas = {ws.title: ws for ws in sh.worksheets()}
+    ws = worksheet_registry.get(fecha_iso)
+    if ws is not None:
+        return ws, fecha_iso
 
-    if fecha_iso in hojas:
-        return hojas[fecha_iso], fecha_iso
+    lock = worksheet_registry.lock_creacion(fecha_iso)
+    with lock:
+        # Otra petición puede haberla creado mientras esperábamos
+        ws = worksheet_registry.get(fecha_iso, refrescar=False)
+        if ws is not None:
+            return ws, fecha_iso
 
-    if "PLANTILLA_DIA" not in hojas:
-        raise RuntimeError("❌ No existe la hoja PLANTILLA_DIA")
+        try:
+            plantilla = worksheet_registry.get(PLANTILLA_DIA)
+            if plantilla is None:
+                raise RuntimeError("❌ No existe la hoja PLANTILLA_DIA")
 
-    plantilla = hojas["PLANTILLA_DIA"]
+            try:
+                ws = get_spreadsheet().duplicate_sheet(
+                    source_sheet_id=plantilla.id,
+                    new_sheet_name=fecha_iso,
+                )
+            except gspread.exceptions.APIError:
+                # Puede haberla creado otro proceso: refrescamos y miramos
+                ws = worksheet_registry.get(fecha_iso)
+                if ws is None:
+                    raise
 
-    sh.duplicate_sheet(
-        source_sheet_id=plantilla.id,
-        new_sheet_name=fecha_iso,
-    )
+            worksheet_registry.register(ws)
+        finally:
+            worksheet_registry.fin_creacion(fecha_iso)
 
-    ws = sh.worksheet(fecha_iso)
     return ws, fecha_iso
 
+# ---------------------------------------------------------------------
+# Días virtuales (sin hoja todavía)
+# ---------------------------------------------------------------------
+
+class VirtualWorksheet:
+    """
+    Día que aún no tiene hoja: se lee como PLANTILLA_DIA, sin crearla.
+    La hoja real se crea con get_ws_dia() en la primera escritura.
+    """
+    virtual = True
+
+    def __init__(self, title: str, values: List[List[str]]):
+        self.title = title
+        self.values = values
+
+    def get_all_values(self) -> List[List[str]]:
+        return [list(r) for r in self.values]
+
+
+_template_lock = threading.Lock()
+_template: Optional[Tuple[float, List[List[str]]]] = None
+
+
+def cached_template_values() -> Optional[List[List[str]]]:
+    """
+    Valores de PLANTILLA_DIA si ya están en memoria y vigentes, o None.
+    """
+    with _template_lock:
+        if _template is None:
+            return None
+        cargado_en, values = _template
+        if time.monotonic() - cargado_en > WORKSHEET_REGISTRY_TTL:
+            return None
+        return values
+
+
+def store_template_values(values: List[List[str]]) -> List[List[str]]:
+    global _template
+    with _template_lock:
+        _template = (time.monotonic(), values)
+    return values
+
+
+def template_values() -> List[List[str]]:
+    """
+    Valores de PLANTILLA_DIA, leídos una vez y guardados en memoria.
+    """
+    values = cached_template_values()
+    if values is not None:
+        return values
+
+    plantilla = worksheet_registry.lookup(PLANTILLA_DIA)
+    if plantilla is None:
+        raise RuntimeError("❌ No existe la hoja PLANTILLA_DIA")
+    return store_template_values(plantilla.get_all_values())
+
+
+@origen
+def get_ws_lectura(fecha_iso: Optional[str] = None) -> Tuple[object, str]:
+    """
+    Worksheet del día para leer. Si el día no tiene hoja, devuelve un
+    VirtualWorksheet con la plantilla en vez de crearla.
+    """
+    if not fecha_iso:
+        fecha_iso = date.today().isoformat()
+
+    ws = worksheet_registry.lookup(fecha_iso)
+    if ws is not None:
+        return ws, fecha_iso
+
+    return VirtualWorksheet(fecha_iso, template_values()), fecha_iso
+
 # ---------------------------------------------------------------------
 # Data helpers
 # ---------------------------------------------------------------------
@@ -107,6 +342,24 @@ def read_agenda(ws: gspread.Worksheet) -> List[Dict]:
     """
     return ws.get_all_records(expected_headers=EXPECTED_HEADERS)
 
+def read_values_batch(titles: List[str]) -> Dict[str, List[List[str]]]:
+    """
+    Lee los valores de varias hojas con una sola llamada (values:batchGet).
+    Devuelve título → filas (incluida la cabecera).
+    """
+    if not titles:
+        return {}
+
+    # Hoja completa: la cabecera viene incluida y las columnas pueden estar en cualquier orden
+    ranges = [gspread.utils.absolute_range_name(title) for title in titles]
+    response = get_spreadsheet().values_batch_get(ranges)
+    value_ranges = response.get("valueRanges", [])
+
+    return {
+        title: vr.get("values", [])
+        for title, vr in zip(titles, value_ranges)
+    }
+
 def update_cell(
     ws: gspread.Worksheet,
     row: int,
@@ -116,30 +369,25 @@ def update_cell(
     """
     Actualiza una celda por nombre de columna (1-based row).
     """
-    headers = ws.row_values(1)
-    if column_name not in headers:
+    schema = schema_registry.get(ws)
+    if column_name not in schema.col:
         raise ValueError(f"❌ Columna '{column_name}' no existe")
 
-    col_idx = headers.index(column_name) + 1
-    ws.update_cell(row, col_idx, value)
+    ws.update_cell(row, schema.col[column_name], value)
 
 def update_row(ws: gspread.Worksheet, row: int, data: Dict) -> None:
     """
     Actualiza múltiples columnas de una fila.
     """
-    headers = ws.row_values(1)
-    updates = []
-
-    for key, value in data.items():
-        if key in headers:
-            col = headers.index(key) + 1
-            updates.append((row, col, value))
+    schema = schema_registry.get(ws)
+    updates = [
+        {
+            "range": schema.a1(row, key),
+            "values": [[value]],
+        }
+        for key, value in data.items()
+        if key in schema.col
+    ]
 
     if updates:
-        ws.batch_update([
-            {
-                "range": gspread.utils.rowcol_to_a1(r, c),
-                "values": [[v]],
-            }
-            for r, c, v in updates
-        ])
+        ws.batch_update(updates)
@@ -0,0 +1,104 @@
+import asyncio
+import weakref
+from datetime import date
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from anyio import CapacityLimiter, to_thread
+
+from . import services
+from .metrics import fase
+from .settings import SHEETS_MAX_CONCURRENCY
+from .storage import get_backend
+
+# ---------------------------------------------------------------------
+# Acceso asíncrono a Google Sheets
+# ---------------------------------------------------------------------
+#
+# gspread es bloqueante. En vez de ocupar el pool de hilos por defecto de
+# Starlette (y dejar esperando a peticiones como GET /), las llamadas a
+# Google se ejecutan en hilos propios limitados por SHEETS_MAX_CONCURRENCY,
+# sobre la sesión HTTP compartida de sheets.get_client().
+#
+# - Días distintos avanzan en paralelo.
+# - Las escrituras de un mismo día se serializan con lock_fecha().
+# - Con un backend local (STORAGE_BACKEND=sqlite) no hay I/O lento:
+#   las llamadas se hacen directamente, sin pasar por un hilo. Lo que
+#   puede necesitar a Google aun así (crear un día desde la plantilla)
+#   va siempre por en_hilo().
+
+_limiter = CapacityLimiter(SHEETS_MAX_CONCURRENCY)
+
+_locks_fecha: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+async def run_sheets(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta una función bloqueante (gspread o services) fuera del event loop,
+    respetando el límite de peticiones concurrentes hacia Google.
+    """
+    if not get_backend().bloqueante:
+        return fn(*args, **kwargs)
+    return await en_hilo(fn, *args, **kwargs)
+
+
+async def en_hilo(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Como run_sheets(), pero siempre en un hilo, sea cual sea el backend.
+    """
+    return await to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_limiter)
+
+
+def lock_fecha(fecha_iso: str) -> asyncio.Lock:
+    """
+    Lock por día: las escrituras sobre la misma fecha no se pisan,
+    las de fechas distintas no se esperan entre sí.
+    """
+    lock = _locks_fecha.get(fecha_iso)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks_fecha[fecha_iso] = lock
+    return lock
+
+
+async def get_ws_dia(fecha_iso: Optional[str] = None) -> Tuple[Any, str]:
+    """
+    Hoja del día para escribir, del backend configurado
+    (se crea si no existe). Si el backend la tiene a mano
+    (p. ej. ya en el registro de hojas), no sale del event loop.
+    """
+    if not fecha_iso:
+        fecha_iso = date.today().isoformat()
+
+    backend = get_backend()
+    with fase("lookup"):
+        ws = backend.peek_ws_dia(fecha_iso)
+        if ws is None:
+            ws = await en_hilo(backend.get_ws_dia, fecha_iso)
+    return ws, fecha_iso
+
+
+async def get_ws_lectura(fecha_iso: Optional[str] = None) -> Tuple[object, str]:
+    """
+    Hoja del día para leer, del backend configurado (nunca la crea).
+    Si el registro y la plantilla están en memoria, no sale del event loop.
+    """
+    if not fecha_iso:
+        fecha_iso = date.today().isoformat()
+
+    backend = get_backend()
+    with fase("lookup"):
+        ws = backend.peek_ws_lectura(fecha_iso)
+        if ws is None:
+            ws = await en_hilo(backend.get_ws_lectura, fecha_iso)
+    return ws, fecha_iso
+
+
+async def update_row(fecha_iso: str, row: int, data: Dict) -> None:
+    """
+    Actualiza varias columnas de una fila del día en el backend
+    configurado (con la caché, el índice y los eventos al día).
+    """
+    ws, fecha_iso = await get_ws_dia(fecha_iso)
+    async with lock_fecha(fecha_iso):
+        await run_sheets(services.actualizar_fila, ws, row, data)
@@ -0,0 +1,432 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+
+from . import sheets
+from .quota import en_segundo_plano
+from .settings import SQLITE_MIRROR_INTERVAL, SQLITE_PATH
+from .sheets import PLANTILLA_DIA, VirtualWorksheet
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Backend SQLite
+# ---------------------------------------------------------------------
+#
+# Cada fila de cada día es un registro (fecha, fila) → valores en JSON,
+# con la misma disposición que la hoja (fila 1 = cabecera). La clave
+# primaria (fecha, fila) es el índice: leer un día o una fila es una
+# búsqueda por índice, sin recorrer la tabla.
+#
+# - WAL: las lecturas no esperan a las escrituras
+# - Una conexión por hilo
+# - PLANTILLA_DIA se importa de Google Sheets la primera vez
+# - Cada fila escrita queda en `pendientes` para el espejo (SheetsMirror),
+#   que la copia al spreadsheet en segundo plano
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS filas (
+    fecha   TEXT    NOT NULL,
+    fila    INTEGER NOT NULL,
+    valores TEXT    NOT NULL,
+    PRIMARY KEY (fecha, fila)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS pendientes (
+    fecha   TEXT    NOT NULL,
+    fila    INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (fecha, fila)
+) WITHOUT ROWID;
+"""
+
+
+def _celda(valor: Any) -> str:
+    """
+    Valor tal y como lo devolvería la hoja (texto).
+    """
+    return "" if valor is None else str(valor)
+
+
+class SqliteDia:
+    """
+    Hoja de un día guardada en SQLite, con la superficie de
+    gspread.Worksheet que usa services.py.
+    """
+
+    virtual = False
+
+    def __init__(self, backend: "SqliteBackend", title: str):
+        self.backend = backend
+        self.title = title
+        self.id = title
+
+    def get_all_values(self) -> List[List[str]]:
+        return self.backend.leer_filas(self.title)
+
+    def row_values(self, row: int) -> List[str]:
+        fila = self.backend.leer_filas(self.title, row, row)
+        return fila[0] if fila else []
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        """
+        Varios rangos A1 ("1:1", "2:5", "B3:D4"...) en una sola transacción.
+        """
+        with self.backend.transaccion(escritura=False) as con:
+            resultado = []
+            for rango in ranges:
+                grid = a1_range_to_grid_range(rango)
+                ini = grid.get("startRowIndex", 0) + 1
+                fin = grid.get("endRowIndex")
+                filas = self.backend._leer(con, self.title, ini, fin)
+                c_ini = grid.get("startColumnIndex", 0)
+                c_fin = grid.get("endColumnIndex")
+                resultado.append([f[c_ini:c_fin] for f in filas])
+            return resultado
+
+    def batch_update(self, data: List[Dict[str, Any]], raw: bool = True) -> None:
+        """
+        Escribe varios rangos A1 en una sola transacción.
+        """
+        celdas: List[Tuple[int, int, Any]] = []
+        for bloque in data:
+            grid = a1_range_to_grid_range(bloque["range"])
+            row0 = grid.get("startRowIndex", 0) + 1
+            col0 = grid.get("startColumnIndex", 0) + 1
+            for dr, valores in enumerate(bloque["values"]):
+                for dc, valor in enumerate(valores):
+                    celdas.append((row0 + dr, col0 + dc, valor))
+        self.backend.escribir_celdas(self.title, celdas)
+
+    def update_cell(self, row: int, col: int, value: Any) -> None:
+        self.backend.escribir_celdas(self.title, [(row, col, value)])
+
+
+class SqliteBackend(StorageBackend):
+    """
+    La agenda vive en un fichero SQLite local.
+    """
+
+    nombre = "sqlite"
+    # Cada operación tarda menos de un milisegundo: no merece un hilo
+    bloqueante = False
+
+    def __init__(self, path: Path = SQLITE_PATH, intervalo_espejo: float = SQLITE_MIRROR_INTERVAL):
+        self.path = str(path)
+        self._local = threading.local()
+        self._plantilla: Optional[List[List[str]]] = None
+        self._plantilla_lock = threading.Lock()
+        self.espejo = SheetsMirror(self, intervalo_espejo) if intervalo_espejo > 0 else None
+
+        con = self._conexion()
+        con.executescript(_ESQUEMA)
+
+    # -------------------------
+    # Conexiones y transacciones
+    # -------------------------
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            # Con WAL, NORMAL no pierde consistencia y evita un fsync por escritura
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA busy_timeout=5000")
+            self._local.con = con
+        return con
+
+    def transaccion(self, escritura: bool = True) -> "_Transaccion":
+        return _Transaccion(self._conexion(), escritura)
+
+    # -------------------------
+    # Filas
+    # -------------------------
+
+    @staticmethod
+    def _leer(
+        con: sqlite3.Connection,
+        fecha: str,
+        desde: int = 1,
+        hasta: Optional[int] = None,
+    ) -> List[List[str]]:
+        """
+        Filas [desde, hasta] (1-based, hasta incluido) de un día.
+        Las filas que no existen se devuelven vacías, como en la hoja.
+        """
+        if hasta is None:
+            cur = con.execute(
+                "SELECT fila, valores FROM filas WHERE fecha = ? AND fila >= ? ORDER BY fila",
+                (fecha, desde),
+            )
+        else:
+            cur = con.execute(
+                "SELECT fila, valores FROM filas WHERE fecha = ? AND fila BETWEEN ? AND ? ORDER BY fila",
+                (fecha, desde, hasta),
+            )
+
+        filas: List[List[str]] = []
+        for fila, valores in cur:
+            while desde + len(filas) < fila:
+                filas.append([])
+            filas.append(json.loads(valores))
+        return filas
+
+    def leer_filas(self, fecha: str, desde: int = 1, hasta: Optional[int] = None) -> List[List[str]]:
+        return self._leer(self._conexion(), fecha, desde, hasta)
+
+    def escribir_celdas(self, fecha: str, celdas: List[Tuple[int, int, Any]]) -> None:
+        """
+        Aplica escrituras (row, col, valor) 1-based y marca las filas
+        como pendientes de copiar al spreadsheet.
+        """
+        if not celdas:
+            return
+
+        por_fila: Dict[int, List[Tuple[int, Any]]] = {}
+        for row, col, valor in celdas:
+            por_fila.setdefault(row, []).append((col, valor))
+
+        with self.transaccion() as con:
+            for row, cambios in por_fila.items():
+                actual = con.execute(
+                    "SELECT valores FROM filas WHERE fecha = ? AND fila = ?",
+                    (fecha, row),
+                ).fetchone()
+                fila = json.loads(actual[0]) if actual else []
+                for col, valor in cambios:
+                    if len(fila) < col:
+                        fila.extend([""] * (col - len(fila)))
+                    fila[col - 1] = _celda(valor)
+
+                con.execute(
+                    "INSERT OR REPLACE INTO filas (fecha, fila, valores) VALUES (?, ?, ?)",
+                    (fecha, row, json.dumps(fila, ensure_ascii=False)),
+                )
+                if self.espejo is not None:
+                    con.execute(
+                        "INSERT INTO pendientes (fecha, fila) VALUES (?, ?) "
+                        "ON CONFLICT (fecha, fila) DO UPDATE SET version = version + 1",
+                        (fecha, row),
+                    )
+
+    def importar(self, fecha: str, values: List[List[Any]]) -> None:
+        """
+        Sustituye el día entero por `values` (cabecera incluida).
+        """
+        with self.transaccion() as con:
+            self._importar(con, fecha, values)
+
+    @staticmethod
+    def _importar(con: sqlite3.Connection, fecha: str, values: List[List[Any]]) -> None:
+        con.execute("DELETE FROM filas WHERE fecha = ?", (fecha,))
+        con.executemany(
+            "INSERT INTO filas (fecha, fila, valores) VALUES (?, ?, ?)",
+            [
+                (fecha, idx, json.dumps([_celda(v) for v in row], ensure_ascii=False))
+                for idx, row in enumerate(values, start=1)
+            ],
+        )
+
+    def _existe(self, con: sqlite3.Connection, fecha: str) -> bool:
+        return con.execute(
+            "SELECT 1 FROM filas WHERE fecha = ? LIMIT 1", (fecha,)
+        ).fetchone() is not None
+
+    # -------------------------
+    # Plantilla
+    # -------------------------
+
+    def plantilla(self) -> List[List[str]]:
+        """
+        Valores de PLANTILLA_DIA (importada de Google Sheets si aún no está).
+        Siempre el mismo objeto mientras no cambie, para que services.py
+        la parsee una sola vez.
+        """
+        if self._plantilla is not None:
+            return self._plantilla
+
+        with self._plantilla_lock:
+            if self._plantilla is None:
+                values = self.leer_filas(PLANTILLA_DIA)
+                if not values:
+                    values = sheets.template_values()
+                    self.importar(PLANTILLA_DIA, values)
+                    values = self.leer_filas(PLANTILLA_DIA)
+                self._plantilla = values
+            return self._plantilla
+
+    # -------------------------
+    # StorageBackend
+    # -------------------------
+
+    def get_ws_dia(self, fecha_iso: str) -> SqliteDia:
+        con = self._conexion()
+        if not self._existe(con, fecha_iso):
+            plantilla = self.plantilla()
+            with self.transaccion() as con:
+                # Otra petición puede haberlo creado mientras tanto
+                if not self._existe(con, fecha_iso):
+                    self._importar(con, fecha_iso, plantilla)
+        return SqliteDia(self, fecha_iso)
+
+    def get_ws_lectura(self, fecha_iso: str):
+        if self._existe(self._conexion(), fecha_iso):
+            return SqliteDia(self, fecha_iso)
+        return VirtualWorksheet(fecha_iso, self.plantilla())
+
+    def peek_ws_dia(self, fecha_iso: str):
+        """
+        Solo si el día ya existe: crearlo puede necesitar la plantilla
+        de Google Sheets (I/O lento).
+        """
+        if self._existe(self._conexion(), fecha_iso):
+            return SqliteDia(self, fecha_iso)
+        return None
+
+    def peek_ws_lectura(self, fecha_iso: str):
+        if self._existe(self._conexion(), fecha_iso):
+            return SqliteDia(self, fecha_iso)
+        if self._plantilla is not None:
+            return VirtualWorksheet(fecha_iso, self._plantilla)
+        return None
+
+    def leer_dias(self, fechas: List[str]):
+        if not fechas:
+            return {}, None
+
+        placeholders = ",".join("?" * len(fechas))
+        valores: Dict[str, List[List[str]]] = {}
+        with self.transaccion(escritura=False) as con:
+            cur = con.execute(
+                f"SELECT fecha, fila, valores FROM filas WHERE fecha IN ({placeholders}) "
+                "ORDER BY fecha, fila",
+                fechas,
+            )
+            for fecha, fila, fila_json in cur:
+                dia = valores.setdefault(fecha, [])
+                while len(dia) < fila - 1:
+                    dia.append([])
+                dia.append(json.loads(fila_json))
+
+        plantilla = self.plantilla() if len(valores) < len(fechas) else None
+        return valores, plantilla
+
+    def iniciar(self) -> None:
+        # La plantilla se carga al arrancar, no en la primera petición
+        # (puede que haya que importarla de Google Sheets)
+        try:
+            self.plantilla()
+        except Exception:
+            logger.exception("SQLite: no se pudo cargar la plantilla del día")
+        if self.espejo is not None:
+            self.espejo.start()
+
+    def detener(self) -> None:
+        if self.espejo is not None:
+            self.espejo.stop()
+
+
+class _Transaccion:
+    """
+    BEGIN / COMMIT / ROLLBACK sobre una conexión en modo autocommit.
+    Las de escritura toman el lock de escritura desde el principio.
+    """
+
+    def __init__(self, con: sqlite3.Connection, escritura: bool):
+        self.con = con
+        self.escritura = escritura
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.con.execute("BEGIN IMMEDIATE" if self.escritura else "BEGIN")
+        return self.con
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.con.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+
+
+# ---------------------------------------------------------------------
+# Espejo SQLite → Google Sheets
+# ---------------------------------------------------------------------
+
+class SheetsMirror:
+    """
+    Hilo que cada `intervalo` segundos copia al spreadsheet las filas
+    escritas en SQLite (una escritura batch_update por día). Si Google
+    falla, las filas siguen pendientes y se reintentan en la siguiente
+    vuelta.
+    """
+
+    def __init__(self, backend: SqliteBackend, intervalo: float):
+        self.backend = backend
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._hilo is not None:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="sheets-mirror", daemon=True)
+        self._hilo.start()
+
+    def stop(self) -> None:
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo + 5)
+            self._hilo = None
+
+    def _bucle(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.sincronizar()
+            except Exception:
+                logger.exception("Espejo SQLite → Sheets: fallo al sincronizar")
+
+    def sincronizar(self) -> int:
+        """
+        Copia las filas pendientes. Devuelve cuántas se han copiado.
+        """
+        con = self.backend._conexion()
+        pendientes: Dict[str, List[Tuple[int, int]]] = {}
+        for fecha, fila, version in con.execute(
+            "SELECT fecha, fila, version FROM pendientes ORDER BY fecha, fila"
+        ):
+            pendientes.setdefault(fecha, []).append((fila, version))
+
+        copiadas = 0
+        with en_segundo_plano():
+            for fecha, filas in pendientes.items():
+                copiadas += self._copiar_dia(fecha, filas)
+        return copiadas
+
+    def _copiar_dia(self, fecha: str, filas: List[Tuple[int, int]]) -> int:
+        ws, _ = sheets.get_ws_dia(fecha)
+
+        data = []
+        for fila, _version in filas:
+            valores = self.backend.leer_filas(fecha, fila, fila)
+            valores = valores[0] if valores else []
+            if not valores:
+                continue
+            data.append({
+                "range": f"A{fila}:{rowcol_to_a1(fila, len(valores))}",
+                "values": [valores],
+            })
+
+        if data:
+            ws.batch_update(data, raw=False)
+
+        # Solo se borran si no se han vuelto a escribir mientras tanto
+        with self.backend.transaccion() as con:
+            con.executemany(
+                "DELETE FROM pendientes WHERE fecha = ? AND fila = ? AND version = ?",
+                [(fecha, fila, version) for fila, version in filas],
+            )
+        return len(data)
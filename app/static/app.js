@@ -0,0 +1,756 @@
+/* ====== ACCESO PROTEGIDO (LOPD BÁSICO) ====== */
+const AGENDA_PASSWORD = "010819"; // ⚠️ cambia esto por la contraseña que quieras
+const AUTH_KEY = "agenda_auth_ok";
+
+function checkAuth() {
+  if (localStorage.getItem(AUTH_KEY) === "true") return true;
+
+  const pass = prompt("🔒 Introduce la contraseña para acceder a la agenda:");
+  if (pass === AGENDA_PASSWORD) {
+    localStorage.setItem(AUTH_KEY, "true");
+    return true;
+  }
+  alert("❌ Contraseña incorrecta");
+  return false;
+}
+/* =========================================== */
+
+/* ====== ERRORES DEL SERVIDOR ====== */
+let errorTimer = null;
+let ultimoError = '';
+
+function mostrarError(mensaje) {
+  ultimoError = mensaje;
+  const banner = document.getElementById('errorBanner');
+  banner.textContent = mensaje;
+  banner.style.display = 'block';
+  clearTimeout(errorTimer);
+  errorTimer = setTimeout(() => { banner.style.display = 'none'; }, 6000);
+}
+
+// fetch que muestra los errores en vez de ignorarlos
+async function apiFetch(url, opts) {
+  let res;
+  try {
+    res = await fetch(url, opts);
+  } catch (e) {
+    mostrarError('📶 Sin conexión con el servidor');
+    throw e;
+  }
+
+  if (!res.ok) {
+    let detalle = '';
+    try { detalle = (await res.clone().json()).detail || ''; } catch (e) {}
+
+    if (res.status === 429 || res.status === 503) {
+      mostrarError('⏳ Google Sheets está saturado. Reintenta en unos segundos.');
+    } else {
+      mostrarError('❌ ' + (typeof detalle === 'string' && detalle ? detalle : `Error ${res.status}`));
+    }
+  }
+  return res;
+}
+/* =========================================== */
+
+let mostrarHuecos = true;
+
+function toggleHuecos() {
+  mostrarHuecos = !mostrarHuecos;
+  renderAgenda();
+}
+
+let fechaSeleccionada = null;
+let vistaActual = null;
+
+function parseHora(hora) {
+  if (!hora) return 0;
+  const [h, m] = hora.split(':').map(Number);
+  return h * 60 + (m || 0);
+}
+
+function closeAllMenus() {
+  document.querySelectorAll('.menu-content').forEach(menu => {
+    menu.style.display = 'none';
+  });
+}
+
+async function cargarAgenda() {
+  if (!checkAuth()) return;
+  // Primero la última copia guardada del día (al instante, también sin
+  // red); después la del servidor, que la sustituye
+  const fecha = fechaSeleccionada || new Date().toISOString().slice(0,10);
+  if (!vistaActual || vistaActual.fecha !== fecha) {
+    const local = await leerVistaLocal(fecha);
+    if (local && (!vistaActual || vistaActual.fecha !== fecha)) {
+      vistaActual = await aplicarPendientes(local);
+      renderAgenda();
+    }
+  }
+
+  // Agenda, huecos (con sugeridas) y avisos en una sola petición
+  const url = fechaSeleccionada ? `/agenda/vista?fecha=${fechaSeleccionada}` : '/agenda/vista';
+  let res;
+  try {
+    res = await apiFetch(url);
+  } catch (e) {
+    return; // sin red: se queda la copia local
+  }
+  if (!res.ok) return;
+  await ponerVista(await res.json());
+}
+
+// Vista completa recibida del servidor: se guarda tal cual y se pinta con
+// los cambios que sigan en cola encima
+async function ponerVista(vista) {
+  guardarVistaLocal(vista);
+  vistaActual = await aplicarPendientes(vista);
+  renderAgenda();
+}
+
+/* ====== CAMBIOS EN TIEMPO REAL (SSE) ====== */
+// Cada escritura (desde este u otro dispositivo) llega como evento con las
+// filas cambiadas: se aplican sobre vistaActual sin volver a pedir la agenda
+let eventos = null;
+
+function conectarEventos() {
+  if (eventos) eventos.close();
+  const url = fechaSeleccionada ? `/agenda/eventos?fecha=${fechaSeleccionada}` : '/agenda/eventos';
+  eventos = new EventSource(url);
+  eventos.addEventListener('filas', (e) => aplicarCambios(JSON.parse(e.data)));
+  // Tras un corte, pedimos solo lo que ha cambiado desde nuestra versión
+  let cortado = false;
+  eventos.onerror = () => { cortado = true; };
+  eventos.onopen = () => {
+    if (cortado) ponerseAlDia();
+    cortado = false;
+    enviarCola();
+  };
+}
+
+async function ponerseAlDia() {
+  if (!vistaActual) return cargarAgenda();
+  let res;
+  try {
+    res = await apiFetch(`/agenda/vista?fecha=${vistaActual.fecha}&since=${vistaActual.version}`);
+  } catch (e) {
+    return;
+  }
+  if (!res.ok) return;
+  const delta = await res.json();
+  if (delta.completa) {
+    await ponerVista(delta);
+  } else {
+    aplicarFilas(delta);
+  }
+}
+
+function eventosConectados() {
+  return eventos && eventos.readyState === EventSource.OPEN;
+}
+
+function aplicarCambios(ev) {
+  if (!vistaActual || vistaActual.fecha !== ev.fecha) return;
+  if (ev.version <= vistaActual.version) return; // ya incluido en la vista
+  // Evento perdido o cambio de día completo → lo que falte, con ?since=
+  if (ev.filas === null || ev.version !== vistaActual.version + 1) {
+    ponerseAlDia();
+    return;
+  }
+
+  aplicarFilas(ev);
+}
+
+// Filas cambiadas + huecos y avisos recalculados (evento o ?since=)
+function aplicarFilas(delta) {
+  if (!vistaActual || vistaActual.fecha !== delta.fecha) return;
+  if (delta.version < vistaActual.version) return;
+  delta.filas.forEach(fila => {
+    const i = vistaActual.agenda.findIndex(r => r.row_sheet === fila.row_sheet);
+    if (i >= 0) vistaActual.agenda[i] = fila;
+  });
+  vistaActual.huecos = delta.huecos;
+  vistaActual.avisos = delta.avisos;
+  vistaActual.version = delta.version;
+  guardarVistaLocal(vistaActual);
+  renderAgenda();
+}
+/* =========================================== */
+
+/* ====== PINTADO DE LA AGENDA ====== */
+// Una tarjeta por fila, indexada por row_sheet. En cada pintado solo se
+// rehacen las tarjetas cuyo contenido ha cambiado; el resto se reutiliza.
+// Los botones no llevan handlers propios: llevan data-accion y un único
+// listener en #agenda decide qué hacer.
+const tarjetas = new Map(); // row_sheet → {el, firma}
+let tarjetasFecha = null;
+
+function esc(valor) {
+  return String(valor ?? '')
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&#39;');
+}
+
+function filaPorRow(rowSheet) {
+  return vistaActual && vistaActual.agenda.find(r => r.row_sheet === rowSheet);
+}
+
+function htmlHueco(row) {
+  return `
+    <strong>Hora:</strong> ${esc(row.Hora)}<br/>
+    <strong>Servicio:</strong> ${esc(row.Servicio)} – ${esc(row.Duración)} min<br/>
+    <span class="estado-badge estado-hueco">hueco</span>
+    <div class="actions-row">
+      <button class="btn btn-primary" data-accion="crear">➕ Crear cita</button>
+      <button class="btn btn-whatsapp" data-accion="avisar-hueco">💬 Avisar clientas flexibles</button>
+    </div>
+  `;
+}
+
+function htmlCita(row, avisosRow) {
+  const estado = row.Estado;
+  const avisada = row.Avisada === 'Si' ? 'Si' : 'No';
+  const chipClass = avisada === 'Si' ? 'avisada-si' : 'avisada-no';
+
+  // Info cliente with tel link if available
+  const telefonoHtml = row.Telefono
+    ? `<a href="tel:${esc(row.Telefono.replace(/\s+/g, ''))}" style="color:#007bff; text-decoration:none;">📞 ${esc(row.Telefono)}</a>`
+    : '-';
+
+  // Avisos de retraso / adelanto
+  const alertas = avisosRow.map(a => {
+    if (a.tipo === 'retraso') {
+      return `
+        <div class="alert alert-retraso">
+          ⚠️ Retraso estimado de <strong>${a.minutos} min</strong><br/>
+          <div class="flex-row">
+            <button class="btn btn-secondary btn-small" data-accion="retraso" data-row="${a.afecta_a.row_sheet}" data-minutos="5">+5</button>
+            <button class="btn btn-secondary btn-small" data-accion="retraso" data-row="${a.afecta_a.row_sheet}" data-minutos="10">+10</button>
+            <button class="btn btn-secondary btn-small" data-accion="retraso" data-row="${a.afecta_a.row_sheet}" data-minutos="15">+15</button>
+            <button class="btn btn-whatsapp btn-small" data-accion="avisar-retraso" data-minutos="${a.minutos}">💬 Avisar</button>
+          </div>
+        </div>
+      `;
+    }
+    return `<div class="alert alert-adelanto">⏩ Adelanto posible de <strong>${a.minutos} min</strong></div>`;
+  }).join('');
+
+  // WhatsApp Button (prominent if telefono exists)
+  let whatsapp = '';
+  if (row.Telefono) {
+    const fechaTxt = fechaSeleccionada || 'hoy';
+    let mensaje = '';
+    if (estado === 'confirmada') {
+      mensaje = `Hola ${row.Cliente || ''} 😊\nTe confirmamos tu cita el ${fechaTxt} a las ${row.Hora} para ${row.Servicio}.`;
+    } else if (estado === 'cancelada') {
+      mensaje = `Hola ${row.Cliente || ''} 😊\nConfirmamos la cancelación de tu cita el ${fechaTxt} a las ${row.Hora}.`;
+    }
+    const urlWA = `https://wa.me/${row.Telefono.replace(/\s+/g, '')}?text=${encodeURIComponent(mensaje)}`;
+    whatsapp = `<a class="btn btn-whatsapp" href="${esc(urlWA)}" target="_blank" rel="noopener noreferrer">💬 WhatsApp</a>`;
+  }
+
+  return `
+    <strong>Hora:</strong> ${esc(row.Hora)}<br/>
+    <strong>Cliente:</strong> ${esc(row.Cliente || '-')}<br/>
+    <strong>Teléfono:</strong> ${telefonoHtml}<br/>
+    <strong>Servicio:</strong> ${esc(row.Servicio)} – ${esc(row.Duración)} min<br/>
+    <span class="estado-badge estado-${esc(estado)}">${esc(estado)}</span>
+    <span class="chip ${chipClass}" data-accion="avisada" title="Toggle Avisada">${avisada}</span>
+    ${alertas}
+    <div class="actions-row">
+      ${whatsapp}
+      <button class="btn btn-secondary" data-accion="editar">✏️ Editar</button>
+      <div class="menu" data-accion="menu">⋮
+        <div class="menu-content">
+          <button data-accion="estado" data-valor="confirmada">Confirmar</button>
+          <button data-accion="estado" data-valor="cancelada">Cancelar</button>
+          <button data-accion="estado" data-valor="hueco">Pasar a hueco</button>
+          <button data-accion="mover">Mover</button>
+        </div>
+      </div>
+    </div>
+  `;
+}
+
+function renderAgenda() {
+  if (!vistaActual) return;
+  const cont = document.getElementById('agenda');
+
+  // Otro día: las tarjetas del anterior no sirven
+  if (tarjetasFecha !== vistaActual.fecha) {
+    tarjetas.clear();
+    cont.innerHTML = '';
+    tarjetasFecha = vistaActual.fecha;
+  }
+
+  // Avisos agrupados por fila, en una pasada
+  const avisosPorRow = new Map();
+  vistaActual.avisos.forEach(a => {
+    [a.afecta_a, a.posible_con].forEach(f => {
+      if (!f) return;
+      if (!avisosPorRow.has(f.row_sheet)) avisosPorRow.set(f.row_sheet, []);
+      avisosPorRow.get(f.row_sheet).push(a);
+    });
+  });
+
+  const filas = vistaActual.agenda.filter(row => mostrarHuecos || row.Estado !== 'hueco');
+
+  // Primero fuera las que ya no se ven, para no moverlas por el camino
+  const visibles = new Set(filas.map(row => row.row_sheet));
+  tarjetas.forEach((tarjeta, rowSheet) => {
+    if (!visibles.has(rowSheet)) {
+      tarjeta.el.remove();
+      tarjetas.delete(rowSheet);
+    }
+  });
+
+  let siguiente = cont.firstElementChild;
+
+  filas.forEach(row => {
+    const avisosRow = avisosPorRow.get(row.row_sheet) || [];
+    const firma = JSON.stringify([row, avisosRow, fechaSeleccionada]);
+
+    let tarjeta = tarjetas.get(row.row_sheet);
+    if (!tarjeta || tarjeta.firma !== firma) {
+      const el = document.createElement('div');
+      el.className = 'card ' + row.Estado;
+      el.dataset.row = row.row_sheet;
+      el.innerHTML = row.Estado === 'hueco' ? htmlHueco(row) : htmlCita(row, avisosRow);
+      if (tarjeta) {
+        if (siguiente === tarjeta.el) siguiente = el;
+        tarjeta.el.replaceWith(el);
+      }
+      tarjeta = {el, firma};
+      tarjetas.set(row.row_sheet, tarjeta);
+    }
+
+    // Orden: solo se mueve el nodo si no está ya en su sitio
+    if (tarjeta.el === siguiente) {
+      siguiente = siguiente.nextElementSibling;
+    } else {
+      cont.insertBefore(tarjeta.el, siguiente);
+    }
+  });
+}
+
+// Único listener de la lista de tarjetas
+function onClickAgenda(e) {
+  const boton = e.target.closest('[data-accion]');
+  if (!boton) return;
+  const card = boton.closest('.card');
+  const row = filaPorRow(parseInt(card.dataset.row));
+  if (!row) return;
+
+  switch (boton.dataset.accion) {
+    case 'crear':
+      abrirModal(row.row_sheet);
+      break;
+    case 'avisar-hueco':
+      avisarHuecoWhatsApp(row.row_sheet, row.Hora);
+      break;
+    case 'editar':
+      abrirModal(row.row_sheet, row);
+      break;
+    case 'avisada':
+      toggleAvisada(row.row_sheet, row.Avisada === 'Si' ? 'Si' : 'No');
+      break;
+    case 'menu': {
+      // Toggle menu visibility
+      e.stopPropagation();
+      const menu = boton.querySelector('.menu-content');
+      const abierto = menu.style.display === 'block';
+      closeAllMenus();
+      menu.style.display = abierto ? 'none' : 'block';
+      break;
+    }
+    case 'estado':
+      e.stopPropagation();
+      closeAllMenus();
+      estado(row.row_sheet, boton.dataset.valor);
+      break;
+    case 'mover':
+      e.stopPropagation();
+      closeAllMenus();
+      abrirMover(row.row_sheet);
+      break;
+    case 'retraso':
+      aplicarRetraso(parseInt(boton.dataset.row), parseInt(boton.dataset.minutos));
+      break;
+    case 'avisar-retraso':
+      avisarRetrasoWhatsApp(row.Cliente || '', row.Telefono || '', parseInt(boton.dataset.minutos));
+      break;
+  }
+}
+/* =========================================== */
+
+function cambiarFecha() {
+  const f = document.getElementById('fechaSelector').value;
+  fechaSeleccionada = f ? f : null;
+  cargarAgenda();
+  conectarEventos();
+}
+
+/* ====== ESCRITURAS OPTIMISTAS ====== */
+// La pantalla cambia al momento; la petición va detrás con una
+// Idempotency-Key (un reintento no escribe dos veces). Si el servidor la
+// rechaza, se deshace el cambio local y se avisa. Si va bien, se aplican
+// las filas que devuelve el servidor. Sin red, la petición se queda en la
+// cola offline (offline.js) con el cambio ya en pantalla.
+function nuevaClave() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+function urlDia(ruta, params = {}) {
+  const q = new URLSearchParams(params);
+  if (fechaSeleccionada) q.set('fecha', fechaSeleccionada);
+  const query = q.toString();
+  return query ? `${ruta}?${query}` : ruta;
+}
+
+function horaTexto(minutos) {
+  const h = Math.floor(minutos / 60);
+  const m = minutos % 60;
+  return `${String(h).padStart(2, '0')}:${String(m).padStart(2, '0')}`;
+}
+
+// cambios: {row_sheet: {campo: valor}} que se aplican ya en pantalla
+async function escribir(url, opts, cambios) {
+  const antes = [];
+  Object.entries(cambios).forEach(([row, campos]) => {
+    const fila = filaPorRow(Number(row));
+    if (!fila) return;
+    antes.push([fila, {...fila}]);
+    Object.assign(fila, campos);
+  });
+  renderAgenda();
+
+  // La clave va con la petición: si se reenvía desde la cola, es la misma
+  const peticion = {
+    ...opts,
+    headers: {...(opts.headers || {}), 'Idempotency-Key': nuevaClave()}
+  };
+  const item = {fecha: vistaActual && vistaActual.fecha, url, opts: peticion, cambios};
+
+  // Sin red, o con escrituras anteriores aún en cola: detrás de ellas
+  if ((!navigator.onLine || hayPendientes()) && await encolar(item)) {
+    return null;
+  }
+
+  let res = null;
+  try {
+    res = await apiFetch(url, peticion);
+  } catch (e) {
+    // Sin conexión: a la cola, se envía al volver
+    if (await encolar(item)) {
+      mostrarError('📴 Sin conexión: el cambio se enviará al volver la conexión');
+      return null;
+    }
+  }
+
+  if (!res || !res.ok) {
+    antes.forEach(([fila, copia]) => Object.assign(fila, copia));
+    renderAgenda();
+    mostrarError(`${ultimoError || '❌ Error al guardar'} · Cambio deshecho`);
+    return null;
+  }
+
+  const datos = await res.json();
+  [datos.fila, ...(datos.filas || [])].forEach(f => {
+    const fila = f && filaPorRow(f.row_sheet);
+    if (fila) Object.assign(fila, f);
+  });
+  renderAgenda();
+
+  // Huecos y avisos dependen de toda la agenda: llegan con el evento del
+  // servidor o, sin canal de eventos, con ?since=
+  if (!eventosConectados()) ponerseAlDia();
+  return datos;
+}
+/* =========================================== */
+
+async function estado(row, estado) {
+  await escribir(urlDia('/agenda/estado'), {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({row_sheet: row, estado})
+  }, {[row]: {Estado: estado}});
+}
+
+async function toggleAvisada(row, valorActual) {
+  const nuevoValor = valorActual === 'Si' ? 'No' : 'Si';
+  await escribir(
+    urlDia('/agenda/avisada', {row_sheet: row, avisada: nuevoValor}),
+    {method: 'POST'},
+    {[row]: {Avisada: nuevoValor}}
+  );
+}
+
+function abrirModal(row, datos = null) {
+  document.getElementById('row_sheet').value = row;
+
+  // Reset fields
+  document.getElementById('cliente').value = '';
+  document.getElementById('telefono').value = '';
+  document.getElementById('servicio').value = '';
+  document.getElementById('duracion').value = 30;
+  document.getElementById('flexibilidad').value = 'No';
+
+  // Si vienen datos (editar)
+  if (datos) {
+    document.getElementById('cliente').value = datos.Cliente || '';
+    document.getElementById('telefono').value = datos.Telefono || '';
+    document.getElementById('servicio').value = datos.Servicio || '';
+    document.getElementById('duracion').value = datos.Duración || 30;
+    document.getElementById('flexibilidad').value = datos.Flexibilidad || 'No';
+  }
+
+  document.getElementById('crearCitaModal').style.display = 'block';
+  document.body.style.overflow = 'hidden';
+}
+
+function cerrarModal() {
+  document.getElementById('crearCitaModal').style.display = 'none';
+  document.body.style.overflow = 'auto';
+}
+
+async function guardarCita() {
+  const row = parseInt(document.getElementById('row_sheet').value);
+  const datos = {
+    row_sheet: row,
+    cliente: document.getElementById('cliente').value,
+    telefono: document.getElementById('telefono').value,
+    servicio: document.getElementById('servicio').value,
+    duracion: parseInt(document.getElementById('duracion').value),
+    flexibilidad: document.getElementById('flexibilidad').value
+  };
+  const fila = filaPorRow(row);
+  cerrarModal();
+
+  // CitaCreate lee la fecha del cuerpo
+  await escribir('/agenda/cita', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({fecha: fechaSeleccionada, ...datos})
+  }, {[row]: {
+    Estado: fila && fila.Estado !== 'hueco' ? fila.Estado : 'confirmada',
+    Cliente: datos.cliente,
+    Telefono: datos.telefono,
+    Servicio: datos.servicio || 'Servicio',
+    Duración: datos.duracion || 30,
+    Flexibilidad: datos.flexibilidad
+  }});
+}
+
+async function abrirMover(rowOrigen) {
+  document.getElementById('row_origen').value = rowOrigen;
+
+  // La agenda ya está en pantalla (y al día por los eventos)
+  const data = vistaActual.agenda;
+
+  const select = document.getElementById('row_destino');
+  select.innerHTML = '';
+
+  data.forEach(row => {
+    if (row.Estado === 'hueco') {
+      const opt = document.createElement('option');
+      opt.value = row.row_sheet;
+      opt.textContent = row.Hora;
+      select.appendChild(opt);
+    }
+  });
+
+  document.getElementById('moverCitaModal').style.display = 'block';
+  document.body.style.overflow = 'hidden';
+}
+
+function cerrarMover() {
+  document.getElementById('moverCitaModal').style.display = 'none';
+  document.body.style.overflow = 'auto';
+}
+
+async function confirmarMover() {
+  const rowOrigen = parseInt(document.getElementById('row_origen').value);
+  const rowDestino = parseInt(document.getElementById('row_destino').value);
+
+  const data = vistaActual.agenda;
+
+  const citaOrigen = data.find(r => r.row_sheet === rowOrigen);
+  const destino = data.find(r => r.row_sheet === rowDestino);
+
+  if (!citaOrigen || !destino) {
+    alert('Error al mover la cita');
+    return;
+  }
+
+  const duracionCita = parseInt(citaOrigen.Duración || 0);
+
+  // Calcular minutos libres hasta la siguiente cita
+  const destinoHoraMin = parseHora(destino.Hora);
+  let minutosLibres = Infinity;
+
+  const siguientes = data
+    .filter(r => r.row_sheet !== rowOrigen)
+    .filter(r => parseHora(r.Hora) > destinoHoraMin)
+    .sort((a, b) => parseHora(a.Hora) - parseHora(b.Hora));
+
+  if (siguientes.length > 0) {
+    minutosLibres = parseHora(siguientes[0].Hora) - destinoHoraMin;
+  }
+
+  // Si no cabe, pedir confirmación
+  if (duracionCita > minutosLibres) {
+    const ok = confirm(
+      `⚠️ La cita dura ${duracionCita} min pero solo hay ${minutosLibres} min libres.\n\n¿Quieres moverla igualmente?`
+    );
+    if (!ok) return;
+  }
+
+  cerrarMover();
+  await escribir(
+    urlDia('/agenda/mover', {row_origen: rowOrigen, row_destino: rowDestino}),
+    {method: 'POST'},
+    {
+      [rowDestino]: {
+        Estado: 'confirmada',
+        Cliente: citaOrigen.Cliente,
+        Telefono: citaOrigen.Telefono,
+        Servicio: citaOrigen.Servicio,
+        Duración: citaOrigen.Duración,
+        Flexibilidad: citaOrigen.Flexibilidad,
+        Avisada: citaOrigen.Avisada
+      },
+      [rowOrigen]: {
+        Estado: 'hueco', Cliente: '', Telefono: '', Servicio: 'Servicio',
+        Duración: 30, Flexibilidad: 'No', Avisada: 'No'
+      }
+    }
+  );
+}
+
+// ======== WHATSAPP ASISTIDO PARA HUECOS ========
+async function avisarHuecoWhatsApp(rowSheet, horaHueco) {
+  // Las sugeridas ya vienen en la vista del día
+  const hueco = vistaActual && vistaActual.huecos.find(h => h.row_sheet === rowSheet);
+  if (vistaActual && !hueco) {
+    // La fila está libre en la hoja, pero la tapa una cita anterior más larga
+    alert("Este hueco no está libre: lo ocupa una cita que empieza antes.");
+    return;
+  }
+  let clientas = hueco ? hueco.sugeridas : null;
+
+  if (!clientas) {
+    const url = fechaSeleccionada
+      ? `/agenda/hueco/sugeridas?fecha=${fechaSeleccionada}&row_sheet=${rowSheet}`
+      : `/agenda/hueco/sugeridas?row_sheet=${rowSheet}`;
+    const res = await apiFetch(url);
+    clientas = await res.json();
+  }
+
+  if (!clientas.length) {
+    alert("No hay clientas flexibles que encajen en este hueco.");
+    return;
+  }
+
+  const ok = confirm(
+    `Se va a avisar a ${clientas.length} clienta(s) por WhatsApp.\n\n¿Quieres continuar?`
+  );
+  if (!ok) return;
+
+  const operaciones = [];
+
+  for (const c of clientas) {
+    if (!c.Telefono) continue;
+
+    const telefono = c.Telefono.replace(/\s+/g, '');
+    const mensaje =
+      `Hola ${c.Cliente || ''} 😊\n` +
+      `Se ha quedado un hueco libre el ${fechaSeleccionada || 'hoy'} a las ${horaHueco} ` +
+      `para ${c.Servicio}.\n¿Te vendría bien?`;
+
+    window.open(
+      `https://wa.me/${telefono}?text=${encodeURIComponent(mensaje)}`,
+      '_blank'
+    );
+
+    operaciones.push({tipo: 'avisada', row_sheet: c.row_sheet, avisada: 'Si'});
+  }
+
+  // Marcar todas como avisadas en una sola petición
+  if (operaciones.length) {
+    const cambios = {};
+    operaciones.forEach(op => { cambios[op.row_sheet] = {Avisada: 'Si'}; });
+    await escribir('/agenda/batch', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({fecha: fechaSeleccionada, operaciones})
+    }, cambios);
+  }
+}
+
+// ======== WHATSAPP ASISTIDO PARA RETRASOS ========
+function avisarRetrasoWhatsApp(cliente, telefono, minutos) {
+  if (!telefono) {
+    alert("No hay teléfono para esta clienta");
+    return;
+  }
+
+  const ok = confirm(
+    `Se va a avisar por WhatsApp de un retraso de ${minutos} minutos.\n\n¿Quieres continuar?`
+  );
+  if (!ok) return;
+
+  const telefonoLimpio = telefono.replace(/\s+/g, '');
+  const mensaje =
+    `Hola ${cliente || ''} 😊\n` +
+    `Vamos con un retraso aproximado de ${minutos} minutos.\n` +
+    `Gracias por tu paciencia 💙`;
+
+  const url = `https://wa.me/${telefonoLimpio}?text=${encodeURIComponent(mensaje)}`;
+  window.open(url, '_blank');
+}
+
+// ======== APLICAR RETRASO MANUAL ========
+async function aplicarRetraso(rowSheet, minutos) {
+  const fila = filaPorRow(rowSheet);
+  const cambios = {};
+  if (fila && fila.Hora_min >= 0) {
+    const nueva = fila.Hora_min + minutos;
+    cambios[rowSheet] = {Hora: horaTexto(nueva), Hora_min: nueva};
+  }
+
+  await escribir(urlDia('/agenda/retraso'), {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({
+      row_sheet: rowSheet,
+      minutos: minutos
+    })
+  }, cambios);
+}
+
+window.onload = () => {
+  if (!checkAuth()) {
+    document.body.innerHTML = "<h2 style='text-align:center;margin-top:3rem;'>Acceso restringido</h2>";
+    return;
+  }
+
+  const hoy = new Date().toISOString().slice(0,10);
+  document.getElementById('fechaSelector').value = hoy;
+  fechaSeleccionada = hoy;
+
+  document.getElementById('agenda').addEventListener('click', onClickAgenda);
+  // Cola offline: se envía al recuperar la conexión (y, por si el
+  // navegador no avisa, cada cierto tiempo mientras quede algo)
+  window.addEventListener('online', enviarCola);
+  setInterval(() => { if (pendientes) enviarCola(); }, 30000);
+  // Clicking outside closes menus
+  document.body.addEventListener('click', closeAllMenus);
+
+  registrarServiceWorker();
+  contarPendientes().then(enviarCola);
+  cargarAgenda();
+  conectarEventos();
+};
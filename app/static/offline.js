@@ -0,0 +1,170 @@
+/* ====== DATOS SIN CONEXIÓN (IndexedDB) ====== */
+// Dos almacenes en el navegador:
+// - vistas: la última agenda recibida de cada día (clave: fecha). Al abrir
+//   un día se pinta al momento desde aquí y se revalida con el servidor.
+// - cola: escrituras hechas sin red, en el orden en que se hicieron. Se
+//   reenvían tal cual (con su Idempotency-Key) al volver la conexión: si
+//   una ya había llegado, el servidor no la aplica dos veces.
+// Sin IndexedDB (modo privado de algunos navegadores) la app funciona
+// igual que antes, solo que sin copia local.
+const DB_NOMBRE = 'agenda-piloto';
+const DB_VERSION = 1;
+let dbPromesa = null;
+
+function abrirDB() {
+  if (!dbPromesa) {
+    dbPromesa = new Promise((resolve, reject) => {
+      if (!window.indexedDB) {
+        reject(new Error('IndexedDB no disponible'));
+        return;
+      }
+      const req = indexedDB.open(DB_NOMBRE, DB_VERSION);
+      req.onupgradeneeded = () => {
+        const db = req.result;
+        if (!db.objectStoreNames.contains('vistas')) {
+          db.createObjectStore('vistas', {keyPath: 'fecha'});
+        }
+        if (!db.objectStoreNames.contains('cola')) {
+          db.createObjectStore('cola', {keyPath: 'id', autoIncrement: true});
+        }
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+  return dbPromesa;
+}
+
+// Una petición sobre un almacén; resuelve con su resultado al confirmarse
+async function idb(almacen, modo, fn) {
+  const db = await abrirDB();
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(almacen, modo);
+    const req = fn(tx.objectStore(almacen));
+    tx.oncomplete = () => resolve(req.result);
+    tx.onerror = () => reject(tx.error);
+    tx.onabort = () => reject(tx.error);
+  });
+}
+
+async function guardarVistaLocal(vista) {
+  if (!vista || !vista.fecha) return;
+  // Copia ya: la vista en memoria sigue cambiando mientras se abre la base
+  const copia = JSON.parse(JSON.stringify(vista));
+  try {
+    await idb('vistas', 'readwrite', s => s.put(copia));
+  } catch (e) {
+    // sin copia local
+  }
+}
+
+async function leerVistaLocal(fecha) {
+  try {
+    return (await idb('vistas', 'readonly', s => s.get(fecha))) || null;
+  } catch (e) {
+    return null;
+  }
+}
+/* =========================================== */
+
+/* ====== COLA DE ESCRITURAS SIN CONEXIÓN ====== */
+// Mientras quede algo en la cola, las escrituras nuevas también van a la
+// cola (detrás), para que el servidor las reciba en el mismo orden.
+let pendientes = 0;
+let enviandoCola = false;
+
+// Respuestas tras las que merece la pena reintentar más tarde
+const REINTENTABLES = [429, 502, 503, 504];
+
+async function leerCola() {
+  try {
+    return await idb('cola', 'readonly', s => s.getAll());
+  } catch (e) {
+    return [];
+  }
+}
+
+function hayPendientes() {
+  return pendientes > 0 || enviandoCola;
+}
+
+// item: {fecha, url, opts, cambios}. Devuelve false si no se pudo guardar
+async function encolar(item) {
+  try {
+    await idb('cola', 'readwrite', s => s.add(item));
+  } catch (e) {
+    return false;
+  }
+  await contarPendientes();
+  if (navigator.onLine) enviarCola();
+  return true;
+}
+
+async function contarPendientes() {
+  try {
+    pendientes = await idb('cola', 'readonly', s => s.count());
+  } catch (e) {
+    pendientes = 0;
+  }
+  const aviso = document.getElementById('pendientes');
+  if (!aviso) return;
+  aviso.textContent = `📴 ${pendientes} cambio(s) pendientes de enviar`;
+  aviso.style.display = pendientes ? 'block' : 'none';
+}
+
+// Reenvía la cola en orden, de una en una. Se para en el primer fallo de
+// red (o del servidor, si es temporal) y se vuelve a intentar después.
+async function enviarCola() {
+  if (enviandoCola) return;
+  enviandoCola = true;
+  let enviadas = 0;
+  let rechazadas = 0;
+  try {
+    for (;;) {
+      const [item] = await leerCola();
+      if (!item) break;
+      let res;
+      try {
+        res = await fetch(item.url, item.opts);
+      } catch (e) {
+        break; // sigue sin red
+      }
+      if (REINTENTABLES.includes(res.status)) break;
+      if (!res.ok) rechazadas++;
+      await idb('cola', 'readwrite', s => s.delete(item.id));
+      enviadas++;
+    }
+  } catch (e) {
+    // IndexedDB no disponible: no hay cola que enviar
+  } finally {
+    enviandoCola = false;
+    await contarPendientes();
+  }
+
+  if (rechazadas) {
+    mostrarError(`❌ ${rechazadas} cambio(s) hechos sin conexión no se pudieron guardar`);
+  }
+  // La pantalla lleva los cambios locales: se cuadra con el servidor
+  if (enviadas) cargarAgenda();
+}
+
+// Los cambios aún en cola para la fecha de la vista, aplicados encima
+// (p. ej. al abrir la app sin red con escrituras de la sesión anterior)
+async function aplicarPendientes(vista) {
+  if (!vista) return vista;
+  const cola = await leerCola();
+  cola.filter(item => item.fecha === vista.fecha).forEach(item => {
+    Object.entries(item.cambios || {}).forEach(([row, campos]) => {
+      const fila = vista.agenda.find(r => r.row_sheet === Number(row));
+      if (fila) Object.assign(fila, campos);
+    });
+  });
+  return vista;
+}
+
+function registrarServiceWorker() {
+  if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/sw.js').catch(() => {});
+  }
+}
+/* =========================================== */
@@ -0,0 +1,77 @@
+/* ====== SERVICE WORKER: LA APP SIN CONEXIÓN ====== */
+// Guarda la página y sus recursos para que la app abra aunque se haya caído
+// el Wi-Fi. Los datos (última agenda de cada día y escrituras pendientes)
+// no pasan por aquí: los gestiona la página en IndexedDB (offline.js).
+//
+// - Recursos con huella (/static/...): nunca cambian → primero la caché.
+// - La página (solo /): se sirve al instante desde la caché y se revalida
+//   de fondo; la copia nueva se usa en la siguiente visita.
+// - La API no se toca: la página decide qué hacer sin red.
+//
+// Este fichero cambia con cada despliegue ({{version}}), así el navegador
+// instala el nuevo service worker y se descarta la caché anterior.
+
+const CACHE = 'agenda-shell-{{version}}';
+const SHELL = [
+  '/',
+  '{{app.css}}',
+  '{{offline.js}}',
+  '{{app.js}}',
+  '{{manifest.webmanifest}}',
+  '{{icon.svg}}',
+];
+
+self.addEventListener('install', (e) => {
+  e.waitUntil(
+    caches.open(CACHE)
+      .then(cache => cache.addAll(SHELL))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', (e) => {
+  e.waitUntil(
+    caches.keys()
+      .then(claves => Promise.all(
+        claves
+          .filter(c => c.startsWith('agenda-shell-') && c !== CACHE)
+          .map(c => caches.delete(c))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', (e) => {
+  const req = e.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname.startsWith('/static/')) {
+    e.respondWith(
+      caches.match(req).then(copia => copia || fetch(req))
+    );
+    return;
+  }
+
+  // Solo la página de la app; el resto de navegaciones (/docs, /metrics,
+  // /agenda?fecha=...) van a la red sin tocar la caché
+  if (url.pathname === '/') {
+    e.respondWith(paginaConRevalidacion(e));
+  }
+});
+
+// Stale-while-revalidate de la página
+async function paginaConRevalidacion(e) {
+  const cache = await caches.open(CACHE);
+  const copia = await cache.match('/');
+  const red = fetch(e.request).then(res => {
+    if (res.ok) cache.put('/', res.clone());
+    return res;
+  });
+  if (copia) {
+    e.waitUntil(red.catch(() => {}));
+    return copia;
+  }
+  return red;
+}
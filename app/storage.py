@@ -0,0 +1,139 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import sheets
+from .settings import STORAGE_BACKEND
+
+# ---------------------------------------------------------------------
+# Almacenamiento de la agenda
+# ---------------------------------------------------------------------
+#
+# services.py trabaja sobre "hojas de día": objetos con la superficie de
+# gspread.Worksheet que usa la app (title, get_all_values, batch_get,
+# batch_update, row_values). Un backend sabe:
+# - encontrar (o crear) la hoja de un día
+# - leer varios días de golpe
+#
+# Backends (setting STORAGE_BACKEND):
+# - "sheets": Google Sheets (por defecto)
+# - "sqlite": base de datos local (sqlite_store.py), con espejo opcional
+#   hacia el spreadsheet en segundo plano
+
+
+class StorageBackend:
+    """
+    Interfaz de un backend de almacenamiento.
+    """
+
+    nombre = ""
+
+    # True si las llamadas hacen I/O lento y deben ir a un hilo aparte
+    bloqueante = True
+
+    def get_ws_dia(self, fecha_iso: str) -> Any:
+        """
+        Hoja del día para escribir (se crea a partir de la plantilla si no existe).
+        """
+        raise NotImplementedError
+
+    def get_ws_lectura(self, fecha_iso: str) -> Any:
+        """
+        Hoja del día para leer: si no existe, un VirtualWorksheet con la plantilla.
+        """
+        raise NotImplementedError
+
+    def peek_ws_dia(self, fecha_iso: str) -> Optional[Any]:
+        """
+        Como get_ws_dia(), pero solo si se puede responder sin I/O lento.
+        """
+        return None
+
+    def peek_ws_lectura(self, fecha_iso: str) -> Optional[Any]:
+        """
+        Como get_ws_lectura(), pero solo si se puede responder sin I/O lento.
+        """
+        return None
+
+    def leer_dias(
+        self, fechas: List[str]
+    ) -> Tuple[Dict[str, List[List[str]]], Optional[List[List[str]]]]:
+        """
+        Valores (con cabecera) de los días que existen y, si falta
+        alguno, los de la plantilla (None si no hace falta).
+        """
+        raise NotImplementedError
+
+    def iniciar(self) -> None:
+        """
+        Arranque de tareas de fondo (al iniciar la app). Se llama en un
+        hilo aparte: puede hacer I/O lento.
+        """
+
+    def detener(self) -> None:
+        """
+        Parada de tareas de fondo (al cerrar la app).
+        """
+
+
+class SheetsBackend(StorageBackend):
+    """
+    La agenda vive en Google Sheets (una pestaña por día).
+    """
+
+    nombre = "sheets"
+    bloqueante = True
+
+    def get_ws_dia(self, fecha_iso: str):
+        return sheets.get_ws_dia(fecha_iso)[0]
+
+    def get_ws_lectura(self, fecha_iso: str):
+        return sheets.get_ws_lectura(fecha_iso)[0]
+
+    def peek_ws_dia(self, fecha_iso: str):
+        return sheets.worksheet_registry.peek(fecha_iso)
+
+    def peek_ws_lectura(self, fecha_iso: str):
+        if not sheets.worksheet_registry.is_fresh():
+            return None
+        ws = sheets.worksheet_registry.peek(fecha_iso)
+        if ws is not None:
+            return ws
+        values = sheets.cached_template_values()
+        if values is not None:
+            return sheets.VirtualWorksheet(fecha_iso, values)
+        return None
+
+    def leer_dias(self, fechas: List[str]):
+        """
+        Una sola lectura (values:batchGet) con las hojas que existen;
+        la plantilla va en la misma llamada si no está en memoria.
+        """
+        existentes = set(sheets.worksheet_registry.titles())
+        titulos = [f for f in fechas if f in existentes]
+
+        plantilla = None
+        if len(titulos) < len(fechas):
+            plantilla = sheets.cached_template_values()
+            if plantilla is None:
+                titulos.append(sheets.PLANTILLA_DIA)
+
+        valores = sheets.read_values_batch(titulos)
+
+        if sheets.PLANTILLA_DIA in valores:
+            plantilla = sheets.store_template_values(valores.pop(sheets.PLANTILLA_DIA))
+
+        return valores, plantilla
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> StorageBackend:
+    """
+    Backend elegido en settings.STORAGE_BACKEND.
+    """
+    if STORAGE_BACKEND == "sheets":
+        return SheetsBackend()
+    if STORAGE_BACKEND == "sqlite":
+        from .sqlite_store import SqliteBackend
+        return SqliteBackend()
+    raise ValueError(f"❌ STORAGE_BACKEND desconocido: {STORAGE_BACKEND}")
+
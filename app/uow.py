@@ -0,0 +1,202 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from gspread.utils import rowcol_to_a1
+
+from .schema import SheetSchema, schema_registry
+
+# ---------------------------------------------------------------------
+# Unidad de trabajo sobre una worksheet
+# ---------------------------------------------------------------------
+#
+# Agrupa las lecturas y escrituras de una acción de negocio:
+# - load(): lee todas las filas afectadas en una sola llamada (batch_get)
+#   o directamente de la caché del día si está vigente
+# - get()/set(): trabajan en memoria sobre esas filas, por nombre de
+#   columna (la posición real sale del esquema de la hoja)
+# - commit(): envía todas las celdas modificadas en un solo batch_update
+#   y avisa a al_confirmar(título, filas) de las filas que han cambiado
+#
+# Uso:
+#     with UnitOfWork(ws, cache=agenda_cache) as uow:
+#         uow.load(row)
+#         uow.set(row, "Estado", "Confirmada")
+#     # commit automático al salir sin excepción
+
+
+def _rangos_contiguos(numeros: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    Agrupa números en tramos consecutivos: [2, 3, 4, 9] → [(2, 4), (9, 9)]
+    """
+    tramos: List[Tuple[int, int]] = []
+    for n in sorted(set(numeros)):
+        if tramos and n == tramos[-1][1] + 1:
+            tramos[-1] = (tramos[-1][0], n)
+        else:
+            tramos.append((n, n))
+    return tramos
+
+
+class UnitOfWork:
+    """
+    Lecturas agrupadas + escrituras diferidas sobre una worksheet.
+    """
+
+    def __init__(
+        self,
+        ws,
+        cache=None,
+        schema: Optional[SheetSchema] = None,
+        al_confirmar: Optional[Callable[[str, List[int]], None]] = None,
+    ):
+        self.ws = ws
+        self.cache = cache
+        self.al_confirmar = al_confirmar
+        self._schema = schema
+        self._filas: Dict[int, List[Any]] = {}
+        self._cambios: Dict[Tuple[int, int], Any] = {}
+
+    @property
+    def schema(self) -> SheetSchema:
+        if self._schema is None:
+            self._schema = schema_registry.get(self.ws)
+        return self._schema
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+
+    def load(self, *rows: int) -> None:
+        """
+        Carga las filas indicadas (1-based) que aún no estén cargadas,
+        con una sola lectura como mucho.
+        """
+        pendientes = sorted({r for r in rows if r not in self._filas})
+        if not pendientes:
+            return
+
+        if self.cache is not None:
+            desde_cache = self.cache.filas_crudas(self.ws.title, pendientes)
+            if desde_cache is not None:
+                self._filas.update(desde_cache)
+                return
+
+        # Filas completas + la cabecera en la misma llamada, para
+        # detectar columnas movidas sin pedir la fila 1 aparte
+        tramos = _rangos_contiguos(pendientes)
+        rangos = ["1:1"] + [f"{ini}:{fin}" for ini, fin in tramos]
+
+        cabecera, *resultados = self.ws.batch_get(rangos)
+        self._schema = schema_registry.observe(
+            self.ws.title,
+            cabecera[0] if cabecera else None,
+        )
+
+        for (ini, fin), valores in zip(tramos, resultados):
+            valores = list(valores)
+            for offset, r in enumerate(range(ini, fin + 1)):
+                self._filas[r] = list(valores[offset]) if offset < len(valores) else []
+
+    def _celda(self, row: int, campo: str) -> Tuple[int, int]:
+        return row, self.schema.col[campo]
+
+    def get(self, row: int, campo: str) -> Any:
+        """
+        Valor actual de una celda: el pendiente de escribir si lo hay,
+        si no el leído. La fila debe haberse cargado con load().
+        """
+        celda = self._celda(row, campo)
+        if celda in self._cambios:
+            return self._cambios[celda]
+        if row not in self._filas:
+            raise KeyError(f"Fila {row} no cargada")
+        fila = self._filas[row]
+        col = celda[1]
+        return fila[col - 1] if col <= len(fila) else ""
+
+    def fila(self, row: int) -> List[Any]:
+        """
+        Fila cruda completa (con los cambios pendientes aplicados).
+        """
+        if row not in self._filas:
+            raise KeyError(f"Fila {row} no cargada")
+        fila = list(self._filas[row])
+        for (r, col), valor in self._cambios.items():
+            if r == row:
+                if len(fila) < col:
+                    fila.extend([""] * (col - len(fila)))
+                fila[col - 1] = valor
+        return fila
+
+    # -------------------------
+    # Escritura
+    # -------------------------
+
+    def set(self, row: int, campo: str, valor: Any) -> None:
+        self._cambios[self._celda(row, campo)] = valor
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._cambios)
+
+    def commit(self) -> None:
+        """
+        Escribe todos los cambios pendientes en un solo batch_update
+        y los refleja en la caché del día.
+        """
+        if not self._cambios:
+            return
+
+        por_fila: Dict[int, Dict[int, Any]] = {}
+        for (row, col), valor in self._cambios.items():
+            por_fila.setdefault(row, {})[col] = valor
+
+        data = []
+        for row, cols in sorted(por_fila.items()):
+            for ini, fin in _rangos_contiguos(cols):
+                rango = rowcol_to_a1(row, ini)
+                if fin != ini:
+                    rango += ":" + rowcol_to_a1(row, fin)
+                data.append({
+                    "range": rango,
+                    "values": [[cols[c] for c in range(ini, fin + 1)]],
+                })
+
+        # raw=False → USER_ENTERED, igual que update_cell
+        self.ws.batch_update(data, raw=False)
+
+        if self.cache is not None:
+            self.cache.actualizar_celdas(
+                self.ws.title,
+                [(row, col, valor) for (row, col), valor in self._cambios.items()],
+            )
+
+        filas = sorted({row for row, _ in self._cambios})
+        for row in filas:
+            if row in self._filas:
+                self._filas[row] = self.fila(row)
+        self._cambios.clear()
+
+        if self.al_confirmar is not None:
+            self.al_confirmar(self.ws.title, filas)
+
+    def savepoint(self) -> Dict[Tuple[int, int], Any]:
+        """
+        Copia de los cambios pendientes, para deshacer una parte con rollback_to().
+        """
+        return dict(self._cambios)
+
+    def rollback_to(self, punto: Dict[Tuple[int, int], Any]) -> None:
+        self._cambios = dict(punto)
+
+    def rollback(self) -> None:
+        self._cambios.clear()
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> Optional[bool]:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return None
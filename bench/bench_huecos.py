@@ -0,0 +1,190 @@
+"""
+Benchmark de detección de huecos y de retrasos/adelantos:
+implementación anterior (pandas, O(n²)) frente a la actual.
+
+La regla de huecos ha cambiado desde la versión pandas (las citas
+confirmadas ocupan Hora_min + Duración; las canceladas no cortan el
+hueco). Para comparar resultados, los huecos se miden sobre una agenda
+en la que las dos reglas coinciden: sin canceladas y con citas que
+terminan antes de la fila siguiente. La regla nueva se prueba aparte
+(tests/test_huecos.py).
+
+Uso (desde la raíz del repo):
+    python -m bench.bench_huecos
+
+La versión pandas solo se mide si pandas está instalado.
+"""
+import random
+import timeit
+from typing import Any, Dict, List
+
+from app.services import avisos_de_agenda, huecos_de_agenda
+
+try:
+    import pandas as pd
+except ImportError:  # pandas ya no es dependencia de la app
+    pd = None
+
+TAMANOS = (50, 500, 5000)
+
+
+# -------------------------
+# Implementación anterior (referencia)
+# -------------------------
+
+def huecos_pandas(agenda: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not agenda:
+        return []
+
+    df = pd.DataFrame(agenda)
+    df = df.sort_values("Hora_min")
+
+    huecos: List[Dict[str, Any]] = []
+
+    for idx, row in df.iterrows():
+        if row["Estado"] != "hueco":
+            continue
+
+        inicio = int(row["Hora_min"])
+        row_sheet = int(row["row_sheet"])
+
+        siguientes = df[
+            (df["Hora_min"] > inicio) &
+            (df["Estado"] != "hueco")
+        ]
+
+        if not siguientes.empty:
+            siguiente = siguientes.iloc[0]
+            fin = int(siguiente["Hora_min"])
+            duracion_real = max(0, fin - inicio)
+        else:
+            duracion_real = 180
+
+        huecos.append({
+            "Hora": row["Hora"],
+            "Hora_min": inicio,
+            "Duracion": duracion_real,
+            "row_sheet": row_sheet,
+            "Admite_largo": duracion_real >= 60,
+        })
+
+    return huecos
+
+
+def avisos_pandas(agenda: List[Dict[str, Any]], margen_adelanto: int = 5) -> List[Dict[str, Any]]:
+    if not agenda:
+        return []
+
+    df = pd.DataFrame(agenda)
+    df = df.sort_values("Hora_min")
+
+    avisos: List[Dict[str, Any]] = []
+
+    for i in range(len(df) - 1):
+        actual = df.iloc[i]
+        siguiente = df.iloc[i + 1]
+
+        if actual["Estado"] != "confirmada":
+            continue
+        if siguiente["Estado"] != "confirmada":
+            continue
+
+        fin_previsto = actual["Hora_min"] + actual["Duración"]
+        inicio_siguiente = siguiente["Hora_min"]
+
+        if fin_previsto > inicio_siguiente:
+            avisos.append({
+                "tipo": "retraso",
+                "minutos": int(fin_previsto - inicio_siguiente),
+                "afecta_a": {
+                    "Cliente": siguiente["Cliente"],
+                    "Telefono": siguiente["Telefono"],
+                    "row_sheet": int(siguiente["row_sheet"]),
+                },
+                "causado_por": {
+                    "Cliente": actual["Cliente"],
+                    "Servicio": actual["Servicio"],
+                    "row_sheet": int(actual["row_sheet"]),
+                }
+            })
+
+        hueco = inicio_siguiente - fin_previsto
+        if hueco >= margen_adelanto:
+            avisos.append({
+                "tipo": "adelanto",
+                "minutos": int(hueco),
+                "posible_con": {
+                    "Cliente": siguiente["Cliente"],
+                    "Telefono": siguiente["Telefono"],
+                    "row_sheet": int(siguiente["row_sheet"]),
+                },
+                "libre_desde": int(fin_previsto),
+            })
+
+    return avisos
+
+
+# -------------------------
+# Datos sintéticos
+# -------------------------
+
+def agenda_sintetica(n: int, seed: int = 1, sin_solapes: bool = False) -> List[Dict[str, Any]]:
+    """
+    n filas con horas únicas cada 5 min (como una hoja de día muy larga).
+    Con sin_solapes, ni canceladas ni citas que pasen de la fila
+    siguiente (las reglas de huecos anterior y actual coinciden).
+    """
+    rnd = random.Random(seed)
+    estados = ["hueco", "hueco", "confirmada"] if sin_solapes else ["hueco", "hueco", "confirmada", "cancelada"]
+    duraciones = [5] if sin_solapes else [5, 10, 30, 60]
+    filas = []
+    for i in range(n):
+        hora_min = 8 * 60 + 5 * i
+        estado = rnd.choice(estados)
+        filas.append({
+            "row_sheet": i + 2,
+            "Hora": f"{hora_min // 60:02d}:{hora_min % 60:02d}",
+            "Hora_min": hora_min,
+            "Estado": estado,
+            "Cliente": f"Clienta {i}" if estado != "hueco" else "",
+            "Telefono": "600000000" if estado != "hueco" else "",
+            "Servicio": "Servicio",
+            "Duración": rnd.choice(duraciones),
+            "Flexibilidad": rnd.choice(["Si", "No"]),
+            "Avisada": "No",
+        })
+    rnd.shuffle(filas)
+    return filas
+
+
+def _mide(fn, *args) -> float:
+    """
+    Mejor tiempo (ms) de varias repeticiones.
+    """
+    timer = timeit.Timer(lambda: fn(*args))
+    numero, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=numero)) / numero * 1000
+
+
+def main() -> None:
+    print(f"{'filas':>6} {'función':<8} {'anterior ms':>12} {'actual ms':>10} {'mejora':>8}")
+    for n in TAMANOS:
+        for nombre, nueva, antigua, agenda in (
+            ("huecos", huecos_de_agenda, huecos_pandas, agenda_sintetica(n, sin_solapes=True)),
+            ("avisos", avisos_de_agenda, avisos_pandas, agenda_sintetica(n)),
+        ):
+            t_nueva = _mide(nueva, agenda)
+            if pd is None:
+                print(f"{n:>6} {nombre:<8} {'-':>12} {t_nueva:>10.3f} {'-':>8}")
+                continue
+
+            assert nueva(agenda) == antigua(agenda), f"{nombre}: resultados distintos con {n} filas"
+            t_antigua = _mide(antigua, agenda)
+            print(
+                f"{n:>6} {nombre:<8} {t_antigua:>12.3f} {t_nueva:>10.3f} "
+                f"{t_antigua / t_nueva:>7.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
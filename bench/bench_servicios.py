@@ -0,0 +1,373 @@
+"""
+Benchmark de los caminos calientes de la agenda, comparado con una línea base.
+
+Mide:
+- Servicios (leer_agenda, detectar_huecos, detectar_retrasos_y_adelantos,
+  sugerir_clientas_para_hueco, vista_dia) sobre hojas sintéticas de
+  20 a 10.000 filas: tiempo de CPU por llamada y pico de memoria asignada.
+- Endpoints de api.py contra el Sheets en memoria (fake_sheets.py):
+  llamadas a la API de Sheets en frío (cachés vacías) y en caliente
+  (misma petición repetida), y tiempo de CPU por petición.
+
+Uso (desde la raíz del repo):
+    python -m bench.bench_servicios                # compara con bench/baseline.json
+    python -m bench.bench_servicios --actualizar   # guarda los resultados como línea base
+    python -m bench.bench_servicios --estricto     # falla también si empeora CPU / memoria
+
+Las llamadas a Sheets son números exactos: si un endpoint hace más
+llamadas que en la línea base, el benchmark falla. CPU y memoria
+dependen de la máquina y solo se comparan con tolerancia.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# Antes de importar la app: Sheets en memoria y sin límites de cuota
+os.environ["SHEETS_FAKE"] = "1"
+os.environ.setdefault("SHEETS_READS_PER_MIN", "1000000")
+os.environ.setdefault("SHEETS_WRITES_PER_MIN", "1000000")
+os.environ.setdefault("FAKE_SHEETS_LATENCY_MS", "0")
+os.environ["STORAGE_BACKEND"] = "sheets"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import sheets  # noqa: E402
+from app.fake_sheets import fake_spreadsheet  # noqa: E402
+from app.main import app  # noqa: E402
+from app.schema import EXPECTED_HEADERS, schema_registry  # noqa: E402
+from app.services import (  # noqa: E402
+    agenda_cache,
+    detectar_huecos,
+    detectar_retrasos_y_adelantos,
+    huecos_de_agenda,
+    indice_flexibles,
+    leer_agenda,
+    parsear_agenda,
+    sugerir_clientas_para_hueco,
+    vista_dia,
+)
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+TAMANOS = (20, 200, 2000, 10000)
+
+# Día de las pruebas de endpoints y su tamaño
+FECHA = "2030-01-07"
+FILAS_ENDPOINTS = 200
+
+# Tolerancia de CPU / memoria frente a la línea base
+TOLERANCIA = 1.5
+
+
+# -------------------------
+# Datos sintéticos
+# -------------------------
+
+def hoja_sintetica(n: int, seed: int = 1) -> List[List[str]]:
+    """
+    Valores crudos de una hoja de día (cabecera + n filas), una fila cada
+    5 min entre 08:00 y 22:00 (con n grande las horas se repiten).
+    """
+    rnd = random.Random(seed)
+    values = [list(EXPECTED_HEADERS)]
+    for i in range(n):
+        minuto = 8 * 60 + (5 * i) % (14 * 60)
+        estado = rnd.choice(["Hueco", "Hueco", "Confirmada", "Cancelada"])
+        ocupada = estado != "Hueco"
+        values.append([
+            f"{minuto // 60:02d}:{minuto % 60:02d}",
+            estado,
+            f"Clienta {i}" if ocupada else "",
+            "600000000" if ocupada else "",
+            "Servicio",
+            str(rnd.choice([5, 10, 30, 60])),
+            rnd.choice(["Si", "No"]),
+            "",
+            "No",
+        ])
+    return values
+
+
+class _Hoja:
+    """
+    Worksheet mínima en memoria (sin cuota ni contadores) para medir
+    solo el coste de los servicios.
+    """
+    virtual = False
+
+    def __init__(self, title: str, values: List[List[str]]):
+        self.title = title
+        self._values = values
+
+    def get_all_values(self) -> List[List[str]]:
+        return [list(r) for r in self._values]
+
+
+# -------------------------
+# Medición
+# -------------------------
+
+def _cpu_ms(fn: Callable[[], Any], minimo_s: float = 0.2) -> float:
+    """
+    Tiempo de CPU (ms) por llamada: el mejor de 3 tandas de al menos `minimo_s`.
+    """
+    fn()
+    numero = 1
+    while True:
+        inicio = time.process_time()
+        for _ in range(numero):
+            fn()
+        total = time.process_time() - inicio
+        if total >= minimo_s or numero >= 1 << 16:
+            break
+        numero *= 2
+
+    mejor = total
+    for _ in range(2):
+        inicio = time.process_time()
+        for _ in range(numero):
+            fn()
+        mejor = min(mejor, time.process_time() - inicio)
+    return mejor / numero * 1000
+
+
+def _pico_kib(fn: Callable[[], Any]) -> float:
+    """
+    Pico de memoria asignada (KiB) durante una llamada.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico / 1024
+
+
+def _mide(fn: Callable[[], Any]) -> Dict[str, float]:
+    return {
+        "cpu_ms": round(_cpu_ms(fn), 4),
+        "pico_kib": round(_pico_kib(fn), 1),
+    }
+
+
+# -------------------------
+# Servicios
+# -------------------------
+
+def bench_servicios() -> Dict[str, Dict[str, Dict[str, float]]]:
+    resultados: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    for n in TAMANOS:
+        ws = _Hoja(f"bench-{n}", hoja_sintetica(n))
+
+        def leer_sin_cache():
+            agenda_cache.invalidar(ws.title)
+            return leer_agenda(ws)
+
+        agenda = leer_sin_cache()
+        agenda_cache.set(ws.title, ws._values, agenda)
+
+        casos = {
+            "leer_agenda": leer_sin_cache,
+            "detectar_huecos": lambda: detectar_huecos(ws),
+            "detectar_retrasos_y_adelantos": lambda: detectar_retrasos_y_adelantos(ws),
+            "sugerir_clientas_para_hueco": lambda: sugerir_clientas_para_hueco(agenda, 60),
+            "vista_dia": lambda: vista_dia(agenda),
+        }
+        for nombre, fn in casos.items():
+            resultados.setdefault(nombre, {})[str(n)] = _mide(fn)
+            print(f"  {nombre:<32} {n:>6} filas", file=sys.stderr)
+
+    return resultados
+
+
+# -------------------------
+# Endpoints
+# -------------------------
+
+def _reiniciar(values: List[List[str]]):
+    """
+    Estado de arranque: Sheets en memoria nuevo con la hoja de FECHA,
+    y todas las cachés del proceso vacías.
+    """
+    fake_spreadsheet.cache_clear()
+    sheets.get_spreadsheet.cache_clear()
+    sheets.worksheet_registry.invalidate()
+    sheets._template = None
+    schema_registry.invalidate()
+    agenda_cache.invalidar()
+    indice_flexibles.olvidar()
+
+    spreadsheet = fake_spreadsheet()
+    spreadsheet.add(FECHA, values)
+    return spreadsheet
+
+
+def _filas(values: List[List[str]], estado: str) -> List[int]:
+    return [i for i, row in enumerate(values[1:], start=2) if row[1] == estado]
+
+
+def escenarios(values: List[List[str]]) -> Dict[str, List[Tuple[str, str, Any]]]:
+    """
+    Endpoint → peticiones (método, url, json). La primera se mide en frío,
+    la segunda en caliente; deben poder ejecutarse en ese orden.
+    """
+    huecos = _filas(values, "Hueco")
+    citas = _filas(values, "Confirmada")
+    cita, libre = citas[0], huecos[0]
+    # Hueco libre de verdad (no tapado por una cita larga anterior)
+    hueco_real = huecos_de_agenda(parsear_agenda(values))[0]["row_sheet"]
+    q = f"fecha={FECHA}"
+
+    return {
+        "GET /agenda": [("GET", f"/agenda?{q}", None)] * 2,
+        "GET /agenda/vista": [("GET", f"/agenda/vista?{q}", None)] * 2,
+        "GET /agenda/huecos": [("GET", f"/agenda/huecos?{q}", None)] * 2,
+        "GET /agenda/avisos": [("GET", f"/agenda/avisos?{q}", None)] * 2,
+        "GET /agenda/hueco/sugeridas": [("GET", f"/agenda/hueco/sugeridas?{q}&row_sheet={libre}", None)] * 2,
+        "GET /agenda/rango": [("GET", "/agenda/rango?desde=2030-01-05&hasta=2030-01-11", None)] * 2,
+        "GET /agenda/hueco/candidatas": [("GET", f"/agenda/hueco/candidatas?{q}&row_sheet={hueco_real}", None)] * 2,
+        "POST /agenda/estado": [
+            ("POST", f"/agenda/estado?{q}", {"row_sheet": cita, "estado": "cancelada"}),
+            ("POST", f"/agenda/estado?{q}", {"row_sheet": cita, "estado": "confirmada"}),
+        ],
+        "POST /agenda/cita": [
+            ("POST", f"/agenda/cita?{q}", {"fecha": FECHA, "row_sheet": libre, "cliente": "Ana", "telefono": "600", "servicio": "Corte", "duracion": 30, "flexibilidad": "Si"}),
+            ("POST", f"/agenda/cita?{q}", {"fecha": FECHA, "row_sheet": libre, "cliente": "Eva", "telefono": "601", "servicio": "Tinte", "duracion": 60, "flexibilidad": "No"}),
+        ],
+        "POST /agenda/avisada": [
+            ("POST", f"/agenda/avisada?{q}&row_sheet={cita}&avisada=Si", None),
+            ("POST", f"/agenda/avisada?{q}&row_sheet={cita}&avisada=No", None),
+        ],
+        "POST /agenda/mover": [
+            ("POST", f"/agenda/mover?{q}&row_origen={cita}&row_destino={libre}", None),
+            ("POST", f"/agenda/mover?{q}&row_origen={libre}&row_destino={cita}", None),
+        ],
+        "POST /agenda/retraso": [
+            ("POST", f"/agenda/retraso?{q}", {"row_sheet": cita, "minutos": 10}),
+            ("POST", f"/agenda/retraso?{q}", {"row_sheet": cita, "minutos": -10}),
+        ],
+        "POST /agenda/batch": [
+            ("POST", "/agenda/batch", {"fecha": FECHA, "operaciones": [
+                {"tipo": "avisada", "row_sheet": cita, "avisada": "Si"},
+                {"tipo": "mover", "row_origen": cita, "row_destino": libre},
+            ]}),
+            ("POST", "/agenda/batch", {"fecha": FECHA, "operaciones": [
+                {"tipo": "mover", "row_origen": libre, "row_destino": cita},
+                {"tipo": "avisada", "row_sheet": cita, "avisada": "No"},
+            ]}),
+        ],
+        "POST /agenda/estado (día nuevo)": [
+            ("POST", "/agenda/estado?fecha=2030-02-01", {"row_sheet": 2, "estado": "confirmada"}),
+            ("POST", "/agenda/estado?fecha=2030-02-01", {"row_sheet": 3, "estado": "confirmada"}),
+        ],
+    }
+
+
+def _peticion(client: TestClient, metodo: str, url: str, cuerpo: Any) -> None:
+    respuesta = client.request(metodo, url, json=cuerpo)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{metodo} {url} → {respuesta.status_code}: {respuesta.text}")
+    respuesta.read()
+
+
+def bench_endpoints() -> Dict[str, Dict[str, float]]:
+    values = hoja_sintetica(FILAS_ENDPOINTS)
+    resultados: Dict[str, Dict[str, float]] = {}
+
+    with TestClient(app) as client:
+        for nombre, (fria, caliente) in escenarios(values).items():
+            spreadsheet = _reiniciar(values)
+
+            _peticion(client, *fria)
+            llamadas_frio = spreadsheet.stats()["total"]
+
+            spreadsheet.reset_llamadas()
+            inicio = time.process_time()
+            _peticion(client, *caliente)
+            cpu_ms = (time.process_time() - inicio) * 1000
+            llamadas_caliente = spreadsheet.stats()["total"]
+
+            resultados[nombre] = {
+                "llamadas_frio": llamadas_frio,
+                "llamadas_caliente": llamadas_caliente,
+                "cpu_ms": round(cpu_ms, 3),
+            }
+            print(f"  {nombre}", file=sys.stderr)
+
+    return resultados
+
+
+# -------------------------
+# Comparación con la línea base
+# -------------------------
+
+def comparar(actual: Dict[str, Any], base: Dict[str, Any], estricto: bool) -> bool:
+    """
+    Imprime la comparación y devuelve True si no hay regresiones.
+    """
+    ok = True
+
+    print(f"\n{'endpoint':<34} {'frío':>9} {'caliente':>9} {'cpu ms':>9}")
+    for nombre, r in actual["endpoints"].items():
+        b = base.get("endpoints", {}).get(nombre, {})
+        celdas = []
+        for clave in ("llamadas_frio", "llamadas_caliente"):
+            texto = f"{r[clave]:.0f}"
+            if clave in b:
+                if r[clave] > b[clave]:
+                    texto += f" ✗{b[clave]:.0f}"
+                    ok = False
+                elif r[clave] < b[clave]:
+                    texto += f" ↓{b[clave]:.0f}"
+            celdas.append(texto)
+        print(f"{nombre:<34} {celdas[0]:>9} {celdas[1]:>9} {r['cpu_ms']:>9.2f}")
+
+    print(f"\n{'servicio':<32} {'filas':>6} {'cpu ms':>10} {'base':>10} {'pico KiB':>10} {'base':>10}")
+    for nombre, por_tamano in actual["servicios"].items():
+        for n, r in por_tamano.items():
+            b = base.get("servicios", {}).get(nombre, {}).get(n, {})
+            marcas = ""
+            for clave in ("cpu_ms", "pico_kib"):
+                if clave in b and r[clave] > b[clave] * TOLERANCIA:
+                    marcas += " ⚠" + clave
+                    ok = ok and not estricto
+            print(
+                f"{nombre:<32} {n:>6} {r['cpu_ms']:>10.3f} {b.get('cpu_ms', float('nan')):>10.3f} "
+                f"{r['pico_kib']:>10.1f} {b.get('pico_kib', float('nan')):>10.1f}{marcas}"
+            )
+
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actualizar", action="store_true", help="guardar los resultados como línea base")
+    parser.add_argument("--estricto", action="store_true", help="fallar también si empeora CPU o memoria")
+    args = parser.parse_args()
+
+    print("Servicios...", file=sys.stderr)
+    servicios = bench_servicios()
+    print("Endpoints...", file=sys.stderr)
+    endpoints = bench_endpoints()
+    actual = {"servicios": servicios, "endpoints": endpoints}
+
+    if args.actualizar or not BASELINE.exists():
+        BASELINE.write_text(json.dumps(actual, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Línea base guardada en {BASELINE}", file=sys.stderr)
+        comparar(actual, actual, estricto=False)
+        return 0
+
+    base = json.loads(BASELINE.read_text(encoding="utf-8"))
+    return 0 if comparar(actual, base, args.estricto) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
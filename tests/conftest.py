@@ -0,0 +1,69 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Antes de importar la app: Sheets en memoria y sin límites de cuota
+# (como en bench/bench_servicios.py)
+os.environ["SHEETS_FAKE"] = "1"
+os.environ.setdefault("SHEETS_READS_PER_MIN", "1000000")
+os.environ.setdefault("SHEETS_WRITES_PER_MIN", "1000000")
+os.environ.setdefault("FAKE_SHEETS_LATENCY_MS", "0")
+os.environ["STORAGE_BACKEND"] = "sheets"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schema import EXPECTED_HEADERS  # noqa: E402
+
+
+def fila(hora, estado="Hueco", cliente="", duracion=30, flex="No", avisada="No"):
+    """
+    Fila cruda de una hoja de día, en el orden de EXPECTED_HEADERS.
+    """
+    return [hora, estado, cliente, "", "Servicio", str(duracion), flex, "", avisada]
+
+
+def dia(*filas):
+    """
+    Valores de una hoja de día: cabecera + filas.
+    """
+    return [list(EXPECTED_HEADERS)] + [list(f) for f in filas]
+
+
+@pytest.fixture
+def sheets_en_memoria():
+    """
+    Sheets en memoria nuevo y todas las cachés del proceso vacías
+    (como _reiniciar() en bench/bench_servicios.py).
+    """
+    from app import sheets
+    from app.events import event_bus
+    from app.fake_sheets import fake_spreadsheet
+    from app.schema import schema_registry
+    from app.services import agenda_cache, indice_flexibles
+
+    fake_spreadsheet.cache_clear()
+    sheets.get_spreadsheet.cache_clear()
+    sheets.worksheet_registry.invalidate()
+    sheets._template = None
+    schema_registry.invalidate()
+    agenda_cache.invalidar()
+    indice_flexibles.olvidar()
+    # Versiones y contenido conocido de otras pruebas con las mismas fechas
+    with event_bus._lock:
+        event_bus._dias.clear()
+    return fake_spreadsheet()
+
+
+@pytest.fixture
+def cliente(sheets_en_memoria):
+    """
+    TestClient de la app contra el Sheets en memoria recién creado.
+    """
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as cliente:
+        yield cliente
@@ -0,0 +1,72 @@
+import pytest
+from conftest import dia, fila
+
+from app.services import agenda_cache, crear_cita, leer_agenda, leer_rango, mover_cita
+
+FECHA = "2030-01-07"
+
+
+def _lectura_lenta(ws, escritura):
+    """
+    get_all_values que hace la foto de la hoja, deja que se confirme
+    `escritura` mientras la respuesta está "en vuelo" y devuelve la foto.
+    """
+    original = ws.get_all_values
+
+    def get_all_values(**kwargs):
+        foto = original(**kwargs)
+        escritura()
+        return foto
+
+    ws.get_all_values = get_all_values
+
+
+def test_escritura_durante_lectura_en_frio_no_deja_la_foto_en_cache(sheets_en_memoria):
+    sp = sheets_en_memoria
+    ws = sp.add(FECHA, dia(
+        fila("09:00", "Confirmada", "Ana"),
+        fila("09:30"),
+        fila("10:00"),
+        fila("10:30"),
+    ))
+    _lectura_lenta(ws, lambda: crear_cita(ws, 5, cliente="Bea"))
+
+    leida = leer_agenda(ws)
+
+    # La lectura devuelve su foto, pero no la guarda
+    assert leida[3]["Estado"] == "hueco"
+    assert not agenda_cache.contiene(FECHA)
+    del ws.get_all_values
+    assert leer_agenda(ws)[3]["Cliente"] == "Bea"
+
+    # Con la foto en caché, la fila 5 parecería libre y se pisaría a Bea
+    with pytest.raises(ValueError):
+        mover_cita(ws, 2, 5)
+    assert ws.row_values(5)[2] == "Bea"
+
+
+def test_escritura_durante_leer_rango(sheets_en_memoria):
+    sp = sheets_en_memoria
+    ws = sp.add(FECHA, dia(fila("09:00"), fila("09:30")))
+    otro = sp.add("2030-01-08", dia(fila("09:00")))
+    original = sp.values_batch_get
+
+    def values_batch_get(ranges, **kwargs):
+        respuesta = original(ranges, **kwargs)
+        crear_cita(ws, 3, cliente="Bea")
+        return respuesta
+
+    sp.values_batch_get = values_batch_get
+    leer_rango([FECHA, otro.title])
+
+    assert not agenda_cache.contiene(FECHA)
+    # El otro día no ha cambiado: sí queda en caché
+    assert agenda_cache.contiene(otro.title)
+
+
+def test_invalidar_descarta_lecturas_en_vuelo(sheets_en_memoria):
+    generacion = agenda_cache.generacion(FECHA)
+    agenda_cache.invalidar()
+
+    assert not agenda_cache.set(FECHA, dia(), [], generacion)
+    assert agenda_cache.set(FECHA, dia(), [], agenda_cache.generacion(FECHA))
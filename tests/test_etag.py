@@ -0,0 +1,96 @@
+from conftest import dia, fila
+
+from app.services import agenda_cache
+
+FECHA = "2030-01-07"
+
+
+def _preparar(sp):
+    sp.add(FECHA, dia(
+        fila("09:00", "Confirmada", "Ana"),
+        fila("09:30"),
+        fila("10:00"),
+    ))
+
+
+def test_304_con_etag_vigente(cliente, sheets_en_memoria):
+    _preparar(sheets_en_memoria)
+    primera = cliente.get("/agenda", params={"fecha": FECHA})
+    etag = primera.headers["ETag"]
+    assert primera.status_code == 200
+    sheets_en_memoria.reset_llamadas()
+
+    respuesta = cliente.get("/agenda", params={"fecha": FECHA}, headers={"If-None-Match": etag})
+
+    assert respuesta.status_code == 304
+    assert respuesta.content == b""
+    assert respuesta.headers["ETag"] == etag
+    assert sheets_en_memoria.stats()["total"] == 0
+
+
+def test_escritura_cambia_el_etag(cliente, sheets_en_memoria):
+    _preparar(sheets_en_memoria)
+    etag = cliente.get("/agenda", params={"fecha": FECHA}).headers["ETag"]
+
+    escritura = cliente.post(
+        "/agenda/estado",
+        params={"fecha": FECHA},
+        json={"row_sheet": 3, "estado": "confirmada"},
+    )
+    assert escritura.status_code == 200
+
+    respuesta = cliente.get("/agenda", params={"fecha": FECHA}, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["ETag"] != etag
+    assert respuesta.json()[1]["Estado"] == "confirmada"
+
+    vista = cliente.get("/agenda/vista", params={"fecha": FECHA})
+    repetida = cliente.get("/agenda/vista", params={"fecha": FECHA}, headers={"If-None-Match": vista.headers["ETag"]})
+    assert repetida.status_code == 304
+
+
+def test_since_devuelve_solo_las_filas_cambiadas(cliente, sheets_en_memoria):
+    _preparar(sheets_en_memoria)
+    version = cliente.get("/agenda", params={"fecha": FECHA, "since": 0}).json()["version"]
+
+    for row in (3, 4):
+        cliente.post(
+            "/agenda/cita",
+            params={"fecha": FECHA},
+            json={"row_sheet": row, "cliente": f"Clienta {row}"},
+        )
+
+    cambios = cliente.get("/agenda", params={"fecha": FECHA, "since": version}).json()
+    assert cambios["completa"] is False
+    assert cambios["version"] == version + 2
+    assert [(f["row_sheet"], f["Cliente"]) for f in cambios["filas"]] == [(3, "Clienta 3"), (4, "Clienta 4")]
+
+    # Al día: nada que mandar
+    nada = cliente.get("/agenda", params={"fecha": FECHA, "since": cambios["version"]}).json()
+    assert nada["completa"] is False
+    assert nada["filas"] == []
+
+    # Versión desconocida: la agenda entera
+    todo = cliente.get("/agenda", params={"fecha": FECHA, "since": 1}).json()
+    assert todo["completa"] is True
+    assert len(todo["filas"]) == 3
+
+
+def test_edicion_a_mano_cambia_el_etag_al_releer(cliente, sheets_en_memoria):
+    _preparar(sheets_en_memoria)
+    primera = cliente.get("/agenda", params={"fecha": FECHA, "since": 0}).json()
+    etag = cliente.get("/agenda", params={"fecha": FECHA}).headers["ETag"]
+
+    sheets_en_memoria.worksheet(FECHA)._values[2][2] = "Editado a mano"
+    agenda_cache.invalidar(FECHA)  # como al caducar el TTL
+
+    respuesta = cliente.get("/agenda", params={"fecha": FECHA}, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.json()[1]["Cliente"] == "Editado a mano"
+    # La versión sube al releer: la siguiente petición ya no coincide
+    siguiente = cliente.get("/agenda", params={"fecha": FECHA}, headers={"If-None-Match": etag})
+    assert siguiente.status_code == 200
+    assert siguiente.headers["ETag"] != etag
+
+    cambios = cliente.get("/agenda", params={"fecha": FECHA, "since": primera["version"]}).json()
+    assert cambios["completa"] is True
@@ -0,0 +1,75 @@
+import asyncio
+
+from conftest import dia, fila
+
+from app.events import event_bus
+from app.services import agenda_cache, crear_cita, leer_agenda
+
+FECHA = "2030-01-07"
+
+
+def test_releer_sin_cambios_no_sube_la_version(sheets_en_memoria):
+    ws = sheets_en_memoria.add(FECHA, dia(fila("09:00"), fila("09:30")))
+    leer_agenda(ws)
+    crear_cita(ws, 2, cliente="Ana")
+    version = event_bus.version(FECHA)
+
+    agenda_cache.invalidar(FECHA)
+    leer_agenda(ws)
+
+    # Lo releído es lo que la caché ya tenía tras la escritura
+    assert event_bus.version(FECHA) == version
+
+
+def test_edicion_fuera_de_la_app_sube_la_version(sheets_en_memoria):
+    ws = sheets_en_memoria.add(FECHA, dia(fila("09:00"), fila("09:30")))
+    leer_agenda(ws)
+    version = event_bus.version(FECHA)
+
+    ws._values[2][2] = "Editado a mano"
+    agenda_cache.invalidar(FECHA)
+    leer_agenda(ws)
+
+    assert event_bus.version(FECHA) == version + 1
+    assert event_bus.cambios_desde(FECHA, version) is None
+
+
+def test_fechas_olvidadas_no_reutilizan_versiones(monkeypatch):
+    from app import events
+
+    monkeypatch.setattr(events, "MAX_DIAS", 2)
+    bus = events.EventBus()
+    contenido = dict
+
+    bus.publicar("2030-01-01", [2], contenido)
+    vieja = bus.publicar("2030-01-01", [3], contenido)
+    bus.publicar("2030-01-02", [2], contenido)
+    bus.publicar("2030-01-03", [2], contenido)
+
+    # Solo quedan las dos más recientes
+    assert list(bus._dias) == ["2030-01-02", "2030-01-03"]
+    assert bus.stats()["olvidados"] == 1
+
+    # La fecha olvidada vuelve con una versión mayor que cualquiera dada:
+    # ni un ETag ni un ?since= antiguo coinciden
+    assert bus.version("2030-01-01") > vieja
+    assert bus.cambios_desde("2030-01-01", vieja) is None
+    assert bus.publicar("2030-01-01", [2], contenido) > vieja
+
+
+def test_fechas_con_suscriptores_no_se_olvidan(monkeypatch):
+    from app import events
+
+    monkeypatch.setattr(events, "MAX_DIAS", 1)
+    bus = events.EventBus()
+
+    async def con_suscriptor():
+        suscripcion = bus.suscribir("2030-01-01")
+        bus.publicar("2030-01-01", [2], dict)
+        bus.publicar("2030-01-02", [2], dict)
+        bus.cancelar(suscripcion)
+
+    asyncio.run(con_suscriptor())
+
+    assert "2030-01-01" in bus._dias
+    assert bus.cambios_desde("2030-01-01", bus.version("2030-01-01") - 1) == {2}
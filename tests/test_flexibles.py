@@ -0,0 +1,93 @@
+from conftest import dia, fila
+
+from app.sheets import PLANTILLA_DIA
+from app.services import (
+    agenda_cache,
+    cambiar_estado,
+    candidatas_otros_dias,
+    indexar_dias,
+    indice_flexibles,
+)
+
+LUNES = "2030-01-07"
+MARTES = "2030-01-08"
+MIERCOLES = "2030-01-09"
+
+
+def _clientes(candidatas):
+    return [(c["fecha"], c["Cliente"]) for c in candidatas]
+
+
+def _preparar(sp):
+    sp.add(PLANTILLA_DIA, dia(fila("09:00"), fila("09:30")))
+    sp.add(LUNES, dia(
+        fila("09:00", "Confirmada", "Ana", 45, flex="Si"),
+        fila("10:00", "Confirmada", "Bea", 30, flex="Si", avisada="Si"),
+        fila("11:00", "Cancelada", "Carla", 30, flex="Si"),
+        fila("12:00", "Confirmada", "Dora", 60, flex="No"),
+    ))
+    sp.add(MARTES, dia(
+        fila("09:00", "Confirmada", "Eva", 30, flex="Si"),
+        fila("09:30"),
+        fila("10:00", "Confirmada", "Flor", 90, flex="Si"),
+    ))
+
+
+def test_indexar_dias_una_lectura_y_solo_candidatas(sheets_en_memoria):
+    sp = sheets_en_memoria
+    _preparar(sp)
+    sp.reset_llamadas()
+
+    fechas = [LUNES, MARTES, MIERCOLES]
+    indexar_dias(fechas)
+
+    # Lista de pestañas + un solo batchGet (los dos días y la plantilla)
+    assert sp.stats()["llamadas"] == {"worksheets": 1, "values_batch_get": 1}
+    assert indice_flexibles.faltan(fechas) == []
+    # Ni avisadas, ni canceladas, ni no flexibles; las más largas primero
+    assert _clientes(candidatas_otros_dias(fechas, 60)) == [(LUNES, "Ana"), (MARTES, "Eva")]
+    assert _clientes(candidatas_otros_dias(fechas, 90)) == [
+        (MARTES, "Flor"), (LUNES, "Ana"), (MARTES, "Eva"),
+    ]
+    assert candidatas_otros_dias(fechas, 20) == []
+
+
+def test_escritura_en_otro_dia_actualiza_solo_esedia(sheets_en_memoria):
+    sp = sheets_en_memoria
+    _preparar(sp)
+    fechas = [LUNES, MARTES]
+    indexar_dias(fechas)
+    lunes, martes = sp.worksheet(LUNES), sp.worksheet(MARTES)
+    sp.reset_llamadas()
+
+    # leer_rango dejó los dos días en caché: cada escritura se aplica al
+    # índice sin releer nada
+    cambiar_estado(martes, 2, "Cancelada")
+    # Lunes 11:00 (cancelada) vuelve a confirmarse
+    cambiar_estado(lunes, 4, "Confirmada")
+
+    assert indice_flexibles.faltan(fechas) == []
+    assert _clientes(candidatas_otros_dias(fechas, 60)) == [(LUNES, "Ana"), (LUNES, "Carla")]
+    assert sp.stats()["llamadas"] == {"batch_update": 2}
+
+
+def test_escritura_sin_cache_olvida_eldia(sheets_en_memoria):
+    sp = sheets_en_memoria
+    _preparar(sp)
+    fechas = [LUNES, MARTES]
+    indexar_dias(fechas)
+    agenda_cache.invalidar(MARTES)
+
+    cambiar_estado(sp.worksheet(MARTES), 2, "Cancelada")
+
+    # Sin la fila parseada en caché, el índice descarta el martes
+    # (y solo el martes)
+    assert indice_flexibles.faltan(fechas) == [MARTES]
+    assert _clientes(candidatas_otros_dias(fechas, 60)) == [(LUNES, "Ana")]
+
+    sp.reset_llamadas()
+    indexar_dias(fechas)
+    assert sp.stats()["llamadas"] == {"values_batch_get": 1}
+    assert _clientes(candidatas_otros_dias(fechas, 90)) == [
+        (MARTES, "Flor"), (LUNES, "Ana"),
+    ]
@@ -0,0 +1,142 @@
+import random
+
+from conftest import dia, fila
+
+from app.services import (
+    DURACION_SIN_FIN,
+    huecos_de_agenda,
+    leer_agenda,
+    parsear_agenda,
+    ventanas_libres,
+)
+
+FECHA = "2030-01-07"
+
+
+def _agenda(sp, *filas):
+    ws = sp.add(FECHA, dia(*filas))
+    return leer_agenda(ws)
+
+
+def _huecos(agenda):
+    return [(h["Hora"], h["Duracion"]) for h in huecos_de_agenda(agenda)]
+
+
+def _ventanas(agenda, minimo=0):
+    return [(v["Hora"], v["Fin"]) for v in ventanas_libres(agenda, minimo)]
+
+
+def test_cita_cancelada_no_ocupa_el_hueco(sheets_en_memoria):
+    agenda = _agenda(
+        sheets_en_memoria,
+        fila("09:00", "Confirmada", "Ana"),
+        fila("09:30", "Cancelada", "Bea", 90),
+        fila("10:00"),
+        fila("10:30"),
+        fila("11:00", "Confirmada", "Carla"),
+    )
+
+    # La cancelada de 90 minutos no tapa las filas de hueco que cubría;
+    # su hora no es fila de hueco, pero sí tiempo libre
+    assert _huecos(agenda) == [("10:00", 60), ("10:30", 30)]
+    assert _ventanas(agenda) == [("09:30", "11:00"), ("11:30", None)]
+
+
+def test_cita_confirmada_larga_tapa_los_huecos(sheets_en_memoria):
+    agenda = _agenda(
+        sheets_en_memoria,
+        fila("09:00", "Confirmada", "Ana", 90),
+        fila("09:30"),
+        fila("10:00"),
+        fila("10:30"),
+        fila("11:00", "Confirmada", "Bea"),
+    )
+
+    assert _huecos(agenda) == [("10:30", 30)]
+
+
+def test_filas_sin_hora_valida_no_cuentan(sheets_en_memoria):
+    agenda = _agenda(
+        sheets_en_memoria,
+        fila("", "Hueco"),
+        fila("a las 8", "Confirmada", "Ana", 600),
+        fila("10:00"),
+        fila("10:30", "Confirmada", "Bea"),
+        fila("", "Confirmada", "Carla", 600),
+    )
+
+    assert [f["Hora_min"] for f in agenda][:2] == [-1, -1]
+    # Ni son huecos, ni ocupan, ni adelantan el inicio del día
+    assert _huecos(agenda) == [("10:00", 30)]
+    assert _ventanas(agenda) == [("10:00", "10:30"), ("11:00", None)]
+
+
+def test_ultimo_hueco_sin_fin(sheets_en_memoria):
+    agenda = _agenda(
+        sheets_en_memoria,
+        fila("09:00", "Confirmada", "Ana", 60),
+        fila("09:30"),
+        fila("10:00"),
+        fila("10:30"),
+    )
+
+    huecos = huecos_de_agenda(agenda)
+    # La hoja no dice a qué hora se cierra: los huecos tras la última cita
+    # valen DURACION_SIN_FIN y admiten servicios largos
+    assert [(h["Hora"], h["Duracion"], h["Admite_largo"]) for h in huecos] == [
+        ("10:00", DURACION_SIN_FIN, True),
+        ("10:30", DURACION_SIN_FIN, True),
+    ]
+    assert ventanas_libres(agenda)[-1]["Fin_min"] is None
+    assert ventanas_libres(agenda)[-1]["Duracion"] is None
+    # La ventana sin fin cumple cualquier mínimo
+    assert _ventanas(agenda, minimo=600) == [("10:00", None)]
+
+
+def test_dia_vacio(sheets_en_memoria):
+    agenda = _agenda(sheets_en_memoria)
+
+    assert agenda == []
+    assert huecos_de_agenda(agenda) == []
+    assert ventanas_libres(agenda) == []
+
+
+def _huecos_minuto_a_minuto(agenda):
+    """
+    Regla de huecos comprobada a lo bruto: cada cita confirmada ocupa
+    sus minutos; un hueco dura hasta el siguiente minuto ocupado.
+    """
+    ocupados = set()
+    for f in agenda:
+        if f["Estado"] == "confirmada" and f["Hora_min"] >= 0:
+            ocupados.update(range(f["Hora_min"], f["Hora_min"] + f["Duración"]))
+    ultimo = max(ocupados, default=-1)
+
+    huecos = []
+    for f in sorted(agenda, key=lambda f: f["Hora_min"]):
+        inicio = f["Hora_min"]
+        if f["Estado"] != "hueco" or inicio < 0 or inicio in ocupados:
+            continue
+        if inicio > ultimo:
+            duracion = DURACION_SIN_FIN
+        else:
+            duracion = next(m for m in range(inicio, ultimo + 1) if m in ocupados) - inicio
+        huecos.append((f["Hora"], duracion))
+    return huecos
+
+
+def test_regla_de_intervalos_contra_minuto_a_minuto():
+    rnd = random.Random(25)
+    for n in range(40):
+        filas = []
+        for i in range(rnd.randint(1, 30)):
+            minuto = 9 * 60 + 15 * i
+            hora = rnd.choice([f"{minuto // 60:02d}:{minuto % 60:02d}"] * 9 + ["", "sin hora"])
+            filas.append(fila(
+                hora,
+                rnd.choice(["Hueco", "Hueco", "Confirmada", "Cancelada"]),
+                duracion=rnd.choice([15, 30, 45, 90]),
+            ))
+        agenda = parsear_agenda(dia(*filas))
+
+        assert _huecos(agenda) == _huecos_minuto_a_minuto(agenda), f"agenda {n}"
@@ -0,0 +1,75 @@
+import pytest
+from conftest import dia, fila
+
+from app.idempotencia import registro_idempotencia
+
+FECHA = "2030-01-07"
+
+
+def _llamadas(sp, metodo):
+    return sp.stats()["llamadas"].get(metodo, 0)
+
+
+@pytest.fixture
+def ws(sheets_en_memoria):
+    ws = sheets_en_memoria.add(FECHA, dia(
+        fila("09:00", "Confirmada", "Ana"),
+        fila("09:30", "Confirmada", "Bea"),
+    ))
+    sheets_en_memoria.reset_llamadas()
+    return ws
+
+
+def _cambiar_estado(cliente, clave, row_sheet=2, estado="Cancelada"):
+    return cliente.post(
+        f"/agenda/estado?fecha={FECHA}",
+        json={"row_sheet": row_sheet, "estado": estado},
+        headers={"Idempotency-Key": clave},
+    )
+
+
+def test_misma_clave_escribe_una_vez(cliente, sheets_en_memoria, ws):
+    repetidas = registro_idempotencia.repetidas
+
+    primera = _cambiar_estado(cliente, "reintento-1")
+    assert primera.status_code == 200
+    escrituras = _llamadas(sheets_en_memoria, "batch_update")
+    assert escrituras == 1
+
+    # El reintento (p. ej. la cola offline tras perder la respuesta)
+    # recibe la misma respuesta sin volver a escribir
+    segunda = _cambiar_estado(cliente, "reintento-1")
+    assert segunda.status_code == 200
+    assert segunda.json() == primera.json()
+    assert _llamadas(sheets_en_memoria, "batch_update") == escrituras
+    assert registro_idempotencia.repetidas == repetidas + 1
+
+
+def test_misma_clave_con_otro_contenido_se_rechaza(cliente, sheets_en_memoria, ws):
+    assert _cambiar_estado(cliente, "reintento-2", row_sheet=2).status_code == 200
+    escrituras = _llamadas(sheets_en_memoria, "batch_update")
+
+    # Otra fila con la misma clave: ni se repite la respuesta anterior
+    # ni se escribe
+    respuesta = _cambiar_estado(cliente, "reintento-2", row_sheet=3)
+    assert respuesta.status_code == 422
+    assert _llamadas(sheets_en_memoria, "batch_update") == escrituras
+    assert ws.row_values(3)[1] == "Confirmada"
+
+    # Otra fecha (query) con la misma clave, igual
+    otra = cliente.post(
+        "/agenda/estado?fecha=2030-01-08",
+        json={"row_sheet": 2, "estado": "Cancelada"},
+        headers={"Idempotency-Key": "reintento-2"},
+    )
+    assert otra.status_code == 422
+
+
+def test_sin_clave_no_se_deduplica(cliente, sheets_en_memoria, ws):
+    for _ in range(2):
+        respuesta = cliente.post(
+            f"/agenda/estado?fecha={FECHA}",
+            json={"row_sheet": 2, "estado": "Cancelada"},
+        )
+        assert respuesta.status_code == 200
+    assert _llamadas(sheets_en_memoria, "batch_update") == 2
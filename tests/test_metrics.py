@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.metrics import MetricsMiddleware, http_latencia, http_peticiones
+
+
+def _app(ruta, tipo, duracion):
+    """
+    App ASGI que envía las cabeceras y tarda `duracion` en acabar el cuerpo.
+    """
+    async def app(scope, receive, send):
+        scope["route"] = SimpleNamespace(path=ruta)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", tipo)],
+        })
+        await asyncio.sleep(duracion)
+        await send({"type": "http.response.body", "body": b"data: x\n\n"})
+
+    return app
+
+
+def _peticion(app):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(mensaje):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""}
+    asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+
+
+def _serie(ruta):
+    clave = (("method", "GET"), ("endpoint", ruta))
+    cuentas, suma = http_latencia._series[clave]
+    return sum(cuentas), suma
+
+
+def test_stream_mide_hasta_las_cabeceras():
+    _peticion(_app("/test/stream", b"text/event-stream; charset=utf-8", 0.3))
+
+    n, suma = _serie("/test/stream")
+    assert n == 1
+    assert suma < 0.1
+    clave = (("method", "GET"), ("endpoint", "/test/stream"), ("status", "200"))
+    assert http_peticiones._valores[clave] == 1
+
+
+def test_respuesta_normal_mide_hasta_el_final():
+    _peticion(_app("/test/json", b"application/json", 0.2))
+
+    n, suma = _serie("/test/json")
+    assert n == 1
+    assert suma >= 0.2
@@ -0,0 +1,121 @@
+import random
+import threading
+
+import pytest
+from gspread.exceptions import APIError
+
+from app.fake_sheets import CalendarioFallos, fake_spreadsheet
+from app.quota import ESCRITURA, LECTURA, QuotaScheduler, quota_scheduler
+
+
+def _scheduler(aleatorios=None, **kwargs):
+    """
+    Sin límite de cuota; los sleeps se apuntan en `esperas` en vez de dormir.
+    """
+    esperas = []
+    valores = iter(aleatorios or [])
+    scheduler = QuotaScheduler(
+        lecturas_por_minuto=1e9,
+        escrituras_por_minuto=1e9,
+        sleep=esperas.append,
+        aleatorio=lambda: next(valores),
+        **kwargs,
+    )
+    return scheduler, esperas
+
+
+def test_reintenta_segun_calendario_con_jitter():
+    scheduler, esperas = _scheduler([0.5, 0.25, 1.0], backoff_base=1.0, backoff_max=3.0)
+    peticion = CalendarioFallos([429, 503, 429, None], resultado="ok")
+
+    assert scheduler.run(peticion) == "ok"
+
+    assert peticion.llamadas == 4
+    # aleatorio · min(max, base·2^intento): 0.5·1, 0.25·2, 1.0·min(3, 4)
+    assert esperas == [0.5, 0.5, 3.0]
+    stats = scheduler.stats()
+    assert stats["reintentos"] == 3
+    assert stats["errores_cuota"] == 2
+    assert stats["llamadas_lectura"] == 4
+
+
+def test_se_rinde_tras_max_reintentos():
+    scheduler, esperas = _scheduler([1.0] * 10, max_reintentos=2, backoff_base=0.5)
+    peticion = CalendarioFallos([429] * 10)
+
+    with pytest.raises(APIError):
+        scheduler.run(peticion, ESCRITURA)
+
+    assert peticion.llamadas == 3
+    assert esperas == [0.5, 1.0]
+    assert scheduler.reintentos == 2
+    assert scheduler.errores_cuota == 3
+    assert scheduler.llamadas == {LECTURA: 0, ESCRITURA: 3}
+
+
+def test_no_reintenta_errores_definitivos():
+    scheduler, esperas = _scheduler()
+    peticion = CalendarioFallos([404, None])
+
+    with pytest.raises(APIError):
+        scheduler.run(peticion)
+
+    assert peticion.llamadas == 1
+    assert esperas == []
+    assert scheduler.reintentos == 0
+
+
+def test_jitter_dentro_del_tope():
+    azar = random.Random(7)
+    scheduler, esperas = _scheduler(
+        [azar.random() for _ in range(6)],
+        max_reintentos=6,
+        backoff_base=1.0,
+        backoff_max=8.0,
+    )
+    scheduler.run(CalendarioFallos([429] * 6))
+
+    assert len(esperas) == 6
+    for intento, espera in enumerate(esperas):
+        assert 0 <= espera <= min(8.0, 2 ** intento)
+    # Full jitter: no son los topes exactos
+    assert esperas != [min(8.0, 2 ** i) for i in range(6)]
+
+
+def test_contadores_con_hilos_concurrentes():
+    scheduler, _ = _scheduler([0.0] * 10_000)
+    hilos, por_hilo = 8, 200
+
+    def trabajar():
+        for i in range(por_hilo):
+            scheduler.run(CalendarioFallos([429] if i % 10 == 0 else []))
+
+    threads = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    reintentos = hilos * (por_hilo // 10)
+    assert scheduler.llamadas[LECTURA] == hilos * por_hilo + reintentos
+    assert scheduler.reintentos == reintentos
+    assert scheduler.errores_cuota == reintentos
+
+
+def test_fake_spreadsheet_falla_segun_calendario(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(quota_scheduler, "_sleep", esperas.append)
+    monkeypatch.setattr(quota_scheduler, "_aleatorio", lambda: 1.0)
+    fake_spreadsheet.cache_clear()
+    sp = fake_spreadsheet()
+    ws = sp.add("2030-01-07", [["Hora"], ["09:00"]])
+
+    calendario = sp.fallar_segun([429, None, 429, 429], metodo="get_all_values")
+
+    assert ws.get_all_values() == [["Hora"], ["09:00"]]
+    assert ws.get_all_values() == [["Hora"], ["09:00"]]
+    # 429 → bien | 429 → 429 → (calendario agotado) bien
+    assert calendario.llamadas == 4
+    assert sp.stats()["llamadas"]["get_all_values"] == 5
+    # El backoff vuelve a empezar en cada lectura: 1 | 1, 2
+    assert esperas == [1.0, 1.0, 2.0]
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app import sqlite_store, storage
+from app.sheets import PLANTILLA_DIA
+
+FECHA = "2030-01-07"
+
+
+@pytest.fixture
+def backend(sheets_en_memoria, tmp_path, monkeypatch):
+    """
+    STORAGE_BACKEND=sqlite con la base en tmp_path y el espejo parado
+    (cada prueba llama a sincronizar()).
+    """
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(
+        sqlite_store.SqliteBackend.__init__, "__defaults__", (tmp_path / "agenda.db", 3600.0)
+    )
+    storage.get_backend.cache_clear()
+    yield storage.get_backend()
+    storage.get_backend.cache_clear()
+
+
+def _titulos(sp):
+    return {ws.title for ws in sp.worksheets()}
+
+
+def test_plantilla_se_carga_fuera_del_event_loop(backend, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    en_el_loop = []
+    plantilla = backend.plantilla
+
+    def registrar():
+        try:
+            asyncio.get_running_loop()
+            en_el_loop.append(True)
+        except RuntimeError:
+            en_el_loop.append(False)
+        return plantilla()
+
+    monkeypatch.setattr(backend, "plantilla", registrar)
+    with TestClient(app):
+        assert en_el_loop == [False]
+        assert backend._plantilla is not None
+
+
+def test_endpoints_y_espejo(backend, cliente, sheets_en_memoria):
+    sp = sheets_en_memoria
+    assert _titulos(sp) == {PLANTILLA_DIA}
+
+    escritura = cliente.post(
+        "/agenda/estado",
+        params={"fecha": FECHA},
+        json={"row_sheet": 2, "estado": "confirmada"},
+    )
+    assert escritura.status_code == 200
+    agenda = cliente.get("/agenda", params={"fecha": FECHA}).json()
+    assert agenda[0]["Estado"] == "confirmada"
+
+    # El día vive en SQLite; al spreadsheet solo llega con el espejo
+    assert backend.leer_filas(FECHA, 2, 2)[0][1] == "Confirmada"
+    assert _titulos(sp) == {PLANTILLA_DIA}
+    sp.reset_llamadas()
+
+    assert backend.espejo.sincronizar() == 1
+    assert sp.worksheet(FECHA).row_values(2)[:2] == ["09:00", "Confirmada"]
+    assert sp.stats()["llamadas"]["batch_update"] == 1
+
+    # Sin escrituras nuevas no hay nada que copiar
+    assert backend.espejo.sincronizar() == 0
+    assert sp.stats()["llamadas"]["batch_update"] == 1
+
+    # Error de Google (sin reintento): la fila queda pendiente para la
+    # siguiente vuelta
+    cliente.post(
+        "/agenda/estado",
+        params={"fecha": FECHA},
+        json={"row_sheet": 3, "estado": "confirmada"},
+    )
+    sp.fallar(status=400, metodo="batch_update")
+    with pytest.raises(Exception):
+        backend.espejo.sincronizar()
+    assert sp.worksheet(FECHA).row_values(3)[1] == "Hueco"
+    assert backend.espejo.sincronizar() == 1
+    assert sp.worksheet(FECHA).row_values(3)[1] == "Confirmada"
@@ -0,0 +1,111 @@
+import pytest
+from conftest import dia, fila
+
+from app.uow import UnitOfWork
+
+FECHA = "2030-01-07"
+
+
+def _llamadas(sp, metodo):
+    return sp.stats()["llamadas"].get(metodo, 0)
+
+
+@pytest.fixture
+def ws(sheets_en_memoria):
+    ws = sheets_en_memoria.add(FECHA, dia(
+        fila("09:00", "Confirmada", "Ana"),
+        fila("09:30"),
+        fila("10:00"),
+        fila("10:30", "Confirmada", "Bea"),
+        fila("11:00"),
+    ))
+    sheets_en_memoria.reset_llamadas()
+    return ws
+
+
+def test_load_una_lectura_por_llamada(sheets_en_memoria, ws):
+    uow = UnitOfWork(ws)
+    # Filas sueltas y tramos: una sola lectura (con la cabecera)
+    uow.load(2, 3, 5, 6)
+    assert _llamadas(sheets_en_memoria, "batch_get") == 1
+    assert uow.get(2, "Cliente") == "Ana"
+    assert uow.get(5, "Cliente") == "Bea"
+
+    # Lo ya cargado no se vuelve a pedir
+    uow.load(3, 5)
+    assert _llamadas(sheets_en_memoria, "batch_get") == 1
+    uow.load(2, 4)
+    assert _llamadas(sheets_en_memoria, "batch_get") == 2
+    assert sheets_en_memoria.stats()["total"] == 2
+
+
+def test_commit_una_escritura_con_todos_los_cambios(sheets_en_memoria, ws):
+    with UnitOfWork(ws) as uow:
+        uow.load(3, 6)
+        uow.set(3, "Estado", "Confirmada")
+        uow.set(3, "Cliente", "Carla")
+        uow.set(6, "Cliente", "Dora")
+        assert uow.get(3, "Cliente") == "Carla"
+
+    assert _llamadas(sheets_en_memoria, "batch_update") == 1
+    assert ws.row_values(3)[:3] == ["09:30", "Confirmada", "Carla"]
+    assert ws.row_values(6)[2] == "Dora"
+
+    # Sin cambios pendientes no se escribe nada
+    with UnitOfWork(ws) as uow:
+        uow.load(3)
+    assert _llamadas(sheets_en_memoria, "batch_update") == 1
+
+
+def test_excepcion_descarta_los_cambios(sheets_en_memoria, ws):
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(ws) as uow:
+            uow.load(3)
+            uow.set(3, "Cliente", "Carla")
+            raise RuntimeError("fallo")
+
+    assert _llamadas(sheets_en_memoria, "batch_update") == 0
+    assert ws.row_values(3)[2] == ""
+
+
+def test_rollback_to_deshace_solo_desde_el_savepoint(ws):
+    uow = UnitOfWork(ws)
+    uow.load(3, 4)
+    uow.set(3, "Cliente", "Carla")
+    punto = uow.savepoint()
+    uow.set(3, "Cliente", "Otra")
+    uow.set(4, "Cliente", "Dora")
+    uow.rollback_to(punto)
+
+    assert uow.get(3, "Cliente") == "Carla"
+    assert uow.get(4, "Cliente") == ""
+    assert uow.pendientes == 1
+
+
+def test_batch_op_que_falla_no_impide_las_demas(cliente, sheets_en_memoria, ws):
+    respuesta = cliente.post("/agenda/batch", json={
+        "fecha": FECHA,
+        "operaciones": [
+            {"tipo": "cita", "row_sheet": 3, "cliente": "Carla"},
+            # La 3 ya no es hueco (la operación anterior): falla
+            {"tipo": "mover", "row_origen": 2, "row_destino": 3},
+            {"tipo": "retraso", "row_sheet": 5, "minutos": 15},
+            # La 2 sigue ocupada (Ana): tampoco
+            {"tipo": "mover", "row_origen": 4, "row_destino": 2},
+            {"tipo": "avisada", "row_sheet": 2, "avisada": "Si"},
+        ],
+    })
+
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert [r["ok"] for r in cuerpo["resultados"]] == [True, False, True, False, True]
+    assert cuerpo["ok"] is False
+    assert "no está libre" in cuerpo["resultados"][1]["error"]
+
+    # Una lectura de las filas y una escritura con lo que salió bien
+    assert _llamadas(sheets_en_memoria, "batch_get") == 1
+    assert _llamadas(sheets_en_memoria, "batch_update") == 1
+    assert ws.row_values(2)[:3] == ["09:00", "Confirmada", "Ana"]
+    assert ws.row_values(2)[8] == "Si"
+    assert ws.row_values(3)[:3] == ["09:30", "Confirmada", "Carla"]
+    assert ws.row_values(5)[0] == "10:45"